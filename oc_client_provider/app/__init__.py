@@ -2,10 +2,18 @@ from flask import Flask, Blueprint
 
 client_provider_bp = Blueprint("client_provider_bp", __name__)
 from .routes import *
+from . import metrics
+from . import compression
+from . import deadline
+from . import profiling
 
 
 def create_app(config_class):
     app = Flask(__name__)
     app.config.from_object(config_class)
     app.register_blueprint(client_provider_bp)
+    metrics.init_app(app)
+    deadline.init_app(app)
+    compression.init_app(app)
+    profiling.init_app(app)
     return app
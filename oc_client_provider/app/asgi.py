@@ -0,0 +1,84 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+# WSGI application call itself, without 'sync_to_async' decoration of the original method
+# it is not a public API, so 'asgiref' versions are limited in 'setup.py'
+_run_wsgi_app = WsgiToAsgiInstance.__dict__["run_wsgi_app"].func
+
+
+class _PooledWsgiToAsgiInstance(WsgiToAsgiInstance):
+    """
+    Per-request instance running WSGI application in the executor given
+    Original implementation is 'thread sensitive', so all requests are served one-by-one in a single thread
+    """
+
+    def __init__(self, wsgi_application, executor):
+        super().__init__(self.__call_application)
+        self.__application = wsgi_application
+        self.__executor = executor
+        self.__result = None
+
+    def __call_application(self, environ, start_response):
+        self.__result = self.__application(environ, start_response)
+        return self.__result
+
+    def __run_wsgi_app(self, body):
+        """
+        Run WSGI application and close its result as WSGI server must do, original implementation does not
+        """
+        try:
+            _run_wsgi_app(self, body)
+        finally:
+            if hasattr(self.__result, "close"):
+                self.__result.close()
+
+    async def run_wsgi_app(self, body):
+        await sync_to_async(self.__run_wsgi_app, thread_sensitive=False, executor=self.__executor)(body)
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """
+    ASGI application serving WSGI one with a bounded thread pool
+    Connections are held by the event loop while waiting for a free thread,
+        and Django ORM opens a database connection per thread, so the number of connections is bounded also
+    """
+
+    def __init__(self, wsgi_application, max_threads, startup=None):
+        """
+        :param wsgi_application: WSGI application (Flask one)
+        :param int max_threads: maximal number of threads serving requests concurrently
+        :param startup: callable without arguments run in the thread pool on startup, warm-up for example
+        """
+        super().__init__(wsgi_application)
+        self.max_threads = max_threads
+        self.startup = startup
+        self.executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="oc-client-provider")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+
+        await _PooledWsgiToAsgiInstance(self.wsgi_application, self.executor)(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        """
+        Process lifespan events: startup callable is run on startup, the thread pool is shut down on shutdown
+        """
+        while True:
+            message = await receive()
+
+            if message["type"] == "lifespan.startup":
+                logging.info("Serving with [%d] threads", self.max_threads)
+
+                if self.startup is not None:
+                    await asyncio.get_running_loop().run_in_executor(self.executor, self.startup)
+
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
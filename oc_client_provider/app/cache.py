@@ -0,0 +1,434 @@
+import threading
+import time
+import logging
+import json
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+from collections import OrderedDict
+
+# registry of named caches for statistics and cleanup
+_caches = dict()
+
+
+def estimate_size(value):
+    """
+    Estimate memory used by a value: strings, numbers and containers of them, named tuples for example
+    Objects shared by several containers are counted for each one, so the estimation is an upper bound
+    :param value: value to estimate
+    :return int: size in bytes
+    """
+    _size = sys.getsizeof(value)
+
+    if isinstance(value, dict):
+        return _size + sum(estimate_size(_k) + estimate_size(_v) for _k, _v in value.items())
+
+    if isinstance(value, (list, tuple, set)):
+        return _size + sum(map(estimate_size, value))
+
+    return _size
+
+
+class TTLCache(object):
+    """
+    Thread-safe in-process cache with size-bounded LRU eviction and entries expiration
+    """
+
+    def __init__(self, max_size, ttl, max_bytes=0):
+        """
+        :param int max_size: maximal number of entries, zero disables caching
+        :param float ttl: entry time-to-live in seconds, zero or negative means no expiration
+        :param int max_bytes: maximal total size of values given to 'set', zero means no limit
+        """
+        self._max_size = max(int(max_size), 0)
+        self._ttl = float(ttl)
+        self._max_bytes = max(int(max_bytes), 0)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key, default=None):
+        """
+        Get cached value
+        :param key: hashable key
+        :param default: value to return if key is absent or expired
+        :return: value cached or default
+        """
+        with self._lock:
+            _entry = self._entries.get(key)
+
+            if _entry is not None and self._ttl > 0 and _entry[0] < time.monotonic():
+                del(self._entries[key])
+                self._bytes -= _entry[2]
+                _entry = None
+
+            if _entry is None:
+                self._misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return _entry[1]
+
+    def set(self, key, value, size=0):
+        """
+        Put value to the cache, the least recently used entries are evicted if cache is full
+        :param key: hashable key
+        :param value: value to cache
+        :param int size: value size in bytes, see 'estimate_size', values larger than the cache are not cached
+        """
+        if not self._max_size or (self._max_bytes and size > self._max_bytes):
+            return
+
+        with self._lock:
+            _entry = self._entries.pop(key, None)
+
+            if _entry is not None:
+                self._bytes -= _entry[2]
+
+            self._entries[key] = (time.monotonic() + self._ttl, value, size)
+            self._bytes += size
+
+            while len(self._entries) > self._max_size or (self._max_bytes and self._bytes > self._max_bytes):
+                self._bytes -= self._entries.popitem(last=False)[1][2]
+                self._evictions += 1
+
+    def clear(self):
+        """
+        Remove all entries, counters are kept
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Cache statistics
+        :return dict: counters and sizes
+        """
+        with self._lock:
+            return {
+                    "hits": self._hits,
+                    "misses": self._misses,
+                    "evictions": self._evictions,
+                    "size": len(self._entries),
+                    "max_size": self._max_size,
+                    "bytes": self._bytes,
+                    "max_bytes": self._max_bytes,
+                    "ttl": self._ttl}
+
+
+class FileCache(object):
+    """
+    Cache in a local directory shared by all worker processes, values are pickled to a file per entry
+    The same LRU eviction and expiration as for TTLCache, file modification time is used as last access time
+    Counters are per-process
+    """
+
+    _SUFFIX = ".cache"
+
+    def __init__(self, path, max_size, ttl, max_bytes=0):
+        """
+        :param str path: directory for cache files, created if absent
+        :param int max_size: maximal number of entries, zero disables caching
+        :param float ttl: entry time-to-live in seconds, zero or negative means no expiration
+        :param int max_bytes: maximal total size of cache files, zero means no limit
+        """
+        self._path = path
+        self._max_size = max(int(max_size), 0)
+        self._ttl = float(ttl)
+        self._max_bytes = max(int(max_bytes), 0)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._errors = 0
+        os.makedirs(self._path, exist_ok=True)
+
+    def _get_file_path(self, key):
+        """
+        :param key: key with stable 'repr', tuples of strings and numbers for example
+        :return str: path to the entry file
+        """
+        return os.path.join(self._path, hashlib.sha1(repr(key).encode("utf-8")).hexdigest() + self._SUFFIX)
+
+    def _list_files(self):
+        """
+        :return list: paths of all entry files
+        """
+        return [os.path.join(self._path, _f) for _f in os.listdir(self._path) if _f.endswith(self._SUFFIX)]
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key, default=None):
+        """
+        Get cached value
+        :param key: key with stable 'repr'
+        :param default: value to return if key is absent or expired
+        :return: value cached or default
+        """
+        _file_path = self._get_file_path(key)
+
+        try:
+            with open(_file_path, "rb") as _file:
+                _expires, _key, _value = pickle.load(_file)
+
+            if _key != key:
+                # hash collision
+                raise KeyError(key)
+
+            if self._ttl > 0 and _expires < time.time():
+                os.remove(_file_path)
+                raise KeyError(key)
+
+            os.utime(_file_path)
+        except (OSError, KeyError):
+            self._count("_misses")
+            return default
+        except Exception as _e:
+            # broken entry is treated as absent one
+            logging.exception(_e)
+            self._count("_errors")
+            self._count("_misses")
+            return default
+
+        self._count("_hits")
+        return _value
+
+    def set(self, key, value, size=0):
+        """
+        Put value to the cache, the least recently used entries are evicted if cache is full
+        Errors are logged, caching is not critical
+        :param key: key with stable 'repr'
+        :param value: picklable value to cache
+        :param int size: ignored, size of the entry file is used
+        """
+        if not self._max_size:
+            return
+
+        try:
+            # written to temporary file and renamed, so other processes never read incomplete entry
+            _fd, _temp_path = tempfile.mkstemp(dir=self._path, suffix=".tmp")
+
+            with os.fdopen(_fd, "wb") as _file:
+                pickle.dump((time.time() + self._ttl, key, value), _file, protocol=pickle.HIGHEST_PROTOCOL)
+
+            os.replace(_temp_path, self._get_file_path(key))
+            self._evict()
+        except Exception as _e:
+            logging.exception(_e)
+            self._count("_errors")
+
+    def _evict(self):
+        """
+        Remove the least recently used entries above maximal size and maximal total size of files
+        """
+        _files = list()
+
+        for _file_path in self._list_files():
+            try:
+                _stat = os.stat(_file_path)
+                _files.append((_stat.st_mtime, _file_path, _stat.st_size))
+            except FileNotFoundError:
+                # removed by another process
+                continue
+
+        _count = len(_files)
+        _bytes = sum(map(lambda x: x[2], _files))
+
+        for _mtime, _file_path, _size in sorted(_files):
+            if _count <= self._max_size and (not self._max_bytes or _bytes <= self._max_bytes):
+                break
+
+            _count -= 1
+            _bytes -= _size
+
+            try:
+                os.remove(_file_path)
+                self._count("_evictions")
+            except FileNotFoundError:
+                continue
+
+    def clear(self):
+        """
+        Remove all entries, counters are kept
+        """
+        for _file_path in self._list_files():
+            try:
+                os.remove(_file_path)
+            except FileNotFoundError:
+                continue
+
+    def stats(self):
+        """
+        Cache statistics
+        :return dict: counters and sizes
+        """
+        _size = len(self._list_files())
+
+        with self._lock:
+            return {
+                    "hits": self._hits,
+                    "misses": self._misses,
+                    "evictions": self._evictions,
+                    "errors": self._errors,
+                    "size": _size,
+                    "max_size": self._max_size,
+                    "max_bytes": self._max_bytes,
+                    "ttl": self._ttl,
+                    "path": self._path}
+
+
+def create(max_size, ttl, path=None, max_bytes=0):
+    """
+    Create cache with backend depending on configuration
+    :param int max_size: maximal number of entries, zero disables caching
+    :param float ttl: entry time-to-live in seconds
+    :param str path: directory for cache shared by worker processes, in-process cache is created if not set
+    :param int max_bytes: maximal total size of entries, zero means no limit
+    :return: TTLCache or FileCache
+    """
+    if path:
+        return FileCache(path, max_size=max_size, ttl=ttl, max_bytes=max_bytes)
+
+    return TTLCache(max_size=max_size, ttl=ttl, max_bytes=max_bytes)
+
+
+class Snapshot(object):
+    """
+    Thread-safe in-process snapshot of data returned by a loader,
+        refreshed periodically in a background daemon thread
+    """
+
+    def __init__(self, loader, interval):
+        """
+        :param loader: callable without arguments returning JSON-serializable data
+        :param float interval: refresh interval in seconds, zero or negative disables caching
+        """
+        self._loader = loader
+        self._interval = float(interval)
+        self._lock = threading.Lock()
+        self._value = None
+        self._etag = None
+        self._loaded = False
+        self._thread = None
+        self._hits = 0
+        self._misses = 0
+        self._refreshes = 0
+        self._errors = 0
+
+    def _load(self):
+        """
+        Call the loader and calculate entity tag for the data
+        :return tuple: (data, etag)
+        """
+        _value = self._loader()
+        _etag = hashlib.sha1(json.dumps(_value, sort_keys=True).encode("utf-8")).hexdigest()
+        return _value, _etag
+
+    def _refresh_loop(self):
+        """
+        Background refresh, loader errors are logged and previous data are kept
+        Database connection of this thread is managed as request ones are, broken one is closed after errors
+        """
+        from django.db import close_old_connections, connection
+
+        while True:
+            time.sleep(self._interval)
+            close_old_connections()
+
+            try:
+                _value, _etag = self._load()
+            except Exception as _e:
+                logging.exception(_e)
+                connection.close()
+
+                with self._lock:
+                    self._errors += 1
+
+                continue
+
+            with self._lock:
+                self._value, self._etag, self._loaded = _value, _etag, True
+                self._refreshes += 1
+
+    def get(self):
+        """
+        Get data snapshot, the data are loaded synchronously if absent
+        Loader exceptions are passed to the caller in this case
+        :return tuple: (data, etag)
+        """
+        if self._interval <= 0:
+            return self._load()
+
+        with self._lock:
+            if self._loaded:
+                self._hits += 1
+                return self._value, self._etag
+
+            self._misses += 1
+            self._value, self._etag = self._load()
+            self._loaded = True
+
+            if self._thread is None:
+                # started lazily to be run in the worker process, not in the master one
+                self._thread = threading.Thread(target=self._refresh_loop, daemon=True)
+                self._thread.start()
+
+            return self._value, self._etag
+
+    def clear(self):
+        """
+        Drop the data, so they are loaded again on next request
+        """
+        with self._lock:
+            self._value, self._etag, self._loaded = None, None, False
+
+    def stats(self):
+        """
+        Snapshot statistics
+        :return dict: counters
+        """
+        with self._lock:
+            return {
+                    "hits": self._hits,
+                    "misses": self._misses,
+                    "refreshes": self._refreshes,
+                    "errors": self._errors,
+                    "loaded": self._loaded,
+                    "interval": self._interval}
+
+
+def register(name, cache):
+    """
+    Register cache for statistics and cleanup
+    :param str name: cache name
+    :param cache: cache object with 'stats' and 'clear' methods
+    :return: cache registered
+    """
+    logging.debug("Registering cache [%s]", name)
+    _caches[name] = cache
+    return cache
+
+
+def get_stats():
+    """
+    Statistics for all caches registered
+    :return dict: {cache name: cache statistics}
+    """
+    return dict((_name, _cache.stats()) for _name, _cache in _caches.items())
+
+
+def clear_all():
+    """
+    Remove all entries from all caches registered
+    """
+    for _cache in _caches.values():
+        _cache.clear()
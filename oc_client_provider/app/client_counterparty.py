@@ -1,9 +1,17 @@
 import yaml
 import os
 import logging
+import threading
+
+# C-accelerated loader is much faster, but it may be absent if PyYAML is built without LibYAML
+_YAML_LOADER = getattr(yaml, "CLoader", yaml.Loader)
 
 class ClientCounterparty(object):
     def __init__(self):
+        self.__counterparty_path = None
+        self.__lock = threading.Lock()
+        self.__index = dict()
+        self.__stamp = None
         __enabled = bool(os.getenv("COUNTERPARTY_ENABLED", "").lower() in ["y", "yes", "true"])
 
         if not __enabled:
@@ -13,7 +21,38 @@ class ClientCounterparty(object):
         self.__counterparty_path = os.path.abspath(
                 os.getenv("COUNTERPARTY_PATH") or 'client_counterparties.yml')
 
-        logging.debug("Counerparty configuration path: [%s]" % self.__counterparty_path)
+        logging.debug("Counerparty configuration path: [%s]", self.__counterparty_path)
+
+    def __get_index(self):
+        """
+        Get counterparties index, configuration file is re-read only if its modification time or size is changed
+        :return dict: {client_code: counterparty}
+        """
+        _stat = os.stat(self.__counterparty_path)
+        _stamp = (_stat.st_mtime_ns, _stat.st_size)
+
+        if _stamp == self.__stamp:
+            return self.__index
+
+        with self.__lock:
+            if _stamp == self.__stamp:
+                # re-loaded by another thread
+                return self.__index
+
+            logging.debug("Loading counterparty configuration from [%s]", self.__counterparty_path)
+
+            with open(self.__counterparty_path) as _stream:
+                _data = yaml.load(_stream, Loader=_YAML_LOADER)
+
+            # fix possible None in "data" loaded. Example - when source YAML is empty
+            if not _data:
+                logging.debug("Counterparty configuration is empty")
+                _data = dict()
+
+            # replace both at once, readers get either old or new index
+            self.__index, self.__stamp = _data, _stamp
+
+        return self.__index
 
     def client_counterparty (self, client_code):
         """
@@ -21,23 +60,28 @@ class ClientCounterparty(object):
         :param client_code: client code
         :return: client counterparty
         """
-        if not hasattr(self, "__counterparty_path") or not self.__counterparty_path:
+        if not self.__counterparty_path:
             logging.debug("Counterparty is disabled, returning empty string")
             return ''
 
-        with open(self.__counterparty_path) as _stream:
-            _data = yaml.load (_stream, Loader=yaml.Loader)
-
-        # fix possible None in "data" loaded. Example - when source YAML is empty
-        if not _data:
-            logging.debug("Counterparty configuration is empty, returning empty string")
-            return ''
-
-        _result = _data.get(client_code)
+        _result = self.__get_index().get(client_code)
 
         if not _result:
-            logging.debug("Counterparty not found for [%s], returning empty string" % client_code)
+            logging.debug("Counterparty not found for [%s], returning empty string", client_code)
             return ''
 
-        logging.debug("Returning [%s] for client [%s]" % (_result, client_code))
+        logging.debug("Returning [%s] for client [%s]", _result, client_code)
         return _result
+
+    def client_counterparties(self, client_codes):
+        """
+        Get counterparties for several clients
+        :param list client_codes: client codes
+        :return dict: {client_code: client counterparty}, empty string is set for clients without counterparty
+        """
+        if not self.__counterparty_path:
+            logging.debug("Counterparty is disabled, returning empty strings")
+            return dict((_code, '') for _code in client_codes)
+
+        _index = self.__get_index()
+        return dict((_code, _index.get(_code) or '') for _code in client_codes)
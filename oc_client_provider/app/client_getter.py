@@ -1,13 +1,95 @@
 import pytz
 import logging
 from datetime import datetime
-from itertools import chain
+from itertools import chain, islice
+from collections import namedtuple
 import posixpath
+import bisect
+import os
+import json
+import base64
+import binascii
+from . import cache
+from . import groupids
+from . import logs
+from . import profiling
+from .deadline import DeadlineExceeded
+from ..file_index import indexer
+
+# maximal number of values in a single '__in' query
+# note that SQLite is limited to 999 variables per statement in old versions
+_BULK_QUERY_CHUNK_SIZE = 500
+
+# columns of dlmanager.models.Delivery (and related) necessary for building the response
+# deliveries are fetched as named tuples with these attributes instead of full model instances
+_DELIVERY_FIELDS = (
+        'id',
+        'groupid',
+        'artifactid',
+        'version',
+        'mf_delivery_author',
+        'mf_delivery_files_specified',
+        'mf_tag_svn',
+        'creation_date',
+        'comment',
+        'flag_approved',
+        'flag_uploaded',
+        'flag_failed',
+        'business_status__description')
+
+# compact response rows, CSV and JSON writers consume them directly
+DeliveryRow = namedtuple("DeliveryRow", ["name", "gav", "author", "creation_date", "status", "files"])
+DeliveryRowV2 = namedtuple("DeliveryRowV2", [
+    "name", "gav", "author", "creation_date", "creation_date_mr", "status", "files"])
+
+
+def _row_to_dict(row):
+    """
+    Convert response row to dictionary with the same keys order
+    :param row: DeliveryRow or DeliveryRowV2
+    :return dict:
+    """
+    return dict(zip(row._fields, row))
+
+
+# combined regular expressions for component searches, see ClientGetter._get_component_regex
+_component_regex_cache = cache.register("component_regex", cache.TTLCache(
+    max_size=int(os.getenv("COMPONENT_REGEX_CACHE_SIZE") or 256),
+    ttl=float(os.getenv("COMPONENT_REGEX_CACHE_TTL") or 300)))
+
+# marker for absent cache entry since None is cached also
+_NOT_CACHED = object()
+
+# client code to deliveries groupids, see ClientGetter._get_client_query
+_groupid_resolver = cache.register("groupids", groupids.GroupIdResolver(
+    refresh_interval=float(os.getenv("GROUPIDS_REFRESH_INTERVAL") or 10),
+    max_clients=int(os.getenv("GROUPIDS_CLIENTS_CACHE_SIZE") or 10000)))
+
+# client deliveries state for search results cache keys, see ClientGetter._get_deliveries_watermark
+_groupid_watermarks = cache.register("watermarks", groupids.GroupIdWatermarks())
+
+# results of deliveries searches, see ClientGetter.get_deliveries_stream
+# shared by worker processes if directory is configured, per-process otherwise
+_DELIVERIES_CACHE_SIZE = int(os.getenv("DELIVERIES_CACHE_SIZE") or 128)
+# estimated size in memory of all the results cached, or size of cache files
+_DELIVERIES_CACHE_MAX_BYTES = int(os.getenv("DELIVERIES_CACHE_MAX_BYTES") or 256 * 1024 * 1024)
+_deliveries_cache = cache.register("deliveries", cache.create(
+    max_size=_DELIVERIES_CACHE_SIZE,
+    ttl=float(os.getenv("DELIVERIES_CACHE_TTL") or 60),
+    path=os.getenv("DELIVERIES_CACHE_PATH"),
+    max_bytes=_DELIVERIES_CACHE_MAX_BYTES))
+
+# larger search results are not cached
+_DELIVERIES_CACHE_MAX_ROWS = int(os.getenv("DELIVERIES_CACHE_MAX_ROWS") or 10000)
 
 
 ## NOTE: imports of django-related things are done in the methods where they necessary
 ##       in case of global import 'unittest discover' command fails because Django is not configured yet
 
+class InvalidCursorError(ValueError):
+    pass
+
+
 class ClientGetter:
     """
     Checks artifacts existence in the DB using their GAVs
@@ -15,7 +97,7 @@ class ClientGetter:
 
     def get_clients(self):
         """
-        Returns list of active clients
+        Returns list of active clients sorted by code
         :return list: list of strings client codes or empty list
         """
         logging.debug("Reached get_clients")
@@ -23,9 +105,9 @@ class ClientGetter:
         try:
             # get filtered records from DB, exclude those who does not have client code filled
             from oc_delivery_apps.dlmanager.models import Client
-            records = Client.objects.filter(is_active=True)
-            records = list(map(lambda x: x.code, records))
-            records = list(filter(lambda x: bool(x), records))
+            records = Client.objects.filter(is_active=True).exclude(code__isnull=True).exclude(code='')
+            # sorted by code points, database collation may ignore case and punctuation
+            records = sorted(records.values_list('code', flat=True))
         except Client.DoesNotExist as err:
             logging.exception(err)
             return list()
@@ -39,13 +121,13 @@ class ClientGetter:
         :return dict: client data or None
         """
         logging.debug('Reached get_client_data')
-        logging.debug('Requested code for id [%s]' % client_id)
+        logging.debug('Requested code for id [%s]', client_id)
 
         # get data for specific client, fiter by id
 
         try:
             from oc_delivery_apps.dlmanager.models import Client
-            record = Client.objects.get(id=client_id)
+            record = Client.objects.select_related('language').get(id=client_id)
 
             if not record:
                 # this should never happen since DoesNotExist is usually raised for this
@@ -55,7 +137,7 @@ class ClientGetter:
             logging.exception(_e)
             return None
 
-        logging.debug('Fetched [%s]' % record)
+        logging.debug('Fetched [%s]', record)
 
         # all fields are not required to be filled by models, so do not forget to filter 'language'
         # since this is the only place where exception may be raised
@@ -64,10 +146,48 @@ class ClientGetter:
                 'country': record.country,
                 'language': record.language.code if record.language else ''}
 
-        logging.debug("Returning '%s'" % str(res))
+        logging.debug("Returning '%s'", res)
 
         return res
 
+    def get_client_data_list(self, client_ids, client_codes):
+        """
+        Returns data for several clients by ids and/or codes with a single query
+        :param list client_ids: client ids (primary keys)
+        :param list client_codes: client codes
+        :return tuple: ({client_id: client data or None}, {client_code: client data or None})
+        """
+        logging.debug('Reached get_client_data_list')
+        from oc_delivery_apps.dlmanager.models import Client
+        from django.db.models import Q
+
+        _ids = dict((_id, None) for _id in client_ids)
+        _codes = dict((_code, None) for _code in client_codes)
+
+        if not _ids and not _codes:
+            return _ids, _codes
+
+        # language is joined in the same query, empty string is returned if not set
+        _records = Client.objects.filter(Q(id__in=list(_ids)) | Q(code__in=list(_codes))).values_list(
+                'id', 'code', 'country', 'language__code', named=True)
+
+        for _record in _records:
+            _data = {'code': _record.code,
+                     'country': _record.country,
+                     'language': _record.language__code or ''}
+
+            if _record.id in _ids:
+                _ids[_record.id] = _data
+
+            if _record.code in _codes:
+                _codes[_record.code] = _data
+
+        logging.debug("Found [%d] of [%d] ids and [%d] of [%d] codes",
+            len(list(filter(None, _ids.values()))), len(_ids),
+            len(list(filter(None, _codes.values()))), len(_codes))
+
+        return _ids, _codes
+
     def get_client_lang_list(self, client_code_list):
         """
         Converts list of client codes to dict client_code: client_lang
@@ -77,7 +197,7 @@ class ClientGetter:
         """
         try:
             from oc_delivery_apps.dlmanager.models import Client
-            client_records = Client.objects.filter(code__in=client_code_list)
+            client_records = Client.objects.filter(code__in=client_code_list).select_related('language')
             client_records = list(filter(lambda x: bool(x) and bool(x.code), client_records))
             client_records = dict((x.code, x.language.code if x.language else '') for x in client_records)
         except Client.DoesNotExist as e:
@@ -93,14 +213,14 @@ class ClientGetter:
         :return: list of Component (one for CiType or multiple for CiTypeGroup)
         """
         logging.debug('Reached _resolve_search_components')
-        logging.debug('The code is [%s]' % code)
+        logging.debug('The code is [%s]', code)
         from oc_delivery_apps.checksums.models import CiTypeGroups, CiTypeIncs, CiTypes
 
         try:
             group = CiTypeGroups.objects.get(code=code)
-            components_codes = [inclusion.ci_type.code for inclusion in CiTypeIncs.objects.filter(ci_type_group=group)]
+            component_codes = [inclusion.ci_type_id for inclusion in CiTypeIncs.objects.filter(ci_type_group=group)]
         except CiTypeGroups.DoesNotExist:
-            logging.debug('No ci_type_group found for code [%s].' % (code))
+            logging.debug('No ci_type_group found for code [%s].', code)
             component_codes = None
 
         if component_codes is None:
@@ -110,15 +230,43 @@ class ClientGetter:
 
         from oc_delivery_apps.checksums.Component import Component
         components = list(map(lambda x: Component(x), 
-            CiTypes.objects.filter(code__in=components_codes)))
+            CiTypes.objects.filter(code__in=component_codes)))
 
         if not components:
             # empty list
-            logging.warning("No ci_types found for code [%s]." % code)
+            logging.warning("No ci_types found for code [%s].", code)
             return None
 
         return components
 
+    def _get_component_regex(self, component_code, component_version):
+        """
+        Get combined regular expression to search deliveries for component (or components group) of version given
+        Results are cached in-process since types and regexps are changed very rarely
+        :param str component_code: CiType.code or CiTypeGroup.code
+        :param str component_version: component version (prefix)
+        :return str: combined regular expression, empty string or None if no types found
+        """
+        _key = (component_code, component_version)
+        combined_regex = _component_regex_cache.get(_key, _NOT_CACHED)
+
+        if combined_regex is not _NOT_CACHED:
+            logging.debug('Cached regexp to search for [%s] (v. [%s]): %s',
+                component_code, component_version, combined_regex)
+            return combined_regex
+
+        components = self._resolve_search_components(component_code)
+        combined_regex = None
+
+        if components:
+            templates = list(chain(*[component.get_templates(component_version)
+                for component in components]))
+            combined_regex = '|'.join(templates)
+            logging.debug('Regexp to search for [%s] (v. [%s]): %s', component_code, component_version, combined_regex)
+
+        _component_regex_cache.set(_key, combined_regex)
+        return combined_regex
+
     def __fix_date_range_search_params(self, search_params):
         """
         This conversion is added for old Django compatibility.
@@ -142,31 +290,35 @@ class ClientGetter:
 
             if v in search_params.keys():
                 # preferre new-style formatted value, exclude old one and ignore
-                logging.warning("Ignoring search parameter [%s], using [%s] only" % (k, v))
+                logging.warning("Ignoring search parameter [%s], using [%s] only", k, v)
                 del(search_params[k])
                 continue
 
-            logging.warning("Converting search parameter [%s] to new-style [%s]" % (k, v))
+            logging.warning("Converting search parameter [%s] to new-style [%s]", k, v)
             search_params[v] = search_params[k]
             del(search_params[k])
 
 
         return search_params
 
+    @profiling.timed("search")
     def _process_search_params(self, client_code, search_params, timezone):
         # TODO: split this monstreous method to short separate steps and apply unit-tests for them
         """
         Process search params into DB query
-        :param str client_code: client code
+        :param client_code: client code, or list of client codes to search deliveries of all them at once
         :param dict search_params: search filters for current client deliveries
         :param str timezone: str
         :return: Django Queryset for the given parameters
         """
         logging.info('Reached _process_search_params')
-        logging.debug('Client code: [%s]' % client_code)
-        logging.debug('Search Params: %s' % str(search_params))
+        logging.debug('Client code: [%s]', client_code)
+        logging.debug('Search Params: %s', search_params)
 
         db_query = dict()
+        # files filters are not plain lookups since files index may be used for them
+        db_filters = list()
+        _client_query = self._get_client_query(client_code)
 
         if search_params:
             # Common fields mapping for both FILE and Component search
@@ -178,38 +330,32 @@ class ClientGetter:
 
             component_code = search_params.get('component_0')
 
-            logging.debug('Component code: [%s]' % component_code)
+            logging.debug('Component code: [%s]', component_code)
             db_query = dict((search_params_mapping_to_db[key], value) for key, value in search_params.items(
                         ) if key in search_params_mapping_to_db.keys() and value)
-            logging.debug('Common db_query: %s' % str(db_query))
+            logging.debug('Common db_query: %s', db_query)
 
             # Adding files/components filters to the query
             if component_code == 'FILE':
                 _c1 = search_params.get("component_1")
 
                 if _c1:
-                    db_query.update({"mf_delivery_files_specified__contains": _c1})
+                    db_filters.append(indexer.search_filter(
+                        "mf_delivery_files_specified__contains", "path__contains", _c1, _client_query))
 
-                logging.debug('Updated db_query for FILE: %s' % str(db_query))
+                logging.debug('Updated db_filters for FILE: %s', db_filters)
 
             elif component_code:
                 logging.debug('Not a "FILE" requested as component, searching using the type given')
-                components = self._resolve_search_components(component_code)
-
-                if components:
-                    _component_version = search_params.get('component_1') or ""
-                    templates = list(chain(*[component.get_templates(_component_version)
-                        for component in components]))
-                    combined_regex = '|'.join(templates)
-                    logging.debug('Regexp to search for [%s] (v. [%s]): %s' % (
-                        component_code, _component_version, combined_regex))
+                combined_regex = self._get_component_regex(component_code, search_params.get('component_1') or "")
 
-                    if combined_regex:
-                        # regexps for all types requested may be absent in the database,
-                        # so 'combined regex' may be empty even if 'components' are not
-                        db_query.update({"mf_delivery_files_specified__iregex": combined_regex})
+                if combined_regex:
+                    # regexps for all types requested may be absent in the database,
+                    # so 'combined regex' may be empty even if 'components' are not
+                    db_filters.append(indexer.search_filter(
+                        "mf_delivery_files_specified__iregex", "path__iregex", combined_regex, _client_query))
 
-                logging.debug('Updated db_query: %s' % str(db_query))
+                logging.debug('Updated db_filters: %s', db_filters)
 
             # Adding flags to the query
             flags_mapping_to_db = {
@@ -230,7 +376,7 @@ class ClientGetter:
                     continue
 
                 db_value = bool(value == '2')
-                logging.debug('Adding [%s]:[%s] query' % (flags_mapping_to_db[key], db_value))
+                logging.debug('Adding [%s]:[%s] query', flags_mapping_to_db[key], db_value)
                 db_query.update({flags_mapping_to_db[key]: db_value})
 
             # Adding time range fields to the query
@@ -245,7 +391,7 @@ class ClientGetter:
                     ) if key in ["date_range_after", "date_range_before"] and value)
 
             if date_range_requested:
-                logging.debug('Date range requested: [%s]' % date_range_requested)
+                logging.debug('Date range requested: [%s]', date_range_requested)
                 start_date = date_range_requested.get('date_range_after')
                 end_date = date_range_requested.get('date_range_before')
 
@@ -262,12 +408,12 @@ class ClientGetter:
 
 
         # Adding filtration by client_code
-        db_query.update({"groupid__endswith": client_code})
+        db_query.update(_client_query)
 
-        logging.debug("Final query: %s" % str(db_query))
+        logging.debug("Final query: %s, filters: %s", db_query, db_filters)
 
         from oc_delivery_apps.dlmanager.models import Delivery
-        search_queryset = Delivery.objects.filter(**db_query)
+        search_queryset = Delivery.objects.filter(*db_filters, **db_query)
 
         # enhanced queryset workaround for 'project' parameter (delivery_name lambda property)
         # necessary since Django rids of 'lambda' properties comparison directly, so this will not work:
@@ -279,10 +425,110 @@ class ClientGetter:
             from django.db.models.functions import Concat
             fullname_annotation = Concat(F("artifactid"), Value("-"), F("version"), output_field=CharField())
             enhanced_search_queryset = search_queryset.annotate(annotated_delivery_name=fullname_annotation)
-            search_queryset = enhanced_search_queryset.filter(annotated_delivery_name__icontains=_prj)
+            # annotated name is compared for deliveries not indexed yet only, if index is used
+            search_queryset = enhanced_search_queryset.filter(indexer.name_filter(
+                "annotated_delivery_name__icontains", _prj, _client_query))
 
         return search_queryset
 
+    def _get_client_query(self, client_code):
+        """
+        Get lookups for the client deliveries
+        Deliveries groupids ending with client code are resolved in advance, so the index on groupid is used
+        :param client_code: client code or list of client codes
+        :return dict: lookups for dlmanager.models.Delivery (and its history)
+        """
+        if isinstance(client_code, str):
+            return {"groupid__in": _groupid_resolver.resolve(client_code)}
+
+        return {"groupid__in": sorted(set(chain(*map(_groupid_resolver.resolve, client_code))))}
+
+    def _get_deliveries_watermark(self, client_code):
+        """
+        Get state of the client deliveries which is changed with any delivery creation, modification or deletion
+        Deliveries tables are not filtered by groupid here, changes are tracked by primary key ranges
+        :param str client_code: client code
+        :return tuple: (the newest delivery id, the newest delivery history record id)
+        """
+        return _groupid_watermarks.get(_groupid_resolver.resolve(client_code))
+
+    @profiling.timed("cache")
+    def _get_search_cache_key(self, client_code, search_params, timezone, v2):
+        """
+        Get deliveries cache key, search params are normalized so equivalent searches share the key
+        :param str client_code: client code
+        :param dict search_params: search filters
+        :param str timezone: timezone
+        :param bool v2: version 2 format requested
+        :return tuple: cache key
+        """
+        _params = self.__fix_date_range_search_params(dict(search_params))
+
+        # empty values are ignored by the search
+        _params = dict((_k, _v) for _k, _v in _params.items() if _v is not None and _v != "")
+
+        return (client_code, json.dumps(_params, sort_keys=True), timezone, bool(v2),
+                self._get_deliveries_watermark(client_code))
+
+    def _cache_deliveries(self, key, rows):
+        """
+        Pass rows through and cache them all if iteration is completed
+        :param tuple key: cache key
+        :param rows: iterator over response rows
+        :return: generator of response rows
+        """
+        _cached = list()
+        _size = 0
+
+        for _row in rows:
+            if _cached is not None:
+                _cached.append(_row)
+                _size += cache.estimate_size(_row)
+
+                if len(_cached) > _DELIVERIES_CACHE_MAX_ROWS or \
+                        (_DELIVERIES_CACHE_MAX_BYTES and _size > _DELIVERIES_CACHE_MAX_BYTES):
+                    logging.debug("Too many deliveries to cache")
+                    _cached = None
+
+            yield _row
+
+        if _cached is not None:
+            _deliveries_cache.set(key, _cached, size=_size)
+
+    def _get_delivery_rows(self, delivery_records):
+        """
+        Restrict deliveries queryset to the columns necessary for the response
+        Business status is joined to the same query
+        :param delivery_records: Django Queryset of dlmanager.models.Delivery
+        :return: Django Queryset of named tuples with '_DELIVERY_FIELDS' attributes
+        """
+        return delivery_records.values_list(*_DELIVERY_FIELDS, named=True)
+
+    def _get_delivery_name(self, delivery):
+        """
+        The same as dlmanager.models.Delivery.delivery_name
+        :param delivery: delivery row
+        :return str: delivery name
+        """
+        return delivery.artifactid + "-" + delivery.version
+
+    def _get_delivery_gav(self, delivery):
+        """
+        The same as dlmanager.models.Delivery.gav
+        :param delivery: delivery row
+        :return str: delivery GAV
+        """
+        return ":".join([delivery.groupid, delivery.artifactid, delivery.version, "zip"])
+
+    def _get_delivery_serializer(self, timezone, v2=False):
+        """
+        Get converter of delivery rows to response rows, it is to be created once per request
+        :param str timezone: timezone
+        :param bool v2: convert deliveries to version 2 format
+        :return DeliverySerializer: serializer
+        """
+        return DeliverySerializer(self, timezone, v2=v2)
+
     def get_deliveries(self, client_code, search_params, timezone):
         """
         Gathering deliveries for specified client
@@ -291,25 +537,14 @@ class ClientGetter:
         :param str timezone: timezone
         :return tuple: (list of delivery objects, error message)
         """
-        logging.info('Looking for [%s] deliveries with search params: %s' % (client_code, str(search_params)))
+        logging.info('Looking for [%s] deliveries with search params: %s', client_code, search_params)
 
         try:
             delivery_records = self._process_search_params(client_code, search_params, timezone)
-            logging.info('Found %d records for client [%s]' % (delivery_records.count(), client_code))
-            if not delivery_records:
-                return list(), None
-
-            # TODO: change date format to YYYY-MM-DD HH24:MM:SS (traditionally used in other places)
-            delivery_records = list(map(lambda x: {
-                        'name': x.delivery_name,
-                        'gav': x.gav,
-                        'author': x.mf_delivery_author,
-                        'creation_date': x.creation_date.astimezone(
-                            tz=pytz.timezone(timezone)).strftime("%b %d %Y %H:%M:%S"),
-                        'status': x.comment,
-                        'files': ';'.join(x.mf_delivery_files_specified.split('\n'))}, delivery_records))
-
-            return delivery_records, None
+            return list(map(_row_to_dict, self._iter_deliveries(delivery_records, timezone))), None
+
+        except DeadlineExceeded:
+            raise
 
         except Exception as e:
             logging.exception(e)
@@ -325,90 +560,496 @@ class ClientGetter:
         :param str timezone: timezone
         :return tuple: list of delivery objects, error message
         """
-        logging.info('V2: Looking for [%s] deliveries with search params: %s' %(client_code, str(search_params)))
+        logging.info('V2: Looking for [%s] deliveries with search params: %s', client_code, search_params)
 
         try:
             delivery_records = self._process_search_params(client_code, search_params, timezone)
-            logging.info('Found %d records for customer [%s]' % (delivery_records.count(), client_code))
+            return list(map(_row_to_dict, self._iter_deliveries(delivery_records, timezone, v2=True))), None
+
+        except DeadlineExceeded:
+            raise
+
+        except Exception as e:
+            logging.exception(e)
+            error = str(e)
+
+        return list(), error
+
+    def get_deliveries_by_clients(self, client_codes, search_params, timezone):
+        """
+        Gathering deliveries for several clients with the same search params at once
+        Deliveries of all clients are fetched with a single query
+        :param list client_codes: client codes, duplicates are ignored
+        :param dict search_params: search filters
+        :param str timezone: timezone
+        :return tuple: ({client code: list of delivery objects in version 2 format}, error message)
+        """
+        # order is kept, a duplicate would get every delivery twice
+        client_codes = list(dict.fromkeys(client_codes))
+        logging.info('V2: Looking for deliveries of [%d] clients with search params: %s',
+            len(client_codes), search_params)
+
+        try:
+            delivery_records = self._process_search_params(client_codes, search_params, timezone)
 
-            if not delivery_records:
-                return list(), None
+            # a groupid may end with several client codes
+            _clients_by_groupid = dict()
 
-            delivery_records = list(map(lambda x: {
-                        'name': x.delivery_name,
-                        'gav': x.gav,
-                        'author': x.mf_delivery_author,
-                        'creation_date': x.creation_date.astimezone(
-                            tz=pytz.timezone(timezone)).strftime("%b %d %Y %H:%M:%S"),
-                        'creation_date_mr': x.creation_date.astimezone(
-                            tz=pytz.timezone(timezone)).strftime("%Y%m%d%H%M%S"),
-                        'status': x.business_status.description if x.business_status else x.get_flags_description(),
-                        'files': self._get_files(x)}, delivery_records))
+            for _client_code in client_codes:
+                for _groupid in _groupid_resolver.resolve(_client_code):
+                    _clients_by_groupid.setdefault(_groupid, list()).append(_client_code)
 
-            return delivery_records, None
+            _result = dict((_client_code, list()) for _client_code in client_codes)
+
+            for _groupid, _row in self._iter_deliveries(delivery_records, timezone, v2=True, with_groupid=True):
+                _delivery = _row_to_dict(_row)
+
+                for _client_code in _clients_by_groupid.get(_groupid, list()):
+                    _result[_client_code].append(_delivery)
+
+            return _result, None
+
+        except DeadlineExceeded:
+            raise
 
         except Exception as e:
             logging.exception(e)
             error = str(e)
 
-        return list(), error
+        return dict(), error
 
-    def _get_files(self, delivery):
+    def get_deliveries_changes(self, client_code, timezone, watermark=None):
         """
-        Convert string field with delivery files to a list of dictionaries with files details
-        :param dlmanager.models.Delivery delivery: delivery record
-        :return list(dict()): list of dictionaries with files details
+        Gathering client deliveries created, modified or deleted since the watermark.
+        Deliveries created are looked up by id and modified or deleted ones by history record id,
+            so the cost is proportional to the number of changes (all deliveries are returned without watermark).
+        Rows within the ranges are matched by groupid suffix, not by groupids resolved in advance,
+            since groupids appeared after the resolver refresh would be skipped while covered by the watermark.
+        Modifications bypassing history (bulk updates) are not noticed.
+        :param str client_code: client code
+        :param str timezone: timezone
+        :param str watermark: opaque watermark returned with the previous changes, None to get all deliveries
+        :return tuple: (dict with deliveries in version 2 format, GAVs of deleted ones and new watermark,
+            error message)
+        :raises InvalidCursorError: if watermark can not be parsed
+        """
+        from django.db.models import Max
+        from oc_delivery_apps.dlmanager.models import Delivery
+        logging.info('Looking for [%s] deliveries changes since [%s]', client_code, watermark)
+
+        # decode watermark before querying: it is a client error and should not be reported as internal one
+        if watermark:
+            watermark = self._decode_watermark(watermark)
+
+        try:
+            # new watermark is taken first, so changes made meanwhile are returned the next time
+            _last_id = Delivery.objects.aggregate(_max=Max('id')).get('_max') or 0
+            _last_history_id = Delivery.history.aggregate(_max=Max('history_id')).get('_max') or 0
+            removed = list()
+
+            if not watermark:
+                # groupids are fetched after the watermark is taken, so all the deliveries covered are found
+                _groupid_resolver.load(force=True)
+                delivery_records = Delivery.objects.filter(id__lte=_last_id, **self._get_client_query(client_code))
+            else:
+                _id, _history_id = watermark
+                _ids = set(Delivery.objects.filter(id__gt=_id, id__lte=_last_id,
+                    groupid__endswith=client_code).values_list('id', flat=True))
+
+                for _record in Delivery.history.filter(history_id__gt=_history_id, history_id__lte=_last_history_id,
+                        groupid__endswith=client_code).only('id', 'groupid', 'artifactid', 'version', 'history_type'):
+                    _ids.add(_record.id)
+
+                    if _record.history_type == '-':
+                        removed.append(self._get_delivery_gav(_record))
+
+                delivery_records = Delivery.objects.filter(id__in=_ids, groupid__endswith=client_code)
+                logging.debug('Changed deliveries: [%d], removed: [%d]', len(_ids), len(removed))
+
+            deliveries = list(map(_row_to_dict, self._iter_deliveries(delivery_records.order_by('id'), timezone,
+                v2=True)))
+
+            return {
+                    "deliveries": deliveries,
+                    "removed": sorted(set(removed)),
+                    "watermark": self._encode_watermark(_last_id, _last_history_id)}, None
+
+        except DeadlineExceeded:
+            raise
+
+        except Exception as e:
+            logging.exception(e)
+            error = str(e)
+
+        return dict(), error
+
+    def get_deliveries_stream(self, client_code, search_params, timezone, v2=False):
+        """
+        Gathering deliveries for specified client without loading them all in memory
+        The first delivery is fetched before returning, so query errors and empty result are reported here,
+            but errors may still be raised while iterating
+        :param str client_code: client code
+        :param dict search_params: search filters
+        :param str timezone: timezone
+        :param bool v2: return deliveries in version 2 format
+        :return tuple: (iterator over delivery objects or None if nothing found, error message)
+        """
+        logging.info('Streaming [%s] deliveries (v2=%s) with search params: %s', client_code, v2, search_params)
+
+        try:
+            _key = None
+
+            if _DELIVERIES_CACHE_SIZE:
+                _key = self._get_search_cache_key(client_code, search_params, timezone, v2)
+                _cached = _deliveries_cache.get(_key)
+
+                if _cached is not None:
+                    logging.info('Found %d cached records', len(_cached))
+                    return (iter(_cached) if _cached else None), None
+
+            delivery_records = self._process_search_params(client_code, search_params, timezone)
+            delivery_records = self._iter_deliveries(delivery_records, timezone, v2=v2)
+
+            if _key is not None:
+                delivery_records = self._cache_deliveries(_key, delivery_records)
+
+            _first = next(delivery_records, None)
+
+            if _first is None:
+                logging.info('No records found for client [%s]', client_code)
+                return None, None
+
+            return chain([_first], delivery_records), None
+
+        except DeadlineExceeded:
+            raise
+
+        except Exception as e:
+            logging.exception(e)
+            error = str(e)
+
+        return None, error
+
+    def _iter_deliveries(self, delivery_records, timezone, v2=False, with_groupid=False):
+        """
+        Convert delivery records to response rows chunk by chunk using server-side cursor
+        :param delivery_records: Django Queryset of dlmanager.models.Delivery
+        :param str timezone: timezone
+        :param bool v2: return deliveries in version 2 format
+        :param bool with_groupid: yield delivery groupid with each row
+        :return: generator of DeliveryRow (or DeliveryRowV2), or of tuples (groupid, row) if 'with_groupid'
         """
-        logging.debug("Reached _get_files, Delivery id is [%d]" % delivery.id)
+        _records = self._get_delivery_rows(delivery_records).iterator(chunk_size=_BULK_QUERY_CHUNK_SIZE)
+        _serializer = self._get_delivery_serializer(timezone, v2=v2)
+        _count = 0
+
+        while True:
+            with profiling.phase("fetch"):
+                _chunk = list(islice(_records, _BULK_QUERY_CHUNK_SIZE))
+
+            if not _chunk:
+                break
+
+            _count += len(_chunk)
+
+            # files are resolved for the whole chunk at once
+            file_records = self._resolve_file_records(_chunk) if v2 else None
+
+            with profiling.phase("serialize"):
+                _rows = list(map(lambda x: _serializer(x, file_records), _chunk))
+
+            if with_groupid:
+                yield from zip(map(lambda x: x.groupid, _chunk), _rows)
+            else:
+                yield from _rows
+
+        logging.info('Found %d records', _count)
+
+    def get_deliveries_page(self, client_code, search_params, timezone, limit, cursor=None, v2=False):
+        """
+        Gathering one page of deliveries for specified client.
+        Keyset pagination is used: deliveries are ordered by (creation_date, id),
+            the cursor points to the last delivery of the previous page.
+        :param str client_code: client code
+        :param dict search_params: search filters
+        :param str timezone: timezone
+        :param int limit: maximal number of deliveries on the page
+        :param str cursor: opaque cursor returned with the previous page, None for the first page
+        :param bool v2: return deliveries in version 2 format
+        :return tuple: (list of delivery objects, next page cursor or None, error message)
+        :raises InvalidCursorError: if cursor can not be parsed
+        """
+        logging.info('Looking for [%s] deliveries page (limit=%d, cursor=%s) with search params: %s',
+            client_code, limit, cursor, search_params)
+
+        # decode cursor before querying: it is a client error and should not be reported as internal one
+        if cursor:
+            cursor = self._decode_cursor(cursor)
 
+        try:
+            delivery_records = self._process_search_params(client_code, search_params, timezone)
+            delivery_records = self._paginate(delivery_records, limit, cursor)
+            next_cursor = None
+
+            # one more record is fetched to know whether the next page exists
+            if len(delivery_records) > limit:
+                delivery_records = delivery_records[:limit]
+                next_cursor = self._encode_cursor(delivery_records[-1])
+
+            logging.info('Found %d records on the page for client [%s]', len(delivery_records), client_code)
+
+            _serializer = self._get_delivery_serializer(timezone, v2=v2)
+
+            if v2:
+                file_records = self._resolve_file_records(delivery_records)
+                delivery_records = list(map(lambda x: _row_to_dict(_serializer(x, file_records)),
+                    delivery_records))
+            else:
+                delivery_records = list(map(lambda x: _row_to_dict(_serializer(x)), delivery_records))
+
+            return delivery_records, next_cursor, None
+
+        except DeadlineExceeded:
+            raise
+
+        except Exception as e:
+            logging.exception(e)
+            error = str(e)
+
+        return list(), None, error
+
+    def _paginate(self, queryset, limit, cursor):
+        """
+        Apply keyset ordering and filtering to the deliveries queryset
+        :param queryset: Django Queryset of dlmanager.models.Delivery
+        :param int limit: maximal number of deliveries on the page
+        :param tuple cursor: decoded cursor (creation_date, id), None for the first page
+        :return list: up to 'limit + 1' delivery rows
+        """
+        from django.db.models import F, Q
+        queryset = queryset.order_by(F('creation_date').asc(nulls_first=True), 'id')
+
+        if cursor:
+            _creation_date, _id = cursor
+
+            if _creation_date is None:
+                queryset = queryset.filter(
+                        Q(creation_date__isnull=True, id__gt=_id) | Q(creation_date__isnull=False))
+            else:
+                queryset = queryset.filter(
+                        Q(creation_date__gt=_creation_date) | Q(creation_date=_creation_date, id__gt=_id))
+
+        return list(self._get_delivery_rows(queryset)[:limit + 1])
+
+    def _encode_cursor(self, delivery):
+        """
+        Make opaque cursor pointing to the delivery given
+        :param delivery: delivery row (see _get_delivery_rows)
+        :return str: cursor
+        """
+        _creation_date = delivery.creation_date.isoformat() if delivery.creation_date else None
+        _cursor = json.dumps([_creation_date, delivery.id]).encode('utf-8')
+        return base64.urlsafe_b64encode(_cursor).decode('ascii')
+
+    def _decode_cursor(self, cursor):
+        """
+        Parse opaque cursor
+        :param str cursor: cursor made by '_encode_cursor'
+        :return tuple: (creation_date, id)
+        """
+        from django.utils.dateparse import parse_datetime
+
+        try:
+            _creation_date, _id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+
+            if _creation_date is not None:
+                _creation_date = parse_datetime(_creation_date)
+
+                if _creation_date is None:
+                    raise ValueError("Invalid date")
+
+            if not isinstance(_id, int):
+                raise ValueError("Invalid id")
+
+        except (ValueError, TypeError, UnicodeError, binascii.Error) as _e:
+            raise InvalidCursorError("Invalid cursor: [%s]" % cursor) from _e
+
+        return _creation_date, _id
+
+    def _encode_watermark(self, last_id, last_history_id):
+        """
+        Make opaque watermark of deliveries changes
+        :param int last_id: the newest delivery id
+        :param int last_history_id: the newest delivery history record id
+        :return str: watermark
+        """
+        _watermark = json.dumps([last_id, last_history_id]).encode('utf-8')
+        return base64.urlsafe_b64encode(_watermark).decode('ascii')
+
+    def _decode_watermark(self, watermark):
+        """
+        Parse opaque watermark
+        :param str watermark: watermark made by '_encode_watermark'
+        :return tuple: (the newest delivery id, the newest delivery history record id)
+        """
+        try:
+            _last_id, _last_history_id = json.loads(base64.urlsafe_b64decode(watermark.encode('ascii')).decode('utf-8'))
+
+            if not all(isinstance(_x, int) and not isinstance(_x, bool) for _x in (_last_id, _last_history_id)):
+                raise ValueError("Invalid id")
+
+        except (ValueError, TypeError, UnicodeError, binascii.Error) as _e:
+            raise InvalidCursorError("Invalid watermark: [%s]" % watermark) from _e
+
+        return _last_id, _last_history_id
+
+    def _split_files(self, delivery):
+        """
+        Split string field with delivery files to a list of paths
+        :param delivery: delivery row (see _get_delivery_rows)
+        :return list(str): list of paths as specified in the delivery
+        """
         if not isinstance(delivery.mf_delivery_files_specified, str) \
                 or not delivery.mf_delivery_files_specified.strip():
-            logging.debug("No files for delivery id=[%d], returning empty list" % delivery.id)
+            logs.debug_sampled("No files for delivery id=[%d], returning empty list", delivery.id)
             return list()
 
         files = delivery.mf_delivery_files_specified.strip().replace('\n', ';').split(';')
         # get rid of empty lines
         files = list(map(lambda x: x.strip(), files))
         files = list(filter(lambda x: bool(x), files))
+        return files
+
+    def _get_full_path(self, path, delivery):
+        """
+        Get full path of a delivery file as it is stored in Locations
+        :param str path: path from filelist (SVN or gav)
+        :param delivery: delivery row (see _get_delivery_rows)
+        :return str: full path
+        """
+        return posixpath.sep.join([delivery.mf_tag_svn, path]) if posixpath.sep in path else path
+
+    @profiling.timed("files")
+    def _resolve_file_records(self, deliveries):
+        """
+        Search Locations records for all files of all deliveries given.
+        The number of queries depends on the number of distinct paths only (chunked),
+            not on the number of deliveries or files.
+        Historical locations "as of delivery creation date" are preferred, current locations are used as fallback.
+        :param list deliveries: list of delivery rows (see _get_delivery_rows)
+        :return dict: {(full_path, creation_date): Locations (or historical Locations) record}
+        """
+        logging.debug("Reached _resolve_file_records")
+        from oc_delivery_apps.checksums.models import Locations
+
+        _requested = set()
+
+        for _delivery in deliveries:
+            for _path in self._split_files(_delivery):
+                _requested.add((self._get_full_path(_path, _delivery), _delivery.creation_date))
+
+        if not _requested:
+            logging.debug("No files to resolve")
+            return dict()
+
+        _paths = sorted(set(map(lambda x: x[0], _requested)))
+        logging.debug("Resolving [%d] distinct paths", len(_paths))
+
+        # search in historical Locations first
+        # records are ordered by date, so the latest one "as of creation date" may be found by bisection
+        _history = dict()
+
+        for _chunk in self._chunks(_paths):
+            _r = Locations.history.filter(path__in=_chunk).select_related(
+                    'file__ci_type', 'loc_type').order_by('history_date', 'history_id')
+
+            for _record in _r:
+                _history.setdefault(_record.path, list()).append(_record)
+
+        _history_dates = dict((_k, list(map(lambda x: x.history_date, _v))) for _k, _v in _history.items())
+
+        _result = dict()
+        _missing = set()
+
+        for _full_path, _creation_date in _requested:
+            _dates = _history_dates.get(_full_path)
+
+            if not _dates or _creation_date is None:
+                _missing.add(_full_path)
+                continue
+
+            _index = bisect.bisect_right(_dates, _creation_date)
+
+            if not _index:
+                _missing.add(_full_path)
+                continue
+
+            _result[(_full_path, _creation_date)] = _history[_full_path][_index - 1]
+
+        if not _missing:
+            return _result
+
+        logging.debug("No records in historical locations table for [%d] paths, searching locations", len(_missing))
+        _current = dict()
+
+        for _chunk in self._chunks(sorted(_missing)):
+            _r = Locations.objects.filter(path__in=_chunk).select_related(
+                    'file__ci_type', 'loc_type').order_by('input_date', 'id')
+
+            # getting latest record
+            for _record in _r:
+                _current[_record.path] = _record
+
+        for _full_path, _creation_date in _requested:
+            if (_full_path, _creation_date) in _result or _full_path not in _current:
+                continue
+
+            _result[(_full_path, _creation_date)] = _current[_full_path]
+
+        return _result
+
+    def _chunks(self, items):
+        """
+        Split list to chunks suitable for '__in' query
+        :param list items: items to split
+        :return: generator of lists
+        """
+        for _start in range(0, len(items), _BULK_QUERY_CHUNK_SIZE):
+            yield items[_start:_start + _BULK_QUERY_CHUNK_SIZE]
+
+    def _get_files(self, delivery, file_records):
+        """
+        Convert string field with delivery files to a list of dictionaries with files details
+        :param delivery: delivery row (see _get_delivery_rows)
+        :param dict file_records: file records resolved by '_resolve_file_records'
+        :return list(dict()): list of dictionaries with files details
+        """
+        files = self._split_files(delivery)
 
         if not files:
-            logging.debug("Empty list of files for delivery [%d], returning it", delivery.id)
             return list()
 
-        logging.debug("Parsed [%s] records" % len(files))
-        svn_prefix = delivery.mf_tag_svn
-
-        files = list(map(lambda x: self._get_file_record(x, delivery), files))
-        logging.debug("Returning list of file records: %s" % str(files))
+        files = list(map(lambda x: self._get_file_record(x, delivery, file_records), files))
+        # called per delivery, so sampled
+        logs.debug_sampled("Delivery [%d] file records: %s", delivery.id, files)
         return files
 
-    def _get_file_record(self, path, delivery):
+    def _get_file_record(self, path, delivery, file_records):
         """
         Get single file record dictionary
         :param str path: path from filelist (SVN or gav)
-        :param dlmanager.models.Delivery delivery: delivery record
+        :param delivery: delivery row (see _get_delivery_rows)
+        :param dict file_records: file records resolved by '_resolve_file_records'
         :return dict: file-record as dictionary with details
         """
-        logging.debug("Reached _get_file_record")
-        logging.debug("path: [%s]" % path)
-        logging.debug("delivery: [%s]" % delivery)
-        from oc_delivery_apps.checksums.models import Locations
-
-        # search in Locations first
-        _full_path = posixpath.sep.join([delivery.mf_tag_svn, path]) if posixpath.sep in path else path
-        _r = Locations.history.filter(path=_full_path, history_date__lte=delivery.creation_date).order_by(
-                'history_date')
+        _full_path = self._get_full_path(path, delivery)
+        _r = file_records.get((_full_path, delivery.creation_date))
 
-        if not _r.count():
-            logging.debug("No records in historical locations table, searching locations")
-            _r = Locations.objects.filter(path=_full_path).order_by('input_date')
-
-        if not _r.count():
-            logging.debug("No records in any table, returning just path")
+        if not _r:
+            logs.debug_sampled("No records in any table for [%s] of delivery [%d], returning just path",
+                    path, delivery.id)
             return {"path": path}
 
-        # getting latest record
-        _r = _r.last()
         _result = {
                 "citype": _r.file.ci_type.code,
                 "citype_desc" : _r.file.ci_type.name,
@@ -416,5 +1057,86 @@ class ClientGetter:
                 "path": path,
                 "full_path": _full_path}
 
-        logging.debug("About to return: %s" % _result)
         return _result
+
+
+class DeliverySerializer(object):
+    """
+    Converter of delivery rows (see ClientGetter._get_delivery_rows) to response rows
+    Timezone is resolved once, formatted timestamps are cached per minute
+    """
+    __slots__ = ("_client_getter", "_tz", "_v2", "_dates", "_get_flags_description")
+
+    # maximal number of cached minutes
+    _DATES_CACHE_SIZE = 4096
+
+    def __init__(self, client_getter, timezone, v2=False):
+        """
+        :param ClientGetter client_getter: getter for delivery name, gav and files
+        :param str timezone: timezone
+        :param bool v2: convert deliveries to version 2 format
+        """
+        from oc_delivery_apps.dlmanager.models import Delivery
+        self._client_getter = client_getter
+        self._tz = pytz.timezone(timezone)
+        self._v2 = v2
+        self._dates = dict()
+        self._get_flags_description = Delivery.get_flags_description
+
+    def _format_date(self, creation_date):
+        """
+        Format timestamp in the timezone
+        Offset within one UTC minute is constant and whole-minute (for the last century at least),
+            so the local time differs from the cached one by seconds only
+        :param datetime creation_date: timestamp
+        :return tuple: (human-readable, machine-readable) formatted timestamp
+        """
+        # TODO: change date format to YYYY-MM-DD HH24:MM:SS (traditionally used in other places)
+        _minute = creation_date.replace(second=0, microsecond=0)
+        _cached = self._dates.get(_minute)
+
+        if _cached is None:
+            _local = _minute.astimezone(tz=self._tz)
+
+            if _local.second:
+                # offset has seconds part, not cacheable
+                _local = creation_date.astimezone(tz=self._tz)
+                return _local.strftime("%b %d %Y %H:%M:%S"), _local.strftime("%Y%m%d%H%M%S")
+
+            if len(self._dates) >= self._DATES_CACHE_SIZE:
+                self._dates.clear()
+
+            _cached = self._dates[_minute] = (_local.strftime("%b %d %Y %H:%M:"), _local.strftime("%Y%m%d%H%M"))
+
+        _second = "%02d" % creation_date.second
+        return _cached[0] + _second, _cached[1] + _second
+
+    def __call__(self, delivery, file_records=None):
+        """
+        Convert delivery row
+        :param delivery: delivery row
+        :param dict file_records: file records resolved by 'ClientGetter._resolve_file_records', version 2 only
+        :return: DeliveryRow or DeliveryRowV2
+        """
+        _creation_date, _creation_date_mr = self._format_date(delivery.creation_date)
+
+        if not self._v2:
+            return DeliveryRow(
+                    self._client_getter._get_delivery_name(delivery),
+                    self._client_getter._get_delivery_gav(delivery),
+                    delivery.mf_delivery_author,
+                    _creation_date,
+                    delivery.comment,
+                    ';'.join(delivery.mf_delivery_files_specified.split('\n')))
+
+        return DeliveryRowV2(
+                self._client_getter._get_delivery_name(delivery),
+                self._client_getter._get_delivery_gav(delivery),
+                delivery.mf_delivery_author,
+                _creation_date,
+                _creation_date_mr,
+                # description is not nullable, so None means there is no business status
+                delivery.business_status__description \
+                        if delivery.business_status__description is not None \
+                        else self._get_flags_description(delivery),
+                self._client_getter._get_files(delivery, file_records))
@@ -0,0 +1,150 @@
+import os
+import zlib
+import logging
+from flask import request
+
+# brotli and zstd are used if installed only
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# responses smaller than this are not compressed, negative value disables compression at all
+_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE") or 1024)
+_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL") or 6)
+_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY") or 4)
+_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL") or 3)
+
+
+class _GzipCompressor(object):
+    def __init__(self):
+        # 'wbits=31' means gzip header and trailer
+        self._compressor = zlib.compressobj(_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        # sync flush allows the client to decompress the data received so far
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliCompressor(object):
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=_BROTLI_QUALITY)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class _ZstdCompressor(object):
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=_ZSTD_LEVEL).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+# supported encodings in order of preference if the client accepts several ones with the same quality
+_COMPRESSORS = dict(filter(lambda x: x[1] is not None, [
+    ("zstd", _ZstdCompressor if zstandard else None),
+    ("br", _BrotliCompressor if brotli else None),
+    ("gzip", _GzipCompressor)]))
+
+
+def _is_compressible(response):
+    """
+    Check if response may be compressed regardless of the client
+    :param response: Flask response
+    :return bool:
+    """
+    if _MIN_SIZE < 0 or response.direct_passthrough:
+        return False
+
+    if response.status_code < 200 or response.status_code in [204, 206, 304]:
+        return False
+
+    if 'Content-Encoding' in response.headers:
+        return False
+
+    return response.mimetype.startswith("text/") or response.mimetype == "application/json"
+
+
+def _compress_stream(data, compressor):
+    """
+    Compress streamed response chunk by chunk
+    :param data: iterable of str or bytes
+    :param compressor: compressor object
+    :return: generator of bytes
+    """
+    for _chunk in data:
+        if isinstance(_chunk, str):
+            _chunk = _chunk.encode("utf-8")
+
+        _chunk = compressor.compress(_chunk) + compressor.flush()
+
+        if _chunk:
+            yield _chunk
+
+    yield compressor.finish()
+
+
+def _after_request(response):
+    if not _is_compressible(response):
+        return response
+
+    response.vary.add("Accept-Encoding")
+
+    if not response.is_streamed and (response.calculate_content_length() or 0) < _MIN_SIZE:
+        return response
+
+    _encoding = request.accept_encodings.best_match(list(_COMPRESSORS.keys()))
+
+    if not _encoding:
+        return response
+
+    _compressor = _COMPRESSORS[_encoding]()
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, _compressor)
+        response.headers.pop('Content-Length', None)
+    else:
+        response.set_data(_compressor.compress(response.get_data()) + _compressor.finish())
+
+    response.headers['Content-Encoding'] = _encoding
+
+    # compressed representation differs from uncompressed one byte-by-byte
+    _etag, _is_weak = response.get_etag()
+
+    if _etag and not _is_weak:
+        response.set_etag(_etag, weak=True)
+
+    logging.debug("Response is compressed with [%s]", _encoding)
+    return response
+
+
+def init_app(app):
+    """
+    Compress responses of Flask application according to 'Accept-Encoding' request header
+    """
+    app.after_request(_after_request)
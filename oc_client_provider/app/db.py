@@ -0,0 +1,152 @@
+import os
+import threading
+import logging
+from flask import g
+
+## NOTE: imports of django-related things are done in the functions where they necessary
+##       since Django is configured after this module is imported
+
+# counters of database connections usage, see 'get_stats'
+_lock = threading.Lock()
+_counters = {
+        "requests": 0,
+        "connections_opened": 0,
+        "connections_reused": 0,
+        "connections_closed_unusable": 0}
+
+
+def _count(name):
+    with _lock:
+        _counters[name] += 1
+
+
+def _get_bool_env(name, default):
+    _v = os.getenv(name)
+
+    if not _v:
+        return default
+
+    return bool(_v.strip().lower() in ["y", "yes", "true", "1"])
+
+
+def get_database_settings():
+    """
+    Get additional Django database settings from environment
+    :return dict: settings to update "default" database dictionary with
+    """
+    _settings = {
+            "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE") or 600),
+            "CONN_HEALTH_CHECKS": _get_bool_env("DB_CONN_HEALTH_CHECKS", True)}
+
+    _pool_size = int(os.getenv("DB_POOL_MAX_SIZE") or 0)
+
+    if not _pool_size:
+        return _settings
+
+    import django
+
+    if django.VERSION < (5, 1):
+        logging.warning("Connection pool requires Django 5.1 or newer, persistent connections are used instead")
+        return _settings
+
+    # Django does not allow persistent connections with pool
+    _settings["CONN_MAX_AGE"] = 0
+    _settings["OPTIONS"] = {"pool": {
+        "min_size": int(os.getenv("DB_POOL_MIN_SIZE") or 1),
+        "max_size": _pool_size}}
+
+    return _settings
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _count("connections_opened")
+
+
+def no_database(view):
+    """
+    Mark Flask view which does not query the database, so the connection is not checked before it is served
+    """
+    view.no_database = True
+    return view
+
+
+def _before_request():
+    """
+    Drop the connection if it is obsolete or broken before the request is served
+    Django 4.1+ checks the connection health itself right before its first use if 'CONN_HEALTH_CHECKS' is set,
+        for older versions the check is done here explicitly, except for views which do not use the database
+    """
+    import django
+    from django.db import connection, close_old_connections
+    from flask import current_app, request
+    _count("requests")
+
+    if connection.connection is not None and django.VERSION < (4, 1) \
+            and not getattr(current_app.view_functions.get(request.endpoint), "no_database", False):
+        if connection.settings_dict.get("CONN_HEALTH_CHECKS") and not connection.is_usable():
+            logging.warning("Database connection is unusable, closing")
+            _count("connections_closed_unusable")
+            connection.close()
+
+    close_old_connections()
+
+    if connection.connection is not None:
+        _count("connections_reused")
+
+
+def _after_request(response):
+    """
+    Body of streamed response is read from the database after the request is torn down,
+        so the connection is checked on response closing then
+    """
+    from django.db import close_old_connections
+
+    if response.is_streamed:
+        g.db_close_deferred = True
+        response.call_on_close(close_old_connections)
+
+    return response
+
+
+def _teardown_request(exc):
+    """
+    Close the connection if it has reached its maximal age, the same Django does on request finish
+    """
+    from django.db import close_old_connections
+
+    if g.pop("db_close_deferred", False):
+        return
+
+    close_old_connections()
+
+
+def init_app(app):
+    """
+    Make Flask application manage Django database connections per request as Django itself does:
+        persistent connections are reused until 'CONN_MAX_AGE' is reached or found broken
+    """
+    from django.db.backends.signals import connection_created
+    connection_created.connect(_on_connection_created)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+
+def get_stats():
+    """
+    Database connections usage statistics for current worker
+    :return dict: counters, settings and connection pool statistics if pool is used
+    """
+    from django.db import connection
+
+    with _lock:
+        _stats = dict(_counters)
+
+    _stats["conn_max_age"] = connection.settings_dict.get("CONN_MAX_AGE")
+    _stats["conn_health_checks"] = bool(connection.settings_dict.get("CONN_HEALTH_CHECKS"))
+    _pool = getattr(connection, "pool", None)
+
+    if _pool is not None:
+        _stats["pool"] = _pool.get_stats()
+
+    return _stats
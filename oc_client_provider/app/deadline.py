@@ -0,0 +1,213 @@
+import os
+import time
+import logging
+import threading
+import weakref
+from flask import g, request
+
+## NOTE: imports of django-related things are done in the functions where they necessary
+##       since Django is configured after this module is imported
+
+# default request time budget (seconds), zero or negative disables it
+# may be overridden per endpoint with 'REQUEST_TIMEOUT_<VIEW FUNCTION NAME>', see 'get_budget'
+_DEFAULT_BUDGET = float(os.getenv("REQUEST_TIMEOUT") or 60)
+
+# SQLite progress handler is called every this number of virtual machine instructions
+_SQLITE_PROGRESS_STEPS = 1000
+
+# PostgreSQL 'query_canceled' error code, raised on 'statement_timeout'
+_PG_QUERY_CANCELED = "57014"
+
+# connections with limits left by requests finished in other threads, they are removed before the next request
+_stale_connections = weakref.WeakSet()
+_stale_lock = threading.Lock()
+
+
+class DeadlineExceeded(Exception):
+    """
+    Request time budget is exhausted, database query is cancelled or not started
+    """
+
+    def __init__(self, budget, elapsed):
+        """
+        :param float budget: request time budget in seconds
+        :param float elapsed: time spent in seconds
+        """
+        super().__init__("Request time budget of %.3f seconds is exceeded, %.3f seconds elapsed" % (budget, elapsed))
+        self.budget = budget
+        self.elapsed = elapsed
+
+
+def get_budget(endpoint):
+    """
+    Get time budget for Flask endpoint
+    :param str endpoint: Flask endpoint name, e.g. 'client_provider_bp.get_client_deliveries_v2'
+    :return float: time budget in seconds, zero or negative if not limited
+    """
+    if endpoint:
+        _value = os.getenv("REQUEST_TIMEOUT_%s" % endpoint.split(".")[-1].upper())
+
+        if _value:
+            return float(_value)
+
+    return _DEFAULT_BUDGET
+
+
+class _Deadline(object):
+    """
+    Per-request deadline, also used as Django database execution wrapper
+    Queries are not started after the deadline, and the running ones are cancelled by the database
+    """
+
+    def __init__(self, budget, connection):
+        """
+        :param float budget: time budget in seconds
+        :param connection: Django database connection of the request thread
+        """
+        self.budget = budget
+        self.start = time.monotonic()
+        self.deadline = self.start + budget
+        # deadline is checked while the response is not started only,
+        # streaming is limited with statement timeout for PostgreSQL
+        self.active = True
+        # response may be closed in another thread, so the connection and its thread are kept
+        self.connection = connection
+        self.thread = threading.get_ident()
+        self.limited = False
+
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    def is_expired(self):
+        return self.active and time.monotonic() >= self.deadline
+
+    def check(self):
+        """
+        Raise DeadlineExceeded if request budget is exhausted
+        """
+        if self.is_expired():
+            raise DeadlineExceeded(self.budget, self.elapsed())
+
+    def __call__(self, execute, sql, params, many, context):
+        self.check()
+
+        if self.active:
+            self._set_database_timeout(execute, context)
+
+        try:
+            return execute(sql, params, many, context)
+        except Exception as _e:
+            if self.is_expired() or getattr(_e.__cause__, "pgcode", None) == _PG_QUERY_CANCELED:
+                raise DeadlineExceeded(self.budget, self.elapsed()) from _e
+
+            raise
+
+    def _set_database_timeout(self, execute, context):
+        """
+        Limit duration of the next query in the database with the time remaining
+        The timeout is set before each query, otherwise every query could take the time remaining at the first one
+        Queries made while the response is streamed keep the last timeout
+        :param execute: the next execution wrapper in chain
+        :param dict context: execution context
+        """
+        if self.connection.vendor == "postgresql":
+            _remaining_ms = max(int((self.deadline - time.monotonic()) * 1000), 1)
+            # 'set_config' is used since 'SET' does not support parameters with server-side binding
+            execute("SELECT set_config('statement_timeout', %s, false)", [str(_remaining_ms)], False, context)
+        elif self.connection.vendor == "sqlite" and not self.limited:
+            # the deadline itself is checked by the handler, so it is set once
+            self.connection.connection.set_progress_handler(self._sqlite_progress, _SQLITE_PROGRESS_STEPS)
+
+        self.limited = True
+
+    def _sqlite_progress(self):
+        # non-zero value interrupts the query
+        return int(self.is_expired())
+
+    def reset(self):
+        """
+        Remove limits from the database connection, it may be reused by the next request
+        """
+        if self in self.connection.execute_wrappers:
+            self.connection.execute_wrappers.remove(self)
+
+        if not self.limited:
+            return
+
+        if threading.get_ident() != self.thread:
+            # Django connections may not be used in other threads
+            with _stale_lock:
+                _stale_connections.add(self.connection)
+
+            return
+
+        _remove_limits(self.connection)
+
+
+def _remove_limits(connection):
+    """
+    Remove database limits set by '_Deadline' from the connection
+    :param connection: Django database connection of the calling thread
+    """
+    if connection.connection is None:
+        return
+
+    try:
+        if connection.vendor == "postgresql":
+            with connection.cursor() as _cursor:
+                _cursor.execute("RESET statement_timeout")
+        elif connection.vendor == "sqlite":
+            connection.connection.set_progress_handler(None, 0)
+    except Exception as _e:
+        # the connection is broken, it will be closed before the next request
+        logging.exception(_e)
+
+
+def _before_request():
+    from django.db import connections, DEFAULT_DB_ALIAS
+    # 'django.db.connection' is a proxy resolved in the calling thread, so the connection itself is taken
+    _connection = connections[DEFAULT_DB_ALIAS]
+
+    if _connection in _stale_connections:
+        # the previous request response was closed in another thread
+        with _stale_lock:
+            _stale_connections.discard(_connection)
+
+        _remove_limits(_connection)
+
+    _budget = get_budget(request.endpoint)
+
+    if _budget <= 0:
+        return
+
+    g.request_deadline = _deadline = _Deadline(_budget, _connection)
+    _connection.execute_wrappers.append(_deadline)
+
+
+def _after_request(response):
+    _deadline = g.pop("request_deadline", None)
+
+    if _deadline is None:
+        return response
+
+    # the response is being sent, so it is too late to report the timeout with status code
+    _deadline.active = False
+    response.call_on_close(_deadline.reset)
+    return response
+
+
+def _teardown_request(exc):
+    # response is not finalized in case of unhandled errors, so limits have to be removed here
+    _deadline = g.pop("request_deadline", None)
+
+    if _deadline is not None:
+        _deadline.reset()
+
+
+def init_app(app):
+    """
+    Limit processing time of all requests served by Flask application
+    """
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
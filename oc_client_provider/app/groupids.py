@@ -0,0 +1,266 @@
+import time
+import threading
+import logging
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+## NOTE: imports of django-related things are done in the functions where they necessary
+##       since Django is configured after this module is imported
+
+
+class GroupIdResolver(object):
+    """
+    Thread-safe in-process resolver of client code to deliveries groupids
+    Distinct groupids are loaded once and then only new ones are fetched:
+        for deliveries with greater ids and from history records with greater ids (changed deliveries)
+    Groupids of removed deliveries are kept, it does not affect deliveries search results
+    Groupids are kept reversed and sorted, so ones ending with client code are found by bisection,
+        resolved clients are cached with LRU eviction
+    """
+
+    def __init__(self, refresh_interval, max_clients=10000):
+        """
+        :param float refresh_interval: minimal interval in seconds between new groupids lookups,
+            zero means on every resolution
+        :param int max_clients: maximal number of resolved clients cached
+        """
+        self._refresh_interval = float(refresh_interval)
+        self._max_clients = max(int(max_clients), 0)
+        self._lock = threading.Lock()
+        self._groupids = None
+        self._reversed = list()
+        self._by_client = OrderedDict()
+        self._last_id = 0
+        self._last_history_id = 0
+        self._last_refresh = None
+        self._loads = 0
+        self._refreshes = 0
+        self._hits = 0
+        self._misses = 0
+
+    def _fetch(self):
+        """
+        Fetch groupids appeared since the previous call (all groupids for the first one)
+        :return set: groupids
+        """
+        from django.db.models import Max
+        from oc_delivery_apps.dlmanager.models import Delivery
+        _result = set()
+
+        # watermarks are taken first, so deliveries added meanwhile are fetched the next time
+        _last_id = Delivery.objects.aggregate(_max=Max('id')).get('_max') or 0
+        _last_history_id = Delivery.history.aggregate(_max=Max('history_id')).get('_max') or 0
+
+        if self._groupids is None:
+            _result.update(Delivery.objects.filter(id__lte=_last_id).values_list('groupid', flat=True).distinct())
+        else:
+            _result.update(Delivery.objects.filter(id__gt=self._last_id, id__lte=_last_id).values_list(
+                'groupid', flat=True).distinct())
+            _result.update(Delivery.history.filter(history_id__gt=self._last_history_id,
+                history_id__lte=_last_history_id).values_list('groupid', flat=True).distinct())
+
+        self._last_id = max(self._last_id, _last_id)
+        self._last_history_id = max(self._last_history_id, _last_history_id)
+        return _result
+
+    def _refresh(self, force=False):
+        """
+        Load groupids or add new ones if it is time to, called with lock acquired
+        :param bool force: look for new groupids regardless of refresh interval
+        """
+        if not force and self._groupids is not None and self._last_refresh is not None \
+                and time.monotonic() - self._last_refresh < self._refresh_interval:
+            return
+
+        _groupids = self._fetch()
+        self._last_refresh = time.monotonic()
+
+        if self._groupids is None:
+            logging.debug("Loaded [%d] groupids", len(_groupids))
+            self._groupids = _groupids
+            self._reversed = sorted(map(lambda x: x[::-1], _groupids))
+            self._loads += 1
+            return
+
+        _groupids.difference_update(self._groupids)
+        self._refreshes += 1
+
+        if not _groupids:
+            return
+
+        logging.debug("Found [%d] new groupids", len(_groupids))
+        self._groupids.update(_groupids)
+
+        for _groupid in _groupids:
+            insort(self._reversed, _groupid[::-1])
+
+            # resolved clients are updated instead of resolving them again, their codes are suffixes of groupid
+            for _start in range(len(_groupid) + 1):
+                _client_groupids = self._by_client.get(_groupid[_start:])
+
+                if _client_groupids is not None:
+                    _client_groupids.add(_groupid)
+
+    def _match(self, client_code):
+        """
+        Find groupids ending with client code, called with lock acquired
+        :param str client_code: client code
+        :return set: groupids
+        """
+        _prefix = client_code[::-1]
+        _result = set()
+
+        for _index in range(bisect_left(self._reversed, _prefix), len(self._reversed)):
+            if not self._reversed[_index].startswith(_prefix):
+                break
+
+            _result.add(self._reversed[_index][::-1])
+
+        return _result
+
+    def load(self, force=False):
+        """
+        Load groupids in advance, or add new ones if it is time to
+        :param bool force: look for new groupids regardless of refresh interval
+        """
+        with self._lock:
+            self._refresh(force=force)
+
+    def resolve(self, client_code):
+        """
+        Get groupids of client deliveries, the same ones which end with client code
+        :param str client_code: client code
+        :return list: sorted groupids
+        """
+        with self._lock:
+            self._refresh()
+            _client_groupids = self._by_client.get(client_code)
+
+            if _client_groupids is None:
+                self._misses += 1
+                _client_groupids = self._match(client_code)
+
+                if self._max_clients:
+                    self._by_client[client_code] = _client_groupids
+
+                    if len(self._by_client) > self._max_clients:
+                        self._by_client.popitem(last=False)
+            else:
+                self._by_client.move_to_end(client_code)
+                self._hits += 1
+
+            return sorted(_client_groupids)
+
+    def clear(self):
+        """
+        Drop all groupids, so they are loaded again on next resolution
+        """
+        with self._lock:
+            self._groupids = None
+            self._reversed = list()
+            self._by_client = OrderedDict()
+            self._last_id = 0
+            self._last_history_id = 0
+            self._last_refresh = None
+
+    def stats(self):
+        """
+        Resolver statistics
+        :return dict: counters and sizes
+        """
+        with self._lock:
+            return {
+                    "hits": self._hits,
+                    "misses": self._misses,
+                    "loads": self._loads,
+                    "refreshes": self._refreshes,
+                    "groupids": len(self._groupids or ()),
+                    "clients": len(self._by_client),
+                    "max_clients": self._max_clients,
+                    "refresh_interval": self._refresh_interval}
+
+
+class GroupIdWatermarks(object):
+    """
+    Thread-safe in-process tracker of the newest delivery id and delivery history record id per groupid
+    Deliveries and history records are fetched by primary key ranges since the previous call only,
+        so neither table is filtered by groupid (history one is not indexed by it)
+    Groupids not changed since the tracker start share watermarks taken at the start
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._start = None
+        self._last = None
+        self._by_groupid = dict()
+        self._fetches = 0
+
+    def _fetch(self, last_id, last_history_id):
+        """
+        Fetch changes up to the ids given, called with lock acquired
+        :param int last_id: the newest delivery id
+        :param int last_history_id: the newest delivery history record id
+        """
+        from oc_delivery_apps.dlmanager.models import Delivery
+        _id, _history_id = self._last
+        _changes = list()
+
+        if last_id > _id:
+            _changes.extend((_groupid, _id, 0) for _id, _groupid in Delivery.objects.filter(
+                id__gt=_id, id__lte=last_id).values_list('id', 'groupid'))
+
+        if last_history_id > _history_id:
+            _changes.extend((_groupid, 0, _history_id) for _history_id, _groupid in Delivery.history.filter(
+                history_id__gt=_history_id, history_id__lte=last_history_id).values_list('history_id', 'groupid'))
+
+        for _groupid, _id, _history_id in _changes:
+            _watermark = self._by_groupid.get(_groupid, self._start)
+            self._by_groupid[_groupid] = (max(_watermark[0], _id), max(_watermark[1], _history_id))
+
+        self._last = (max(self._last[0], last_id), max(self._last[1], last_history_id))
+        self._fetches += 1
+
+    def get(self, groupids):
+        """
+        Get watermark changed with any creation, modification or deletion of deliveries of the groupids given
+        A single query by primary keys is made if nothing is changed since the previous call
+        :param list groupids: deliveries groupids
+        :return tuple: (the newest delivery id, the newest delivery history record id)
+        """
+        from django.db.models import Max, Subquery
+        from oc_delivery_apps.dlmanager.models import Delivery
+        _history = Delivery.history.order_by('-history_id').values('history_id')[:1]
+        _result = Delivery.objects.aggregate(_id=Max('id'), _history_id=Max(Subquery(_history)))
+        _last = (_result.get('_id') or 0, _result.get('_history_id') or 0)
+
+        with self._lock:
+            if self._last is None:
+                self._start = self._last = _last
+            elif _last[0] > self._last[0] or _last[1] > self._last[1]:
+                self._fetch(*_last)
+
+            _watermarks = list(map(lambda x: self._by_groupid.get(x, self._start), groupids))
+
+            if not _watermarks:
+                return self._start
+
+        return max(map(lambda x: x[0], _watermarks)), max(map(lambda x: x[1], _watermarks))
+
+    def clear(self):
+        """
+        Forget all watermarks, so they are taken again on next call
+        """
+        with self._lock:
+            self._start = None
+            self._last = None
+            self._by_groupid = dict()
+
+    def stats(self):
+        """
+        Tracker statistics
+        :return dict: counters and sizes
+        """
+        with self._lock:
+            return {
+                    "fetches": self._fetches,
+                    "groupids": len(self._by_groupid)}
@@ -0,0 +1,71 @@
+import os
+import json
+import logging
+from collections import defaultdict
+from itertools import count
+
+# per-row debug messages are emitted once per this number of calls, one means every call
+_SAMPLE_RATE = max(int(os.getenv("LOG_SAMPLE_RATE") or 100), 1)
+
+_TEXT_FORMAT = '[%(asctime)s] [%(levelname)s] %(message)s'
+
+# number of calls per message format
+_counters = defaultdict(count)
+
+
+class Fields(dict):
+    """
+    Structured log line values, formatted as 'key=value' pairs only if the line is emitted
+    """
+
+    def __str__(self):
+        return " ".join("%s=%s" % (_k, _v) for _k, _v in self.items() if _v is not None)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as JSON lines, structured values given as 'extra={"fields": Fields}' are added as keys
+    """
+
+    def format(self, record):
+        _result = {
+                "time": self.formatTime(record),
+                "level": record.levelname,
+                "logger": record.name,
+                "message": record.getMessage()}
+
+        _result.update(getattr(record, "fields", None) or dict())
+
+        if record.exc_info:
+            _result["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(_result, default=str)
+
+
+def configure(level):
+    """
+    Configure root logger, records are JSON lines if 'LOG_FORMAT' is 'json', plain text otherwise
+    :param int level: logging level
+    """
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(JsonFormatter() if (os.getenv("LOG_FORMAT") or "").lower() == "json" \
+            else logging.Formatter(_TEXT_FORMAT))
+    logging.basicConfig(level=level, handlers=[_handler])
+
+
+def debug_sampled(msg, *args):
+    """
+    Log debug message once per 'LOG_SAMPLE_RATE' calls with the same format, for messages logged per row
+    Nothing is done but a level check if debug is disabled
+    :param str msg: message format
+    :param args: message arguments, formatted only if the message is emitted
+    """
+    if not logging.root.isEnabledFor(logging.DEBUG):
+        return
+
+    _number = next(_counters[msg])
+
+    if _number % _SAMPLE_RATE:
+        return
+
+    logging.debug(msg + " [sampled 1/%d, call %d]", *(args + (_SAMPLE_RATE, _number + 1)))
@@ -0,0 +1,186 @@
+import os
+import time
+import logging
+from collections.abc import Iterator
+from flask import g, has_request_context, request
+import prometheus_client
+from prometheus_client import Counter, Histogram, CollectorRegistry, CONTENT_TYPE_LATEST
+from prometheus_client import multiprocess
+from . import logs
+
+## NOTE: imports of django-related things are done in the functions where they necessary
+##       since Django is configured after this module is imported
+
+_LABELS = ("rule", "method")
+
+_REQUEST_LATENCY = Histogram("oc_client_provider_request_duration_seconds",
+        "Request duration including response streaming", _LABELS)
+_REQUESTS = Counter("oc_client_provider_requests_total",
+        "Requests served", _LABELS + ("status",))
+_DB_QUERIES = Histogram("oc_client_provider_request_db_queries",
+        "Database queries per request", _LABELS,
+        buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, float("inf")))
+_DB_TIME = Histogram("oc_client_provider_request_db_duration_seconds",
+        "Database queries duration per request", _LABELS)
+_RESPONSE_SIZE = Histogram("oc_client_provider_response_size_bytes",
+        "Response body size", _LABELS,
+        buckets=(100, 1000, 10000, 100000, 1000000, 10000000, 100000000, float("inf")))
+
+# one structured summary line per request is logged at INFO level
+_summary_logger = logging.getLogger("oc_client_provider.requests")
+
+
+class _RequestMetrics(object):
+    """
+    Per-request measurements, also used as Django database execution wrapper
+    """
+
+    def __init__(self, rule, method):
+        self.rule = rule
+        self.method = method
+        self.start = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.response_size = 0
+        self.rows = None
+        self.fields = dict()
+        self.db_wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        _start = time.perf_counter()
+
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_time += time.perf_counter() - _start
+
+    def count_size(self, data):
+        """
+        Count size of streamed response chunks
+        :param data: iterable of str or bytes
+        :return: generator of bytes
+        """
+        for _chunk in data:
+            if isinstance(_chunk, str):
+                _chunk = _chunk.encode("utf-8")
+
+            self.response_size += len(_chunk)
+            yield _chunk
+
+    def count_rows(self, rows):
+        """
+        Count rows of streamed response
+        :param rows: iterator over response rows
+        :return: generator of response rows
+        """
+        self.rows = 0
+
+        for _row in rows:
+            self.rows += 1
+            yield _row
+
+
+def _before_request():
+    from django.db import connection
+    _rule = request.url_rule.rule if request.url_rule else "<unmatched>"
+    g.request_metrics = _metrics = _RequestMetrics(_rule, request.method)
+    _metrics.db_wrapper = connection.execute_wrapper(_metrics)
+    _metrics.db_wrapper.__enter__()
+
+
+def _after_request(response):
+    _metrics = g.pop("request_metrics", None)
+
+    if _metrics is None:
+        return response
+
+    if response.is_streamed:
+        # body is generated after the request is processed, so everything is measured on response closing
+        response.response = _metrics.count_size(response.response)
+    else:
+        _metrics.response_size = response.calculate_content_length() or 0
+
+    _status = str(response.status_code)
+    response.call_on_close(lambda: _observe(_metrics, _status))
+    return response
+
+
+def annotate(**fields):
+    """
+    Add values to the summary line of the current request, nothing is done outside of request
+    """
+    _metrics = g.get("request_metrics") if has_request_context() else None
+
+    if _metrics is not None:
+        _metrics.fields.update(fields)
+
+
+def count_rows(rows):
+    """
+    Count response rows for the summary line of the current request
+    :param rows: list of response rows, or iterator to count them while streaming, anything else is not counted
+    :return: the same rows
+    """
+    _metrics = g.get("request_metrics") if has_request_context() else None
+
+    if _metrics is None:
+        return rows
+
+    if isinstance(rows, list):
+        _metrics.rows = len(rows)
+    elif isinstance(rows, Iterator):
+        return _metrics.count_rows(rows)
+
+    return rows
+
+
+def _teardown_request(exc):
+    # response is not finalized in case of unhandled errors, so database wrapper has to be removed here
+    _metrics = g.pop("request_metrics", None)
+
+    if _metrics is not None:
+        _metrics.db_wrapper.__exit__(None, None, None)
+
+
+def _observe(metrics, status):
+    metrics.db_wrapper.__exit__(None, None, None)
+    _labels = (metrics.rule, metrics.method)
+    _duration = time.perf_counter() - metrics.start
+    _REQUEST_LATENCY.labels(*_labels).observe(_duration)
+    _REQUESTS.labels(*(_labels + (status,))).inc()
+    _DB_QUERIES.labels(*_labels).observe(metrics.db_queries)
+    _DB_TIME.labels(*_labels).observe(metrics.db_time)
+    _RESPONSE_SIZE.labels(*_labels).observe(metrics.response_size)
+
+    if not _summary_logger.isEnabledFor(logging.INFO):
+        return
+
+    _fields = logs.Fields(route=metrics.rule, method=metrics.method, status=int(status))
+    _fields.update(metrics.fields)
+    _fields.update(rows=metrics.rows, queries=metrics.db_queries, db_ms=round(metrics.db_time * 1000, 1),
+            duration_ms=round(_duration * 1000, 1), size=metrics.response_size)
+    _summary_logger.info("%s", _fields, extra={"fields": _fields})
+
+
+def init_app(app):
+    """
+    Measure all requests served by Flask application
+    """
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+
+def generate_latest():
+    """
+    Metrics in Prometheus text format
+    Metrics of all gunicorn workers are collected if 'PROMETHEUS_MULTIPROC_DIR' is set
+    :return tuple: (content, content type)
+    """
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return prometheus_client.generate_latest(), CONTENT_TYPE_LATEST
+
+    _registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(_registry)
+    return prometheus_client.generate_latest(_registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,219 @@
+import os
+import time
+import uuid
+import hmac
+import logging
+import cProfile
+import tempfile
+import contextvars
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from flask import current_app, g, request
+from . import logs
+
+## NOTE: imports of django-related things are done in the functions where they necessary
+##       since Django is configured after this module is imported
+
+# requests are profiled if 'X-Profile' header value is this token, profiling is disabled if not set
+# the token may be followed by ';cprofile' to dump cProfile statistics also
+_TOKEN = os.getenv("PROFILING_TOKEN") or None
+
+# directory for cProfile statistics dumps
+_DIR = os.getenv("PROFILING_DIR") or tempfile.gettempdir()
+
+# maximal number of SQL statements logged for a single request
+_MAX_QUERIES = int(os.getenv("PROFILING_MAX_QUERIES") or 1000)
+
+_HEADER = "X-Profile"
+
+# profile of the request being served, None if it is not profiled
+_current = contextvars.ContextVar("oc_client_provider_profile", default=None)
+
+# shared no-op context for requests not profiled
+_NULL = nullcontext()
+
+_logger = logging.getLogger("oc_client_provider.profiling")
+
+
+class _Profile(object):
+    """
+    Per-request timings, also used as Django database execution wrapper
+    """
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.start = time.perf_counter()
+        self.phases = dict()
+        self.queries = list()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.profiler = None
+        self.db_wrapper = None
+        self.context_token = None
+
+    def __call__(self, execute, sql, params, many, context):
+        _start = time.perf_counter()
+
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            _duration = time.perf_counter() - _start
+            self.db_queries += 1
+            self.db_time += _duration
+
+            if len(self.queries) < _MAX_QUERIES:
+                self.queries.append({"sql": sql, "duration_ms": round(_duration * 1000, 3)})
+
+    @contextmanager
+    def phase(self, name):
+        self.phases.setdefault(name, 0.0)
+        _start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - _start
+
+    def server_timing(self):
+        """
+        Timings in 'Server-Timing' header format, phases in order of their first start
+        :return str: header value
+        """
+        _metrics = list("%s;dur=%.3f" % (_name, _duration * 1000) for _name, _duration in self.phases.items())
+        _metrics.append('sql;dur=%.3f;desc="%d queries"' % (self.db_time * 1000, self.db_queries))
+        _metrics.append("total;dur=%.3f" % ((time.perf_counter() - self.start) * 1000))
+        return ", ".join(_metrics)
+
+
+def phase(name):
+    """
+    Measure a processing phase of the current request, timings of the same phase are summed up
+    Usage: 'with profiling.phase("files"): ...', nothing is measured if the request is not profiled
+    :param str name: phase name, 'Server-Timing' metric name
+    :return: context manager
+    """
+    _profile = _current.get()
+
+    if _profile is None:
+        return _NULL
+
+    return _profile.phase(name)
+
+
+def timed(name):
+    """
+    Decorator measuring each call of the function as a phase of the current request, see 'phase'
+    :param str name: phase name
+    """
+    def _decorator(function):
+        @wraps(function)
+        def _wrapper(*args, **kwargs):
+            with phase(name):
+                return function(*args, **kwargs)
+
+        return _wrapper
+
+    return _decorator
+
+
+def _get_options():
+    """
+    Check profiling header of the current request
+    :return set: profiling options, None if the request is not to be profiled
+    """
+    _value = request.headers.get(_HEADER)
+
+    if not _value:
+        return None
+
+    _token, *_options = map(lambda x: x.strip(), _value.split(";"))
+
+    if not hmac.compare_digest(_token.encode("utf-8"), _TOKEN.encode("utf-8")):
+        _logger.warning("Invalid profiling token from [%s]", request.remote_addr)
+        return None
+
+    return set(_options)
+
+
+def _before_request():
+    if not _TOKEN:
+        return
+
+    _options = _get_options()
+
+    if _options is None:
+        return
+
+    from django.db import connection
+
+    g.request_profile = _profile = _Profile()
+    _profile.context_token = _current.set(_profile)
+    _profile.db_wrapper = connection.execute_wrapper(_profile)
+    _profile.db_wrapper.__enter__()
+
+    if "cprofile" in _options:
+        _profile.profiler = cProfile.Profile()
+
+        try:
+            _profile.profiler.enable()
+        except ValueError as _e:
+            # another profiler is active
+            _logger.warning("cProfile is not started: %s", _e)
+            _profile.profiler = None
+
+
+def _after_request(response):
+    _profile = g.pop("request_profile", None)
+
+    if _profile is None:
+        return response
+
+    if response.is_streamed:
+        # headers are sent before the body, so the body is generated here to measure everything
+        try:
+            response.get_data()
+        except Exception as _e:
+            response = current_app.make_response(current_app.handle_user_exception(_e))
+
+    _finish(_profile)
+    response.headers["Server-Timing"] = _profile.server_timing()
+    response.headers["X-Profile-Id"] = _profile.id
+    _fields = logs.Fields(profile=_profile.id, route=request.url_rule.rule if request.url_rule else None,
+            phases=dict((_k, round(_v * 1000, 3)) for _k, _v in _profile.phases.items()),
+            queries=_profile.queries)
+
+    if _profile.profiler is not None:
+        _fields["cprofile"] = os.path.join(_DIR, "%s.prof" % _profile.id)
+        _profile.profiler.dump_stats(_fields["cprofile"])
+
+    _logger.info("Request profile: %s", _fields, extra={"fields": _fields})
+    return response
+
+
+def _teardown_request(exc):
+    # response is not finalized in case of unhandled errors
+    _profile = g.pop("request_profile", None)
+
+    if _profile is not None:
+        _finish(_profile)
+
+
+def _finish(profile):
+    """
+    Stop measurements of the request
+    """
+    if profile.profiler is not None:
+        profile.profiler.disable()
+
+    profile.db_wrapper.__exit__(None, None, None)
+    _current.reset(profile.context_token)
+
+
+def init_app(app):
+    """
+    Profile requests of Flask application on demand
+    Has to be initialized the last, so the body of streamed responses is generated before other processing
+    """
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
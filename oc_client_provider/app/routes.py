@@ -4,22 +4,181 @@ import os
 import csv
 import io
 from flask import Response, request
-from .client_getter import ClientGetter
+from .client_getter import ClientGetter, InvalidCursorError
+from .deadline import DeadlineExceeded
 from . import client_provider_bp
 from .client_counterparty import ClientCounterparty
+from . import cache
+from . import db
+from . import metrics
+from . import warmup
+from . import profiling
 import logging
+from collections.abc import Iterator
+from itertools import islice
 
 client_getter = ClientGetter()
+client_counterparty = ClientCounterparty()
+
+# maximal page size for deliveries keyset pagination
+_PAGE_LIMIT_MAX = int(os.getenv("DELIVERIES_PAGE_LIMIT_MAX") or 1000)
+
+# maximal number of ids and codes in a single client data request
+_CLIENT_DATA_LIST_MAX = int(os.getenv("CLIENT_DATA_LIST_MAX") or 500)
+
+# maximal number of client codes in a single multi-client deliveries search
+_DELIVERIES_CLIENTS_MAX = int(os.getenv("DELIVERIES_CLIENTS_MAX") or 500)
+
+# active clients list is refreshed in background with this interval (seconds)
+_clients_snapshot = cache.register("clients", cache.Snapshot(client_getter.get_clients,
+    interval=float(os.getenv("CLIENTS_REFRESH_INTERVAL") or 60)))
+
+# number of records formatted at once for streamed responses
+_STREAM_BATCH_SIZE = 100
+
+# fast JSON encoder is used if installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JsonEncoder(object):
+    """
+    Standard library JSON encoder
+    """
+    name = "json"
+    # list items separator, necessary for streamed lists
+    separator = b", "
+
+    def dumps(self, data):
+        """
+        Serialize data to JSON
+        :param data: serializable object
+        :return bytes: UTF-8 encoded JSON
+        """
+        return json.dumps(data).encode("utf-8")
+
+
+class OrjsonEncoder(JsonEncoder):
+    """
+    'orjson' encoder, the output is compact but the same in content as standard one gives
+    """
+    name = "orjson"
+    separator = b","
+
+    def dumps(self, data):
+        # integer keys are used in some responses, standard encoder converts them to strings also
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+
+def get_json_encoder():
+    """
+    Select JSON encoder, 'JSON_ENCODER' environment variable may be used to force one
+    :return JsonEncoder: encoder
+    """
+    _name = os.getenv("JSON_ENCODER") or ("orjson" if orjson else "json")
+
+    if _name == "orjson" and orjson:
+        return OrjsonEncoder()
+
+    if _name != "json":
+        logging.warning("JSON encoder [%s] is not available, using standard one", _name)
+
+    return JsonEncoder()
+
+
+json_encoder = get_json_encoder()
+
+
+def _iter_batches(data):
+    """
+    Split iterator to lists of '_STREAM_BATCH_SIZE' items
+    Errors raised while iterating are logged and raised again: response status is sent already,
+        so WSGI server has to abort the connection to let the client know the body is incomplete
+    :param data: iterator
+    :return: generator of lists
+    """
+    try:
+        while True:
+            _batch = list(islice(data, _STREAM_BATCH_SIZE))
+
+            if not _batch:
+                break
+
+            yield _batch
+    except Exception as _e:
+        logging.exception(_e)
+        raise
+
+
+def _iter_json(data):
+    """
+    Serialize items from iterator to JSON list chunk by chunk
+    The result is exactly the same as 'json_encoder' gives for the list
+    :param data: iterator over serializable items
+    :return: generator of JSON chunks
+    """
+    _separator = b""
+    _dumps = None
+    yield b"["
+
+    for _batch in _iter_batches(data):
+        if _dumps is None:
+            # response rows (named tuples) are serialized as objects
+            _dumps = json_encoder.dumps if not hasattr(_batch[0], "_fields") \
+                    else lambda x: json_encoder.dumps(dict(zip(x._fields, x)))
+
+        with profiling.phase("encode"):
+            _chunk = _separator + json_encoder.separator.join(map(_dumps, _batch))
+
+        yield _chunk
+        _separator = json_encoder.separator
+
+    yield b"]"
+
+
+def _iter_csv(data):
+    """
+    Write dictionaries or response rows (named tuples) from iterator in CSV format chunk by chunk
+    First line is supposed to be headers
+    :param data: iterator over dictionaries or named tuples
+    :return: generator of CSV text chunks
+    """
+    si = io.StringIO(initial_value="", newline='\n')
+    writer = None
+
+    for _batch in _iter_batches(data):
+        if writer is None:
+            if hasattr(_batch[0], "_fields"):
+                # rows are written as is, without conversion to dictionaries
+                writer = csv.writer(si)
+                writer.writerow(_batch[0]._fields)
+            else:
+                writer = csv.DictWriter(si, _batch[0].keys())
+                writer.writeheader()
+
+        with profiling.phase("encode"):
+            writer.writerows(_batch)
+
+        yield si.getvalue()
+        si.seek(0)
+        si.truncate()
 
 
 def response_json(code, data):
     """
     Return JSON data response
     :param int code: HTTP response code
-    :param data: dict or list to send as response content
+    :param data: dict or list to send as response content, or iterator to stream a list from
     """
-    if not isinstance(data, str):
-        data = json.dumps(data)
+    data = metrics.count_rows(data)
+
+    if isinstance(data, Iterator):
+        data = _iter_json(data)
+    elif not isinstance(data, str):
+        with profiling.phase("encode"):
+            data = json_encoder.dumps(data)
 
     # content_type implements a response header 'Content-type: xxxx'
     # mimetype is internal flask parameter not visible to requestor
@@ -32,12 +191,39 @@ def response_json(code, data):
         response=data)
 
 
+def response_exception(exc):
+    """
+    Return error response for exception raised while processing the request
+    Exhausted time budget is reported with distinct code and timings
+    :param Exception exc: exception
+    """
+    if isinstance(exc, DeadlineExceeded):
+        logging.warning(str(exc))
+        return response_json(503, {"result": str(exc), "budget": exc.budget, "elapsed": exc.elapsed})
+
+    logging.exception(exc)
+    return response_json(500, {"result": str(exc)})
+
+
+@client_provider_bp.errorhandler(DeadlineExceeded)
+def handle_deadline_exceeded(exc):
+    return response_exception(exc)
+
+
 def response_csv(code, data):
     """
     Return CSV-formatted response
     :param int code: HTTP response code
-    :param list data: data to be returned
+    :param data: list of dictionaries to be returned, or iterator to stream them from
     """
+    data = metrics.count_rows(data)
+
+    if isinstance(data, Iterator):
+        return Response(
+            status=code,
+            mimetype='text/csv',
+            response=_iter_csv(data))
+
     if not data:
         data = list()
 
@@ -60,21 +246,99 @@ def response_csv(code, data):
         mimetype='text/csv',
         response=si.getvalue())
 
+
+def get_page_params():
+    """
+    Get pagination parameters from request body
+    Pagination is requested if either 'limit' or 'cursor' is given
+    :return tuple: (limit, cursor) or (None, None) if pagination is not requested
+    :raises ValueError: if parameters are invalid
+    """
+    limit = request.json.get('limit')
+    cursor = request.json.get('cursor')
+
+    if limit is None and cursor is None:
+        return None, None
+
+    if limit is None:
+        limit = _PAGE_LIMIT_MAX
+
+    if isinstance(limit, bool) or not isinstance(limit, (int, str)):
+        raise ValueError("Limit must be an integer")
+
+    limit = int(limit)
+
+    if limit < 1 or limit > _PAGE_LIMIT_MAX:
+        raise ValueError("Limit must be in range [1, %d]" % _PAGE_LIMIT_MAX)
+
+    if cursor is not None and not isinstance(cursor, str):
+        raise ValueError("Cursor must be a string")
+
+    return limit, cursor
+
+
+def response_page(code, data, next_cursor, need_csv=False):
+    """
+    Return one page of deliveries
+    :param int code: HTTP response code
+    :param list data: deliveries on the page
+    :param str next_cursor: cursor for the next page, None if this page is the last one
+    :param bool need_csv: return page in CSV format, next cursor is sent in 'X-Next-Cursor' header then
+    """
+    if need_csv:
+        response = response_csv(code, data)
+    else:
+        metrics.count_rows(data)
+        response = response_json(code, {"deliveries": data, "next_cursor": next_cursor})
+
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+
+    return response
+
+
+def get_deliveries_page(client, search_params, timezone, limit, cursor, need_csv=False, v2=False):
+    """
+    Process paginated deliveries request
+    :param str client: client code
+    :param dict search_params: search filters
+    :param str timezone: timezone
+    :param int limit: page size
+    :param str cursor: opaque cursor for the page, None for the first page
+    :param bool need_csv: return page in CSV format
+    :param bool v2: return deliveries in version 2 format
+    """
+    try:
+        delivery_list, next_cursor, error = client_getter.get_deliveries_page(
+                client, search_params, timezone, limit, cursor, v2=v2)
+    except InvalidCursorError as _e:
+        return response_json(400, {"result": str(_e)})
+
+    if error:
+        return response_json(500, {"result": error})
+
+    if not delivery_list and not cursor:
+        return response_json(404, {"result": "No deliveries found for client %s" % client})
+
+    return response_page(201, delivery_list, next_cursor, need_csv=need_csv)
+
+
 @client_provider_bp.route('/rundeck/clients', methods=['GET'])
 @client_provider_bp.route('/clients', methods=['GET'])
+@db.no_database
 def get_client_list():
     """
     Endpoint returning list of active clients
     The difference between '/rundeck/clients' and general '/clients' endpoints:
     1. Clients are sorted alphabetically
     2. No '404' error for empty list
+    The list is served from in-process snapshot, 'If-None-Match' request header is supported
     """
-    logging.info("GET [%s] from [%s]" % (request.url_rule.rule, request.remote_addr))
+    logging.info("GET [%s] from [%s]", request.url_rule.rule, request.remote_addr)
     try:
-        client_list = client_getter.get_clients()
+        client_list, etag = _clients_snapshot.get()
     except Exception as _e:
-        logging.exception(_e)
-        return response_json(500, {"result": str(_e)})
+        return response_exception(_e)
 
     if not client_list:
         if 'rundeck' not in request.url_rule.rule:
@@ -82,23 +346,27 @@ def get_client_list():
         
         client_list = list()
 
-    if 'rundeck' in request.url_rule.rule:
-        client_list.sort()
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        # the list is sorted by the loader, see 'ClientGetter.get_clients'
+        response = response_json(200, client_list)
 
-    return response_json(200, client_list)
+    # weak since the response may be compressed
+    response.set_etag(etag, weak=True)
+    return response
 
 @client_provider_bp.route('/client_lang', methods=['POST'])
 def get_client_lang_list():
     """
     Endpoint returning map of client: lang by given list of clients
     """
-    logging.info("POST /client_lang from [%s]" % request.remote_addr)
+    logging.info("POST /client_lang from [%s]", request.remote_addr)
     try:
         client_list = request.json
         client_lang_dict = client_getter.get_client_lang_list(client_list)
     except Exception as _e:
-        logging.exception(_e)
-        return response_json(500, {"result": str(_e)})
+        return response_exception(_e)
 
     if not client_lang_dict:
         return response_json(404, {"result": "Client not found"})
@@ -110,7 +378,7 @@ def get_client_deliveries():
     """
     Endpoint returning list of client's deliveries
     """
-    logging.info("POST /deliveries from [%s]" % request.remote_addr)
+    logging.info("POST /deliveries from [%s]", request.remote_addr)
     timezone = request.json.get('timezone') or 'Etc/UTC'
     need_csv = request.json.get('csv', True)
 
@@ -119,13 +387,22 @@ def get_client_deliveries():
         need_csv = bool(need_csv.strip().lower() in ['', 'yes', 'true'])
 
     client = request.json.get("client")
+    metrics.annotate(client=client)
 
     if not client:
         return response_json(400, {"result": "Client code must be specified"})
 
     search_params = request.json.get('search_params') or dict()
 
-    delivery_list, error = client_getter.get_deliveries(client, search_params, timezone)
+    try:
+        limit, cursor = get_page_params()
+    except ValueError as _e:
+        return response_json(400, {"result": str(_e)})
+
+    if limit:
+        return get_deliveries_page(client, search_params, timezone, limit, cursor, need_csv=need_csv)
+
+    delivery_list, error = client_getter.get_deliveries_stream(client, search_params, timezone)
 
     if not delivery_list and not error:
         return response_json(404, {"result": "No deliveries found for client %s" % client})
@@ -144,15 +421,25 @@ def get_client_deliveries_v2():
     """
     Endpoint returning list of client's deliveries
     """
-    logging.info("POST /v2/deliveries from [%s]" % request.remote_addr)
+    logging.info("POST /v2/deliveries from [%s]", request.remote_addr)
     timezone = request.json.get('timezone') or 'Etc/UTC'
     client = request.json.get("client")
+    metrics.annotate(client=client)
 
     if not client:
         return response_json(400, '{"result": "Client code must be specified"}')
 
     search_params = request.json.get('search_params') or dict()
-    delivery_list, error = client_getter.get_deliveries_v2(client, search_params, timezone)
+
+    try:
+        limit, cursor = get_page_params()
+    except ValueError as _e:
+        return response_json(400, {"result": str(_e)})
+
+    if limit:
+        return get_deliveries_page(client, search_params, timezone, limit, cursor, v2=True)
+
+    delivery_list, error = client_getter.get_deliveries_stream(client, search_params, timezone, v2=True)
 
     if not delivery_list and not error:
         return response_json(404, {"result": "No deliveries found for client %s" % client})
@@ -163,27 +450,193 @@ def get_client_deliveries_v2():
     return response_json(201, delivery_list)
 
 
+@client_provider_bp.route('/v2/deliveries/changes', methods=['POST'])
+def get_client_deliveries_changes():
+    """
+    Endpoint returning client's deliveries created, modified or deleted since the watermark given
+    """
+    logging.info("POST /v2/deliveries/changes from [%s]", request.remote_addr)
+    timezone = request.json.get('timezone') or 'Etc/UTC'
+    client = request.json.get("client")
+    metrics.annotate(client=client)
+    watermark = request.json.get("watermark")
+
+    if not client:
+        return response_json(400, {"result": "Client code must be specified"})
+
+    if watermark is not None and not isinstance(watermark, str):
+        return response_json(400, {"result": "Watermark must be a string"})
+
+    try:
+        changes, error = client_getter.get_deliveries_changes(client, timezone, watermark)
+    except InvalidCursorError as _e:
+        return response_json(400, {"result": str(_e)})
+
+    if error:
+        return response_json(500, {"result": error})
+
+    metrics.annotate(rows=len(changes.get("deliveries")))
+    return response_json(200, changes)
+
+
+@client_provider_bp.route('/v2/deliveries_by_clients', methods=['POST'])
+def get_deliveries_by_clients():
+    """
+    Endpoint returning deliveries of several clients found with the same search params, grouped by client
+    """
+    logging.info("POST /v2/deliveries_by_clients from [%s]", request.remote_addr)
+
+    if not isinstance(request.json, dict):
+        return response_json(400, {"result": "Client codes must be specified"})
+
+    timezone = request.json.get('timezone') or 'Etc/UTC'
+    client_codes = request.json.get('clients')
+    metrics.annotate(clients=len(client_codes) if isinstance(client_codes, list) else None)
+
+    if not client_codes or not isinstance(client_codes, list) or not all(
+            isinstance(_code, str) and _code for _code in client_codes):
+        return response_json(400, {"result": "Client codes must be a non-empty list of non-empty strings"})
+
+    if len(client_codes) > _DELIVERIES_CLIENTS_MAX:
+        return response_json(400, {"result": "Not more than %d client codes may be requested" % _DELIVERIES_CLIENTS_MAX})
+
+    search_params = request.json.get('search_params') or dict()
+    deliveries, error = client_getter.get_deliveries_by_clients(client_codes, search_params, timezone)
+
+    if error:
+        return response_json(500, {"result": error})
+
+    metrics.annotate(rows=sum(map(len, deliveries.values())))
+    return response_json(201, deliveries)
+
+
 @client_provider_bp.route ('/get_client_data/<int:client_id>', methods=['GET'] )
 def get_client_data (client_id):
     """
     Endpoint returning client data by id
     """
-    logging.info("GET /get_client_data/%i from [%s]" % (client_id, request.remote_addr))
+    logging.info("GET /get_client_data/%i from [%s]", client_id, request.remote_addr)
     try:
         client_data = client_getter.get_client_data(client_id)
     except Exception as _e:
-        logging.exception(_e)
-        return response_json(500, {"result": str(_e)})
+        return response_exception(_e)
 
     if not client_data:
         return response_json(404, {"result": "Client not found (id=[%d])" % client_id})
 
     return response_json(200, client_data)
 
+@client_provider_bp.route('/client_data', methods=['POST'])
+def get_client_data_list():
+    """
+    Endpoint returning client data for several clients by ids and/or codes
+    Clients not found are returned as null values
+    """
+    logging.info("POST /client_data from [%s]", request.remote_addr)
+
+    if not isinstance(request.json, dict):
+        return response_json(400, {"result": "Client ids and/or codes must be specified"})
+
+    client_ids = request.json.get('ids') or list()
+    client_codes = request.json.get('codes') or list()
+
+    if not isinstance(client_ids, list) or not all(
+            isinstance(_id, int) and not isinstance(_id, bool) for _id in client_ids):
+        return response_json(400, {"result": "Client ids must be a list of integers"})
+
+    if not isinstance(client_codes, list) or not all(isinstance(_code, str) for _code in client_codes):
+        return response_json(400, {"result": "Client codes must be a list of strings"})
+
+    if len(client_ids) + len(client_codes) > _CLIENT_DATA_LIST_MAX:
+        return response_json(400, {"result": "Not more than %d ids and codes may be requested" % _CLIENT_DATA_LIST_MAX})
+
+    try:
+        ids_data, codes_data = client_getter.get_client_data_list(client_ids, client_codes)
+    except Exception as _e:
+        return response_exception(_e)
+
+    return response_json(200, {"ids": ids_data, "codes": codes_data})
+
 @client_provider_bp.route('/client_counterparty/<string:client_code>', methods = ['GET'] )
+@db.no_database
 def get_counterparty (client_code):
     """
     Endpoint returning client counterparty
     """
-    logging.info("GET /client_counterparty/%s from [%s]" % (client_code, request.remote_addr))
-    return response_json(200, {client_code: ClientCounterparty().client_counterparty(client_code)})
+    logging.info("GET /client_counterparty/%s from [%s]", client_code, request.remote_addr)
+
+    try:
+        _counterparty = client_counterparty.client_counterparty(client_code)
+    except Exception as _e:
+        return response_exception(_e)
+
+    return response_json(200, {client_code: _counterparty})
+
+@client_provider_bp.route('/client_counterparty', methods=['POST'])
+@db.no_database
+def get_counterparty_list():
+    """
+    Endpoint returning map of client: counterparty by given list of clients
+    """
+    logging.info("POST /client_counterparty from [%s]", request.remote_addr)
+    client_list = request.json
+
+    if not isinstance(client_list, list) or not all(isinstance(_code, str) for _code in client_list):
+        return response_json(400, {"result": "List of client codes must be specified"})
+
+    try:
+        client_counterparty_dict = client_counterparty.client_counterparties(client_list)
+    except Exception as _e:
+        return response_exception(_e)
+
+    return response_json(200, client_counterparty_dict)
+
+@client_provider_bp.route('/cache_stats', methods=['GET'])
+@db.no_database
+def get_cache_stats():
+    """
+    Endpoint returning in-process caches statistics (hits, misses, sizes) for current worker
+    """
+    logging.info("GET /cache_stats from [%s]", request.remote_addr)
+    return response_json(200, cache.get_stats())
+
+@client_provider_bp.route('/db_stats', methods=['GET'])
+@db.no_database
+def get_db_stats():
+    """
+    Endpoint returning database connections usage statistics for current worker
+    """
+    logging.info("GET /db_stats from [%s]", request.remote_addr)
+    return response_json(200, db.get_stats())
+
+@client_provider_bp.route('/metrics', methods=['GET'])
+@db.no_database
+def get_metrics():
+    """
+    Endpoint returning metrics in Prometheus text format
+    """
+    logging.debug("GET /metrics from [%s]", request.remote_addr)
+    data, content_type = metrics.generate_latest()
+    return Response(status=200, content_type=content_type, response=data)
+
+@client_provider_bp.route('/health/live', methods=['GET'])
+@db.no_database
+def get_liveness():
+    """
+    Endpoint for liveness probe, the worker process is able to serve requests, no database access
+    """
+    logging.debug("GET /health/live from [%s]", request.remote_addr)
+    return response_json(200, {"result": "alive"})
+
+@client_provider_bp.route('/health/ready', methods=['GET'])
+@db.no_database
+def get_readiness():
+    """
+    Endpoint for readiness probe, the worker process is warmed up: database connection and caches are primed
+    Warm-up is started here if it was not (the service is run without gunicorn configuration),
+        failed warm-up steps are run again here
+    """
+    logging.debug("GET /health/ready from [%s]", request.remote_addr)
+    warmup.start()
+    _state = warmup.get_state()
+    return response_json(200 if _state.get("ready") else 503, _state)
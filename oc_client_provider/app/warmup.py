@@ -0,0 +1,158 @@
+import time
+import threading
+import logging
+
+## NOTE: imports of django-related things are done in the functions where they necessary
+##       since Django is configured after this module is imported
+
+_lock = threading.Lock()
+_state = {
+        "started": None,
+        "finished": None,
+        "error": None,
+        "steps": dict()}
+
+
+def _prime_database():
+    """
+    Open database connection of the calling thread
+    """
+    from django.db import connection
+    connection.ensure_connection()
+
+    if not connection.is_usable():
+        raise RuntimeError("Database connection is not usable")
+
+
+def _prime_clients():
+    from .routes import _clients_snapshot
+    _clients_snapshot.get()
+
+
+def _prime_groupids():
+    from .client_getter import _groupid_resolver
+    _groupid_resolver.load()
+
+
+def _prime_file_index():
+    from ..file_index import indexer
+
+    # the index is synchronized in background, not on search
+    indexer.start_sync()
+
+
+# steps run in background, process-wide caches are primed there
+_CACHE_STEPS = [
+        ("clients", _prime_clients),
+        ("groupids", _prime_groupids),
+        ("file_index", _prime_file_index)]
+
+
+def _run_step(name, step):
+    """
+    Run warm-up step and record its duration and result
+    :param str name: step name
+    :param step: callable without arguments
+    :return bool: True if succeeded
+    """
+    _start = time.monotonic()
+    _error = None
+
+    try:
+        step()
+    except Exception as _e:
+        logging.exception(_e)
+        _error = str(_e)
+
+    _duration = time.monotonic() - _start
+    logging.debug("Warm-up step [%s] is done in %.3f seconds", name, _duration)
+
+    with _lock:
+        _state["steps"][name] = {"duration": _duration, "error": _error}
+
+    return _error is None
+
+
+def _run_cache_steps(steps):
+    """
+    Run cache steps given in background thread
+    :param list steps: (name, callable) pairs
+    """
+    _failed = list(filter(lambda x: not _run_step(*x), steps))
+
+    with _lock:
+        _state["finished"] = time.time()
+
+        if _failed:
+            _state["error"] = "Failed steps: %s" % ", ".join(map(lambda x: x[0], _failed))
+
+    logging.info("Warm-up is finished in %.3f seconds", _state["finished"] - _state["started"])
+
+
+def _get_failed_steps():
+    """
+    Cache steps to run again, has to be called under the lock
+    :return list: (name, callable) pairs of steps failed if warm-up is finished with errors, empty list otherwise
+    """
+    if _state["finished"] is None or not _state["error"]:
+        return list()
+
+    return list(filter(lambda x: _state["steps"].get(x[0], dict()).get("error"), _CACHE_STEPS))
+
+
+def start():
+    """
+    Warm up current worker process, does nothing if started already and not failed
+    Database connection is opened for the calling thread, so it has to be the one serving requests,
+        caches are primed in background
+    Steps failed are run again if warm-up is finished with errors, so the worker becomes ready
+        when the database or the caches are available again
+    """
+    with _lock:
+        if _state["started"] is not None:
+            _steps = _get_failed_steps()
+
+            if not _steps:
+                return
+
+            # state is 'not finished' while failed steps are run again
+            _state.update({"finished": None, "error": None})
+        else:
+            _state["started"] = time.time()
+            _steps = None
+
+    if _steps:
+        logging.info("Retrying failed warm-up steps: %s", ", ".join(map(lambda x: x[0], _steps)))
+        threading.Thread(target=_run_cache_steps, args=(_steps,), name="oc-client-provider-warmup",
+                daemon=True).start()
+        return
+
+    logging.info("Warming up")
+
+    if not _run_step("database", _prime_database):
+        # connection is opened on demand later
+        logging.warning("Database connection is not primed")
+
+    threading.Thread(target=_run_cache_steps, args=(_CACHE_STEPS,), name="oc-client-provider-warmup",
+            daemon=True).start()
+
+
+def get_state():
+    """
+    Warm-up state of current worker process
+    :return dict: timestamps, error and per-step durations and errors
+    """
+    with _lock:
+        _result = dict(_state)
+        _result["steps"] = dict(_state["steps"])
+
+    _result["ready"] = _result["finished"] is not None and not _result["error"]
+    return _result
+
+
+def reset():
+    """
+    Forget warm-up state, so it may be started again
+    """
+    with _lock:
+        _state.update({"started": None, "finished": None, "error": None, "steps": dict()})
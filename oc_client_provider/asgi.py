@@ -0,0 +1,8 @@
+import os
+from .wsgi import app as wsgi_app
+from .app.asgi import PooledWsgiToAsgi
+from .app import warmup
+
+# ORM is initialized in 'wsgi' module, the same Flask application is served asynchronously here
+# number of threads is the maximal number of concurrent database connections also
+app = PooledWsgiToAsgi(wsgi_app, max_threads=int(os.getenv("ASGI_THREADS") or 16), startup=warmup.start)
@@ -0,0 +1,3 @@
+# Django application with inverted indexes of delivery files (file path -> deliveries)
+#   and delivery names for searches
+# see 'indexer' module for index maintenance and search
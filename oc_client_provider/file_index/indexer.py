@@ -0,0 +1,255 @@
+import os
+import time
+import logging
+import threading
+
+## NOTE: imports of django-related things are done in the functions where they necessary
+##       since Django is configured after this module is imported
+
+# name of IndexState record
+_STATE_NAME = "deliveries"
+
+# number of deliveries indexed at once
+_BATCH_SIZE = 500
+
+# index is synchronized with deliveries in background with this interval (seconds), zero or negative disables it
+_SYNC_INTERVAL = float(os.getenv("FILE_INDEX_SYNC_INTERVAL") or 60)
+_sync_lock = threading.Lock()
+_sync_thread = None
+
+
+def is_enabled():
+    """
+    Index may be disabled with environment for troubleshooting, text search is used then
+    :return bool:
+    """
+    return os.getenv("FILE_INDEX_ENABLED", "true").strip().lower() not in ["n", "no", "false", "0"]
+
+
+def _get_client_getter():
+    # files list is split exactly as it is done for the response
+    from ..app.client_getter import ClientGetter
+    return ClientGetter()
+
+
+def index_deliveries(delivery_ids):
+    """
+    (Re-)index files and names of the deliveries given, index records of absent deliveries are removed
+    :param list delivery_ids: Delivery ids
+    :return int: number of files index records created
+    """
+    from django.db import transaction
+    from oc_delivery_apps.dlmanager.models import Delivery
+    from .models import DeliveryFile, DeliveryName
+
+    _client_getter = _get_client_getter()
+    _delivery_ids = sorted(set(delivery_ids))
+    _count = 0
+
+    for _start in range(0, len(_delivery_ids), _BATCH_SIZE):
+        _chunk = _delivery_ids[_start:_start + _BATCH_SIZE]
+        _deliveries = list(Delivery.objects.filter(id__in=_chunk).values_list(
+            'id', 'groupid', 'artifactid', 'version', 'mf_delivery_files_specified', named=True))
+        _files = list()
+        _names = list(map(lambda x: DeliveryName(delivery_id=x.id, groupid=x.groupid,
+            name="-".join([x.artifactid, x.version])), _deliveries))
+
+        for _delivery in _deliveries:
+            # paths are indexed as specified in the delivery since searches are made over the files list
+            _files.extend(DeliveryFile(delivery_id=_delivery.id, groupid=_delivery.groupid, path=_path)
+                    for _path in _client_getter._split_files(_delivery))
+
+        with transaction.atomic():
+            DeliveryFile.objects.filter(delivery_id__in=_chunk).delete()
+            DeliveryFile.objects.bulk_create(_files, batch_size=_BATCH_SIZE)
+            DeliveryName.objects.filter(delivery_id__in=_chunk).delete()
+            DeliveryName.objects.bulk_create(_names, batch_size=_BATCH_SIZE)
+
+        _count += len(_files)
+
+    return _count
+
+
+def _get_last_history_id():
+    from django.db.models import Max
+    from oc_delivery_apps.dlmanager.models import Delivery
+    return Delivery.history.aggregate(_max=Max('history_id')).get('_max') or 0
+
+
+def backfill():
+    """
+    Build the index from scratch for all deliveries
+    Changes made while building are caught up with the next 'sync' since history watermark is taken first
+    :return int: number of index records created
+    """
+    from django.db.models import Max
+    from oc_delivery_apps.dlmanager.models import Delivery
+    from .models import DeliveryFile, DeliveryName, IndexState
+
+    _last_history_id = _get_last_history_id()
+    _last_delivery_id = Delivery.objects.aggregate(_max=Max('id')).get('_max') or 0
+    logging.info("Building files index for deliveries up to id [%d]", _last_delivery_id)
+
+    # index is not used while it is incomplete
+    IndexState.objects.filter(name=_STATE_NAME).delete()
+    DeliveryFile.objects.all().delete()
+    DeliveryName.objects.all().delete()
+    _count = 0
+    _start = 0
+
+    while _start < _last_delivery_id:
+        _ids = list(Delivery.objects.filter(id__gt=_start, id__lte=_last_delivery_id).order_by('id').values_list(
+            'id', flat=True)[:_BATCH_SIZE])
+
+        if not _ids:
+            break
+
+        _count += index_deliveries(_ids)
+        _start = _ids[-1]
+        logging.info("Indexed deliveries up to id [%d], files: [%d]", _start, _count)
+
+    IndexState.objects.create(name=_STATE_NAME, last_delivery_id=_last_delivery_id,
+            last_history_id=_last_history_id)
+    return _count
+
+
+def sync():
+    """
+    Index deliveries created or changed since the previous synchronization
+    New deliveries are found by id, changed ones - by deliveries history
+    :return bool: True if index is synchronized, False if it is not built yet
+    """
+    from django.db import transaction
+    from django.db.models import Max
+    from oc_delivery_apps.dlmanager.models import Delivery
+    from .models import IndexState
+
+    with transaction.atomic():
+        _state = IndexState.objects.select_for_update().filter(name=_STATE_NAME).first()
+
+        if not _state:
+            logging.debug("Files index is not built yet")
+            return False
+
+        _last_history_id = _get_last_history_id()
+        _last_delivery_id = Delivery.objects.aggregate(_max=Max('id')).get('_max') or 0
+        _ids = set(Delivery.objects.filter(id__gt=_state.last_delivery_id, id__lte=_last_delivery_id).values_list(
+            'id', flat=True))
+        _ids.update(Delivery.history.filter(history_id__gt=_state.last_history_id,
+            history_id__lte=_last_history_id).values_list('id', flat=True))
+
+        if _ids:
+            logging.info("Indexing [%d] new or changed deliveries", len(_ids))
+            index_deliveries(_ids)
+
+        _state.last_delivery_id = max(_state.last_delivery_id, _last_delivery_id)
+        _state.last_history_id = max(_state.last_history_id, _last_history_id)
+        _state.save()
+
+    return True
+
+
+def _sync_loop():
+    """
+    Background synchronization, errors are logged and synchronization is retried after the interval
+    """
+    from django.db import close_old_connections
+
+    while True:
+        # connection of this thread is managed as request ones are
+        close_old_connections()
+
+        try:
+            sync()
+        except Exception as _e:
+            logging.exception(_e)
+
+        time.sleep(_SYNC_INTERVAL)
+
+
+def start_sync():
+    """
+    Start background synchronization of the index in current process, does nothing if started already or disabled
+    Searches do not write to the database, deliveries not indexed yet are searched in text
+    """
+    global _sync_thread
+
+    if _SYNC_INTERVAL <= 0 or not is_enabled():
+        return
+
+    with _sync_lock:
+        if _sync_thread is not None:
+            return
+
+        _sync_thread = threading.Thread(target=_sync_loop, name="oc-client-provider-file-index", daemon=True)
+        _sync_thread.start()
+
+
+def _get_state():
+    """
+    Get the index state
+    :return IndexState: index state or None if index is not usable
+    """
+    if not is_enabled():
+        return None
+
+    try:
+        from .models import IndexState
+        return IndexState.objects.filter(name=_STATE_NAME).first()
+    except Exception as _e:
+        # text search is used as fallback
+        logging.exception(_e)
+        return None
+
+
+def _indexed_filter(indexed, fallback):
+    """
+    Get deliveries filter using the index
+    Deliveries created or changed (by history) since the index synchronization are searched without index,
+        so the results are the same as without index at all
+    :param indexed: callable returning queryset of index records with 'delivery_id' values found
+    :param Q fallback: the same filter for Delivery without index, used for deliveries not indexed yet
+    :return Q: filter for Delivery queryset
+    """
+    from django.db.models import Q
+    from oc_delivery_apps.dlmanager.models import Delivery
+
+    _state = _get_state()
+
+    if not _state:
+        return fallback
+
+    # history records are looked up by primary key range, it is short while the index is synchronized
+    _changed = Q(id__in=Delivery.history.filter(history_id__gt=_state.last_history_id).values('id'))
+    return (Q(id__in=indexed().values('delivery_id')) & ~_changed) | \
+            ((Q(id__gt=_state.last_delivery_id) | _changed) & fallback)
+
+
+def search_filter(fallback_lookup, path_lookup, value, client_query):
+    """
+    Get deliveries filter for files search
+    Deliveries not indexed yet are searched in text of files list
+    :param str fallback_lookup: Delivery lookup to search the text, e.g. 'mf_delivery_files_specified__contains'
+    :param str path_lookup: DeliveryFile lookup for the same search by single path, e.g. 'path__contains'
+    :param str value: value to search for
+    :param dict client_query: lookups for the client deliveries by 'groupid', they are applied to index also
+    :return Q: filter for Delivery queryset
+    """
+    from django.db.models import Q
+    from .models import DeliveryFile
+    return _indexed_filter(lambda: DeliveryFile.objects.filter(**{path_lookup: value}, **client_query),
+            Q(**{fallback_lookup: value}))
+
+
+def name_filter(fallback_lookup, value, client_query):
+    """
+    Get deliveries filter for name ('artifactid-version') search, case-insensitive
+    :param str fallback_lookup: Delivery lookup to search annotated name, the annotation is up to the caller
+    :param str value: part of the name to search for
+    :param dict client_query: lookups for the client deliveries by 'groupid', they are applied to index also
+    :return Q: filter for Delivery queryset
+    """
+    from django.db.models import Q
+    from .models import DeliveryName
+    return _indexed_filter(lambda: DeliveryName.objects.filter(name__icontains=value, **client_query),
+            Q(**{fallback_lookup: value}))
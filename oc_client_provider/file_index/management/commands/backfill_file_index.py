@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from ... import indexer
+
+
+class Command(BaseCommand):
+    help = "Build index of delivery files and names used by FILE, component and project searches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--incremental", action="store_true",
+                help="Index deliveries created or changed since the previous run only")
+
+    def handle(self, *args, **options):
+        if not options.get("incremental"):
+            _count = indexer.backfill()
+            self.stdout.write("Files indexed: %d" % _count)
+            return
+
+        if not indexer.sync():
+            self.stderr.write("Index is not built yet, run without '--incremental' first")
+            return
+
+        self.stdout.write("Index is synchronized")
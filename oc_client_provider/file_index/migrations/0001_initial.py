@@ -0,0 +1,40 @@
+# Generated by Django 3.2.13 on 2026-10-17 17:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('dlmanager', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=32, unique=True)),
+                ('last_delivery_id', models.BigIntegerField(default=0)),
+                ('last_history_id', models.BigIntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'file_index_state',
+            },
+        ),
+        migrations.CreateModel(
+            name='DeliveryFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.TextField()),
+                ('delivery', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='dlmanager.delivery')),
+            ],
+            options={
+                'db_table': 'file_index_delivery_files',
+            },
+        ),
+    ]
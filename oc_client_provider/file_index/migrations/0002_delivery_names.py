@@ -0,0 +1,32 @@
+# Generated by Django 3.2.13 on 2026-10-17 17:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def reset_index_state(apps, schema_editor):
+    # index has to be built again to include delivery names
+    apps.get_model('file_index', 'IndexState').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dlmanager', '0001_initial'),
+        ('file_index', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryName',
+            fields=[
+                ('delivery', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='+', serialize=False, to='dlmanager.delivery')),
+                ('groupid', models.CharField(db_index=True, max_length=255)),
+                ('name', models.TextField()),
+            ],
+            options={
+                'db_table': 'file_index_delivery_names',
+            },
+        ),
+        migrations.RunPython(reset_index_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+import logging
+from django.db import migrations, models, transaction
+
+
+def reset_index(apps, schema_editor):
+    # index has to be built again to fill groupids and types of files
+    apps.get_model('file_index', 'IndexState').objects.all().delete()
+    apps.get_model('file_index', 'DeliveryFile').objects.all().delete()
+
+
+def create_trigram_index(apps, schema_editor):
+    # substring searches are indexable on PostgreSQL with 'pg_trgm' extension, it may be not permitted to install
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    try:
+        with transaction.atomic():
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            schema_editor.execute("CREATE INDEX file_index_path_trgm ON file_index_delivery_files "
+                    "USING gin (path gin_trgm_ops)")
+    except Exception as _e:
+        logging.warning("Trigram index is not created: %s", _e)
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS file_index_path_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_index', '0002_delivery_names'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_index, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='deliveryfile',
+            name='groupid',
+            field=models.CharField(default='', max_length=255),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='deliveryfile',
+            name='ci_type',
+            field=models.CharField(blank=True, max_length=127, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='deliveryfile',
+            index=models.Index(fields=['groupid', 'path'], name='file_index_groupid_path',
+                opclasses=['varchar_pattern_ops', 'text_pattern_ops']),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_index', '0003_file_groupid_ci_type'),
+    ]
+
+    operations = [
+        # component searches match paths with types regular expressions, stored types were not used
+        migrations.RemoveField(
+            model_name='deliveryfile',
+            name='ci_type',
+        ),
+    ]
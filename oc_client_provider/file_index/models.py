@@ -0,0 +1,43 @@
+from django.db import models
+from oc_delivery_apps.dlmanager.models import Delivery
+
+
+class DeliveryFile(models.Model):
+    """ File path as specified in the delivery files list """
+    # deliveries are managed by other services, so no database constraint to allow their deletion
+    delivery = models.ForeignKey(Delivery, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    # the same as delivery groupid, to search among the client deliveries only
+    groupid = models.CharField(max_length=255)
+    path = models.TextField(blank=False, null=False)
+
+    class Meta:
+        app_label = "file_index"
+        db_table = "file_index_delivery_files"
+        # pattern operator classes make prefix searches indexable on PostgreSQL, ignored by other databases
+        indexes = [models.Index(fields=["groupid", "path"], name="file_index_groupid_path",
+            opclasses=["varchar_pattern_ops", "text_pattern_ops"])]
+
+
+class DeliveryName(models.Model):
+    """ Delivery name as 'delivery_name' property of the delivery returns it: 'artifactid-version' """
+    delivery = models.OneToOneField(Delivery, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+",
+            primary_key=True)
+    # the same as delivery groupid, to search among the client deliveries only
+    groupid = models.CharField(max_length=255, db_index=True)
+    name = models.TextField(blank=False, null=False)
+
+    class Meta:
+        app_label = "file_index"
+        db_table = "file_index_delivery_names"
+
+
+class IndexState(models.Model):
+    """ Index watermarks: deliveries and deliveries history records indexed so far """
+    name = models.CharField(max_length=32, unique=True)
+    last_delivery_id = models.BigIntegerField(default=0)
+    last_history_id = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = "file_index"
+        db_table = "file_index_state"
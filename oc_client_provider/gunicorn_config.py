@@ -0,0 +1,32 @@
+"""
+gunicorn settings with application preloading and workers warm-up:
+    python3 -m gunicorn -c python:oc_client_provider.gunicorn_config oc_client_provider.wsgi:app
+"""
+import os
+import gc
+
+# application, Django and models are imported once in the master process,
+# workers share this memory copy-on-write
+preload_app = True
+
+
+def pre_fork(server, worker):
+    # database connections opened while preloading must not be shared with workers
+    from django.db import connections
+    connections.close_all()
+
+    # objects loaded so far are not touched by garbage collector in workers, so their memory pages stay shared
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # run in the worker thread serving requests, so its database connection is primed
+    from .app import warmup
+    warmup.start()
+
+
+def child_exit(server, worker):
+    # metrics files of the exited worker are not to be collected with ones of alive workers
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
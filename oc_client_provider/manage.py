@@ -0,0 +1,13 @@
+"""
+Django management commands with the same database settings as the service, e.g.:
+    python3 -m oc_client_provider.manage migrate file_index
+    python3 -m oc_client_provider.manage backfill_file_index
+"""
+import sys
+from django.core.management import execute_from_command_line
+
+# ORM is initialized on import
+from . import wsgi
+
+if __name__ == "__main__":
+    execute_from_command_line(sys.argv)
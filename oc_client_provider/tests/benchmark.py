@@ -0,0 +1,299 @@
+"""
+Performance benchmark over synthetic dataset seeded into the local test database
+
+It is not a part of unit tests suite, run it explicitly:
+    python3 -m oc_client_provider.tests.benchmark --clients 10000 --deliveries 1000000 --output results.json
+
+Every delivery has '--files' files registered in Locations (and historical Locations), the first one
+    is a GAV of 'COMP' component. Deliveries are spread evenly among active clients.
+"""
+import os
+
+# separate database file is used to keep unit tests data intact
+os.environ.setdefault("TEST_DB_PATH", "/tmp/benchmark.db")
+
+from . import django_settings
+import argparse
+import datetime
+import json
+import logging
+import platform
+import random
+import statistics
+import time
+import pytz
+import django
+from django.db import connection
+import oc_delivery_apps.dlmanager.models as dl_models
+import oc_delivery_apps.checksums.models as cs_models
+from ..app import create_app
+from ..app import cache
+from ..app import routes
+from .config import TestConfig
+
+_BATCH_SIZE = 5000
+_COMPONENT_REGEXP = "org\\.example\\.[^:]+:component:_VERSION_:zip"
+_START_DATE = datetime.datetime(2020, 1, 1, tzinfo=pytz.utc)
+
+
+def _client_code(index):
+    return "BENCH_CLIENT_%d" % index
+
+
+def _groupid(client_code):
+    """
+    Deliveries groupid of the client, it has to end with the client code as is to be found
+    """
+    return "org.example.%s" % client_code
+
+
+def _file_paths(client_code, delivery_index, files):
+    """
+    Paths of files of the delivery, the first one is a component, others are plain files
+    """
+    _group = _groupid(client_code)
+    _result = ["%s:component:%d.%d:zip" % (_group, delivery_index % 7, delivery_index)]
+    _result.extend("%s:artifact-%d:%d:zip" % (_group, _f, delivery_index) for _f in range(1, files))
+    return _result
+
+
+def _bulk_create(model, objects):
+    """
+    Create model objects batch by batch
+    :param model: Django model
+    :param objects: iterable of model objects
+    :return int: number of objects created
+    """
+    _count = 0
+    _batch = list()
+
+    for _object in objects:
+        _batch.append(_object)
+
+        if len(_batch) < _BATCH_SIZE:
+            continue
+
+        model.objects.bulk_create(_batch)
+        _count += len(_batch)
+        _batch = list()
+        logging.info("%s: %d" % (model.__name__, _count))
+
+    if _batch:
+        model.objects.bulk_create(_batch)
+        _count += len(_batch)
+
+    return _count
+
+
+def seed(clients, deliveries, files, random_seed):
+    """
+    Re-create the database and fill it with synthetic data
+    :param int clients: number of active clients, 10 percent of inactive ones are added
+    :param int deliveries: number of deliveries
+    :param int files: number of files per delivery
+    :param int random_seed: seed for random generator
+    """
+    _random = random.Random(random_seed)
+    django.core.management.call_command('migrate', verbosity=0, interactive=False)
+    django.core.management.call_command('flush', verbosity=0, interactive=False)
+
+    _languages = [dl_models.ClientLanguage.objects.create(code=_c, description=_c) for _c in ["ru", "en"]]
+    _bulk_create(dl_models.Client, (dl_models.Client(
+        code=_client_code(_i), country="XX", language=_random.choice(_languages),
+        is_active=bool(_i < clients)) for _i in range(clients + clients // 10)))
+
+    cs_models.CiTypes.objects.create(code="FILE", name="File", is_standard="N", is_deliverable=False)
+    cs_models.CiTypes.objects.create(code="COMP", name="Component", is_standard="N", is_deliverable=True)
+    cs_models.LocTypes.objects.create(code="NXS", name="Maven")
+    cs_models.CiRegExp.objects.create(loc_type_id="NXS", ci_type_id="COMP", regexp=_COMPONENT_REGEXP)
+    _statuses = [dl_models.BusinessStatus.objects.create(description=_d) for _d in ["Approved", "Received by client"]]
+
+    def _creation_date(index):
+        return _START_DATE + datetime.timedelta(minutes=index * 7)
+
+    def _deliveries():
+        for _i in range(deliveries):
+            _client = _client_code(_i % clients)
+            yield dl_models.Delivery(
+                    groupid=_groupid(_client),
+                    artifactid="delivery-%d" % (_i % 100),
+                    version="%d" % _i,
+                    creation_date=_creation_date(_i),
+                    mf_delivery_author="author%d" % _random.randint(0, 99),
+                    mf_delivery_files_specified="\n".join(_file_paths(_client, _i, files)),
+                    flag_approved=_random.choice([True, False]),
+                    business_status=_random.choice(_statuses + [None]),
+                    comment="")
+
+    _bulk_create(dl_models.Delivery, _deliveries())
+
+    # explicit primary keys are used since 'bulk_create' does not return them for all databases
+    _bulk_create(cs_models.Files, (cs_models.Files(id=_i + 1, mime_type="application/zip", ci_type_id=(
+        "COMP" if not _i % files else "FILE")) for _i in range(deliveries * files)))
+
+    def _locations():
+        for _i in range(deliveries):
+            for _f, _path in enumerate(_file_paths(_client_code(_i % clients), _i, files)):
+                yield _i, _i * files + _f + 1, _path
+
+    _bulk_create(cs_models.Locations, (cs_models.Locations(
+        id=_id, file_id=_id, path=_path, loc_type_id="NXS") for _i, _id, _path in _locations()))
+    _bulk_create(cs_models.Locations.history.model, (cs_models.Locations.history.model(
+        id=_id, file_id=_id, path=_path, loc_type_id="NXS", input_date=_creation_date(_i),
+        history_date=_creation_date(_i) - datetime.timedelta(hours=1),
+        history_type="+") for _i, _id, _path in _locations()))
+
+
+class _QueryCounter(object):
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def get_scenarios(clients, deliveries):
+    """
+    Requests to measure
+    :return list: list of tuples (name, method, path, json body)
+    """
+    _client = _client_code(0)
+    _clients = [_client_code(_i) for _i in range(0, clients, max(clients // 100, 1))]
+    _middle = _START_DATE + datetime.timedelta(minutes=deliveries * 7 // 2)
+    _date_range = {
+            "date_range_after": (_middle - datetime.timedelta(days=30)).strftime("%d-%m-%Y"),
+            "date_range_before": _middle.strftime("%d-%m-%Y")}
+
+    return [
+            ("clients", "GET", "/clients", None),
+            ("rundeck_clients", "GET", "/rundeck/clients", None),
+            ("client_lang", "POST", "/client_lang", _clients),
+            ("deliveries_csv", "POST", "/deliveries", {"client": _client, "csv": True}),
+            ("deliveries_json", "POST", "/deliveries", {"client": _client, "csv": False}),
+            ("v2_deliveries", "POST", "/v2/deliveries", {"client": _client}),
+            ("v2_deliveries_component", "POST", "/v2/deliveries", {"client": _client,
+                "search_params": {"component_0": "COMP", "component_1": "1."}}),
+            ("v2_deliveries_file", "POST", "/v2/deliveries", {"client": _client,
+                "search_params": {"component_0": "FILE", "component_1": "artifact-1:"}}),
+            ("v2_deliveries_date", "POST", "/v2/deliveries", {"client": _client,
+                "search_params": _date_range}),
+            ("v2_deliveries_project", "POST", "/v2/deliveries", {"client": _client,
+                "search_params": {"project": "delivery-0-"}})]
+
+
+def _summary(durations, db_queries):
+    return {
+            "db_queries": db_queries,
+            "min": min(durations),
+            "median": statistics.median(durations),
+            "mean": statistics.mean(durations),
+            "max": max(durations)}
+
+
+def run(scenarios, repeat):
+    """
+    Measure all scenarios, the first request of each one is a warm-up and is not measured
+    Each measured iteration is a pair of requests: the first one after all caches are cleared ('uncached'),
+        the second one is the same request served from caches ('cached')
+    :param list scenarios: see 'get_scenarios'
+    :param int repeat: number of measured iterations per scenario
+    :return list: results per scenario
+    """
+    _test_client = create_app(TestConfig).test_client()
+    _results = list()
+
+    def _request(path, method, json_body):
+        _counter = _QueryCounter()
+
+        with connection.execute_wrapper(_counter):
+            _start = time.perf_counter()
+
+            with _test_client.open(path, method=method, json=json_body) as _response:
+                _size = len(_response.get_data())
+
+            _duration = time.perf_counter() - _start
+
+        return _duration, _counter.count, _response.status_code, _size
+
+    for _name, _method, _path, _json in scenarios:
+        _durations = {"uncached": list(), "cached": list()}
+        _queries = dict()
+        _statuses = set([_request(_path, _method, _json)[2]])
+
+        for _i in range(repeat):
+            for _kind in ["uncached", "cached"]:
+                if _kind == "uncached":
+                    cache.clear_all()
+
+                _duration, _queries[_kind], _status, _size = _request(_path, _method, _json)
+                _durations[_kind].append(_duration)
+                _statuses.add(_status)
+
+        _result = {
+                "name": _name,
+                "method": _method,
+                "path": _path,
+                "status": _status,
+                # timings of error responses (nothing found, for example) are not comparable
+                "ok": all(map(lambda x: 200 <= x < 300, _statuses)),
+                "response_size": _size,
+                "repeat": repeat}
+        _result.update((_kind, _summary(_v, _queries[_kind])) for _kind, _v in _durations.items())
+
+        if not _result["ok"]:
+            logging.error("%s: unexpected response statuses %s" % (_name, sorted(_statuses)))
+
+        logging.info("%s: %s" % (_name, json.dumps(_result)))
+        _results.append(_result)
+
+    return _results
+
+
+def main():
+    _parser = argparse.ArgumentParser(description="Client provider performance benchmark")
+    _parser.add_argument("--clients", type=int, default=1000, help="Number of active clients")
+    _parser.add_argument("--deliveries", type=int, default=10000, help="Number of deliveries")
+    _parser.add_argument("--files", type=int, default=5, help="Number of files per delivery")
+    _parser.add_argument("--repeat", type=int, default=5, help="Number of measured iterations per scenario")
+    _parser.add_argument("--seed", type=int, default=0, help="Random generator seed")
+    _parser.add_argument("--no-seed", action="store_true", help="Do not re-create the data, use existing ones")
+    _parser.add_argument("--label", default="", help="Label to distinguish results, version for example")
+    _parser.add_argument("--output", default="benchmark.json", help="Path to JSON file with results")
+    _args = _parser.parse_args()
+
+    logging.basicConfig(format='[%(asctime)s] [%(levelname)s] %(message)s', level=logging.INFO)
+
+    if not _args.no_seed:
+        _start = time.perf_counter()
+        seed(_args.clients, _args.deliveries, _args.files, _args.seed)
+        logging.info("Seeded in %.1f seconds" % (time.perf_counter() - _start))
+
+    # application logging is not a subject to measure
+    logging.getLogger().setLevel(logging.WARNING)
+    _results = run(get_scenarios(_args.clients, _args.deliveries), _args.repeat)
+    logging.getLogger().setLevel(logging.INFO)
+
+    _report = {
+            "label": _args.label,
+            "timestamp": datetime.datetime.now(pytz.utc).isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "json_encoder": routes.json_encoder.name,
+            "volumes": {"clients": _args.clients, "deliveries": _args.deliveries, "files": _args.files},
+            "seed": _args.seed,
+            "results": _results}
+
+    with open(_args.output, "w") as _stream:
+        json.dump(_report, _stream, indent=4)
+
+    logging.info("Results are written to [%s]" % _args.output)
+    _failed = list(map(lambda x: x["name"], filter(lambda x: not x["ok"], _results)))
+
+    if _failed:
+        raise SystemExit("Scenarios failed: %s" % ", ".join(_failed))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,7 @@ if not settings.configured:
             DATABASES={
                 'default': {
                     'ENGINE': 'django.db.backends.sqlite3',
-                    'NAME': '/tmp/test.db',
+                    'NAME': os.getenv('TEST_DB_PATH') or '/tmp/test.db',
                     }},
                 USE_TZ=True,
                 TIME_ZONE='Europe/Belgrade',
@@ -18,6 +18,7 @@ if not settings.configured:
                     'oc_delivery_apps.dlcontents',
                     'oc_delivery_apps.checksums',
                     'oc_delivery_apps.dlmanager',
+                    'oc_client_provider.file_index',
                     'django.contrib.contenttypes',
                     'django.contrib.auth'],
                 LANGUAGE_CODE='en-us',
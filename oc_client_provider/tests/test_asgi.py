@@ -0,0 +1,77 @@
+import unittest
+import asyncio
+import json
+import threading
+from flask import Flask, Response
+from ..app.asgi import PooledWsgiToAsgi
+
+
+class PooledWsgiToAsgiTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.wsgi_app = Flask(__name__)
+        self.barrier = threading.Barrier(2, timeout=5)
+
+        @self.wsgi_app.route('/slow')
+        def slow():
+            # both requests must be served concurrently to pass the barrier
+            self.barrier.wait()
+            return {"thread": threading.current_thread().name}
+
+        @self.wsgi_app.route('/closing')
+        def closing():
+            _response = Response("closing")
+            _response.call_on_close(lambda: self.closed.append(threading.current_thread().name))
+            return _response
+
+        self.closed = list()
+        self.asgi_app = PooledWsgiToAsgi(self.wsgi_app, max_threads=2)
+
+    def tearDown(self):
+        self.asgi_app.executor.shutdown()
+
+    async def __request(self, path):
+        _messages = list()
+        _requests = [{"type": "http.request", "body": b"", "more_body": False}]
+
+        async def receive():
+            return _requests.pop(0)
+
+        async def send(message):
+            _messages.append(message)
+
+        await self.asgi_app({"type": "http", "method": "GET", "path": path, "query_string": b"",
+            "headers": [], "http_version": "1.1", "server": ("localhost", 5400)}, receive, send)
+
+        return _messages[0]["status"], b"".join(map(lambda x: x.get("body", b""), _messages[1:]))
+
+    def test_concurrent(self):
+        async def run():
+            return await asyncio.gather(self.__request('/slow'), self.__request('/slow'))
+
+        _responses = asyncio.run(run())
+        self.assertEqual([200, 200], list(map(lambda x: x[0], _responses)))
+        _threads = set(map(lambda x: json.loads(x[1]).get("thread"), _responses))
+        self.assertEqual(2, len(_threads))
+        self.assertTrue(all(map(lambda x: x.startswith("oc-client-provider"), _threads)))
+
+    def test_close(self):
+        self.assertEqual((200, b"closing"), asyncio.run(self.__request('/closing')))
+        self.assertEqual(1, len(self.closed))
+        self.assertTrue(self.closed[0].startswith("oc-client-provider"))
+
+    def test_lifespan(self):
+        _requests = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+        _messages = list()
+
+        async def receive():
+            return _requests.pop(0)
+
+        async def send(message):
+            _messages.append(message["type"])
+
+        # startup is run in the pool
+        self.asgi_app.startup = lambda: self.closed.append(threading.current_thread().name)
+        asyncio.run(self.asgi_app({"type": "lifespan"}, receive, send))
+        self.assertEqual(["lifespan.startup.complete", "lifespan.shutdown.complete"], _messages)
+        self.assertEqual(1, len(self.closed))
+        self.assertTrue(self.closed[0].startswith("oc-client-provider"))
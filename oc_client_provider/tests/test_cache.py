@@ -0,0 +1,185 @@
+from . import django_settings
+import unittest
+import unittest.mock
+import time
+import tempfile
+from ..app.cache import TTLCache, FileCache, Snapshot, estimate_size
+
+
+class TTLCacheTestSuite(unittest.TestCase):
+    def test_get_set(self):
+        _cache = TTLCache(max_size=2, ttl=60)
+        self.assertIsNone(_cache.get("a"))
+        _cache.set("a", 1)
+        _cache.set("b", None)
+        self.assertEqual(1, _cache.get("a"))
+        self.assertEqual("absent", _cache.get("c", "absent"))
+        self.assertIsNone(_cache.get("b", "absent"))
+        _stats = _cache.stats()
+        self.assertEqual(2, _stats.get("hits"))
+        self.assertEqual(2, _stats.get("misses"))
+        self.assertEqual(2, _stats.get("size"))
+
+    def test_lru_eviction(self):
+        _cache = TTLCache(max_size=2, ttl=60)
+        _cache.set("a", 1)
+        _cache.set("b", 2)
+        # 'a' becomes the most recently used one, so 'b' is evicted
+        self.assertEqual(1, _cache.get("a"))
+        _cache.set("c", 3)
+        self.assertEqual(1, _cache.get("a"))
+        self.assertIsNone(_cache.get("b"))
+        self.assertEqual(3, _cache.get("c"))
+        self.assertEqual(1, _cache.stats().get("evictions"))
+
+    def test_expiration(self):
+        _cache = TTLCache(max_size=2, ttl=0.01)
+        _cache.set("a", 1)
+        time.sleep(0.02)
+        self.assertIsNone(_cache.get("a"))
+        self.assertEqual(0, _cache.stats().get("size"))
+
+    def test_disabled(self):
+        _cache = TTLCache(max_size=0, ttl=60)
+        _cache.set("a", 1)
+        self.assertIsNone(_cache.get("a"))
+
+    def test_max_bytes(self):
+        _cache = TTLCache(max_size=10, ttl=60, max_bytes=100)
+        _cache.set("a", 1, size=40)
+        _cache.set("b", 2, size=40)
+        _cache.set("a", 3, size=50)
+        self.assertEqual(90, _cache.stats().get("bytes"))
+        # the least recently used 'b' is evicted to fit
+        _cache.set("c", 4, size=30)
+        self.assertIsNone(_cache.get("b"))
+        self.assertEqual(3, _cache.get("a"))
+        self.assertEqual(80, _cache.stats().get("bytes"))
+        # values larger than the cache are not cached, nothing is evicted for them
+        _cache.set("d", 5, size=101)
+        self.assertIsNone(_cache.get("d"))
+        self.assertEqual(4, _cache.get("c"))
+        _cache.clear()
+        self.assertEqual(0, _cache.stats().get("bytes"))
+
+    def test_estimate_size(self):
+        _small = estimate_size(("name", ["file"]))
+        self.assertGreater(_small, estimate_size("name") + estimate_size("file"))
+        self.assertGreater(estimate_size(("name", ["file", {"path": "x" * 1000}])), _small + 1000)
+
+
+class FileCacheTestSuite(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_get_set(self):
+        _cache = FileCache(self._directory.name, max_size=2, ttl=60)
+        self.assertIsNone(_cache.get(("a", 1)))
+        _cache.set(("a", 1), [("x", None)])
+        # entries are shared with other instances (processes) using the same directory
+        _other = FileCache(self._directory.name, max_size=2, ttl=60)
+        self.assertEqual([("x", None)], _other.get(("a", 1)))
+        self.assertIsNone(_other.get(("a", 2)))
+        _other.clear()
+        self.assertIsNone(_cache.get(("a", 1)))
+        _stats = _cache.stats()
+        self.assertEqual(0, _stats.get("hits"))
+        self.assertEqual(2, _stats.get("misses"))
+        self.assertEqual(0, _stats.get("size"))
+
+    def test_lru_eviction(self):
+        _cache = FileCache(self._directory.name, max_size=2, ttl=60)
+
+        for _key in ["a", "b", "a", "c"]:
+            # modification time is used as access time, so accesses are separated
+            time.sleep(0.01)
+
+            if _cache.get(_key) is None:
+                _cache.set(_key, _key)
+
+        self.assertEqual("a", _cache.get("a"))
+        self.assertIsNone(_cache.get("b"))
+        self.assertEqual("c", _cache.get("c"))
+        self.assertEqual(1, _cache.stats().get("evictions"))
+
+    def test_expiration(self):
+        _cache = FileCache(self._directory.name, max_size=2, ttl=0.01)
+        _cache.set("a", 1)
+        time.sleep(0.02)
+        self.assertIsNone(_cache.get("a"))
+        self.assertEqual(0, _cache.stats().get("size"))
+
+    def test_disabled(self):
+        _cache = FileCache(self._directory.name, max_size=0, ttl=60)
+        _cache.set("a", 1)
+        self.assertIsNone(_cache.get("a"))
+
+    def test_max_bytes(self):
+        # files sizes are limited, size given is ignored
+        _cache = FileCache(self._directory.name, max_size=10, ttl=60, max_bytes=3000)
+
+        for _key in ["a", "b", "c"]:
+            time.sleep(0.01)
+            _cache.set(_key, _key * 1000, size=1)
+
+        self.assertIsNone(_cache.get("a"))
+        self.assertEqual("b" * 1000, _cache.get("b"))
+        self.assertEqual("c" * 1000, _cache.get("c"))
+        self.assertEqual(1, _cache.stats().get("evictions"))
+
+
+class SnapshotTestSuite(unittest.TestCase):
+    def test_get(self):
+        _data = [["a"]]
+        _snapshot = Snapshot(lambda: _data[0], interval=60)
+        _value, _etag = _snapshot.get()
+        self.assertEqual(["a"], _value)
+        _data[0] = ["b"]
+        self.assertEqual((["a"], _etag), _snapshot.get())
+        _snapshot.clear()
+        _value, _new_etag = _snapshot.get()
+        self.assertEqual(["b"], _value)
+        self.assertNotEqual(_etag, _new_etag)
+        _stats = _snapshot.stats()
+        self.assertEqual(1, _stats.get("hits"))
+        self.assertEqual(2, _stats.get("misses"))
+
+    def test_refresh(self):
+        import django.db
+        _results = [["a"], RuntimeError("Connection is lost")]
+
+        def _loader():
+            _result = _results.pop(0) if _results else ["b"]
+
+            if isinstance(_result, Exception):
+                raise _result
+
+            return _result
+
+        _snapshot = Snapshot(_loader, interval=0.05)
+
+        with unittest.mock.patch.object(django.db, "close_old_connections") as _close_old, \
+                unittest.mock.patch.object(django.db, "connection") as _connection:
+            self.assertEqual(["a"], _snapshot.get()[0])
+
+            for _i in range(50):
+                if _snapshot.get()[0] == ["b"]:
+                    break
+
+                time.sleep(0.01)
+
+            # broken connection is closed, so the next refresh opens new one
+            self.assertEqual(["b"], _snapshot.get()[0])
+            self.assertEqual(1, _snapshot.stats().get("errors"))
+            _connection.close.assert_called_once_with()
+            self.assertLessEqual(2, _close_old.call_count)
+
+    def test_disabled(self):
+        _data = [["a"]]
+        _snapshot = Snapshot(lambda: _data[0], interval=0)
+        self.assertEqual(["a"], _snapshot.get()[0])
+        _data[0] = ["b"]
+        self.assertEqual(["b"], _snapshot.get()[0])
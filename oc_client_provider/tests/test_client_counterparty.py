@@ -0,0 +1,73 @@
+from . import django_settings
+import unittest
+import unittest.mock
+import tempfile
+import os
+from ..app import create_app
+from ..app import routes
+from ..app.client_counterparty import ClientCounterparty
+from .config import TestConfig
+
+
+class ClientCounterpartyTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "client_counterparties.yml")
+        self.__write("TEST_CLIENT_1: CP_1\nTEST_CLIENT_2: CP_2\n")
+
+        with unittest.mock.patch.dict(os.environ, {"COUNTERPARTY_ENABLED": "true", "COUNTERPARTY_PATH": self.path}):
+            self.counterparty = ClientCounterparty()
+
+        app = create_app(TestConfig)
+        app.config['TESTING'] = True
+        app.config['DEBUG'] = False
+        with app.app_context():
+            self.test_client = app.test_client()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def __write(self, content):
+        with open(self.path, "w") as _stream:
+            _stream.write(content)
+
+    def test_disabled(self):
+        with unittest.mock.patch.dict(os.environ, {"COUNTERPARTY_ENABLED": ""}):
+            _counterparty = ClientCounterparty()
+
+        self.assertEqual('', _counterparty.client_counterparty("TEST_CLIENT_1"))
+        self.assertEqual({"TEST_CLIENT_1": ''}, _counterparty.client_counterparties(["TEST_CLIENT_1"]))
+
+    def test_client_counterparty(self):
+        self.assertEqual("CP_1", self.counterparty.client_counterparty("TEST_CLIENT_1"))
+        self.assertEqual('', self.counterparty.client_counterparty("TEST_CLIENT_3"))
+
+    def test_reload(self):
+        self.assertEqual("CP_2", self.counterparty.client_counterparty("TEST_CLIENT_2"))
+        self.__write("TEST_CLIENT_2: CP_2_NEW\n")
+        self.assertEqual("CP_2_NEW", self.counterparty.client_counterparty("TEST_CLIENT_2"))
+        self.assertEqual('', self.counterparty.client_counterparty("TEST_CLIENT_1"))
+        self.__write("")
+        self.assertEqual('', self.counterparty.client_counterparty("TEST_CLIENT_2"))
+
+    def test_routes(self):
+        with unittest.mock.patch.object(routes, "client_counterparty", self.counterparty):
+            response = self.test_client.get("/client_counterparty/TEST_CLIENT_1")
+            self.assertEqual(200, response.status_code)
+            self.assertEqual({"TEST_CLIENT_1": "CP_1"}, response.json)
+
+            response = self.test_client.post("/client_counterparty", json=["TEST_CLIENT_2", "TEST_CLIENT_3"])
+            self.assertEqual(200, response.status_code)
+            self.assertEqual({"TEST_CLIENT_2": "CP_2", "TEST_CLIENT_3": ""}, response.json)
+
+            response = self.test_client.post("/client_counterparty", json={"client": "TEST_CLIENT_1"})
+            self.assertEqual(400, response.status_code)
+
+    def test_routes__missing_file(self):
+        os.remove(self.path)
+
+        with unittest.mock.patch.object(routes, "client_counterparty", self.counterparty):
+            for _response in [self.test_client.get("/client_counterparty/TEST_CLIENT_1"),
+                    self.test_client.post("/client_counterparty", json=["TEST_CLIENT_1"])]:
+                self.assertEqual(500, _response.status_code)
+                self.assertIn("result", _response.json)
@@ -2,6 +2,8 @@ from . import django_settings
 import datetime
 import random
 from ..app import create_app
+from ..app import cache
+import importlib
 import django.test
 import oc_delivery_apps.dlmanager.models as dl_models
 from oc_delivery_apps.checksums.controllers import CheckSumsController
@@ -13,6 +15,13 @@ import posixpath
 import string
 import tempfile
 import os
+import json
+import gzip
+import time
+from unittest import mock
+
+# module, not ClientGetter instance exported by 'app' package
+client_getter_module = importlib.import_module("..app.client_getter", __package__)
 
 # disable extra logging output
 import logging
@@ -54,6 +63,7 @@ class ClientProviderTestSuite(django.test.TransactionTestCase):
         app = create_app(TestConfig)
         app.config['TESTING'] = True
         app.config['DEBUG'] = False
+        cache.clear_all()
         with app.app_context():
             self.test_client = app.test_client()
         # Filling up the DB
@@ -71,13 +81,186 @@ class ClientProviderTestSuite(django.test.TransactionTestCase):
         self.assertEqual(len(_actual_list), 51)
 
     def test_get_clients__rundeck(self):
+        for _code in ["ab", "a_b", "ABD"]:
+            dl_models.Client.objects.create(code=_code, is_active=True)
+
         response = self.test_client.get("/rundeck/clients")
         self.assertEqual(response.status_code, 200)
-        _actual_list = sorted(response.json)
+        # code points order regardless of database collation
         _expected_list = sorted(list(map(lambda x: x.code, dl_models.Client.objects.filter(is_active=True))))
-        _expected_list.sort()
-        self.assertEqual(_actual_list, _expected_list)
-        self.assertEqual(len(_actual_list), 51)
+        self.assertEqual(response.json, _expected_list)
+        self.assertEqual(len(response.json), 54)
+
+    def test_get_clients__etag(self):
+        response = self.test_client.get("/clients")
+        self.assertEqual(response.status_code, 200)
+        _etag = response.headers.get("ETag")
+        self.assertTrue(_etag)
+
+        # snapshot is served until refreshed
+        dl_models.Client.objects.create(code="TEST_CLIENT_NEW", is_active=True).save()
+        response = self.test_client.get("/rundeck/clients", headers={"If-None-Match": _etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(b"", response.data)
+        self.assertEqual(_etag, response.headers.get("ETag"))
+
+        cache.clear_all()
+        response = self.test_client.get("/rundeck/clients", headers={"If-None-Match": _etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(_etag, response.headers.get("ETag"))
+        self.assertIn("TEST_CLIENT_NEW", response.json)
+        self.assertEqual(sorted(response.json), response.json)
+
+    def test_get_client_data_list(self):
+        _client_1 = dl_models.Client.objects.get(code="TEST_CLIENT_1")
+        _client_2 = dl_models.Client.objects.get(code="TEST_CLIENT_1488")
+        response = self.test_client.post("/client_data", json={
+            "ids": [_client_1.id, 999999], "codes": ["TEST_CLIENT_1488", "TEST_CLIENT_UNKNOWN"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({
+            "ids": {
+                str(_client_1.id): {"code": "TEST_CLIENT_1", "country": _client_1.country,
+                    "language": _client_1.language.code},
+                "999999": None},
+            "codes": {
+                "TEST_CLIENT_1488": {"code": "TEST_CLIENT_1488", "country": _client_2.country, "language": ""},
+                "TEST_CLIENT_UNKNOWN": None}}, response.json)
+
+        response = self.test_client.post("/client_data", json={"ids": ["TEST_CLIENT_1"]})
+        self.assertEqual(response.status_code, 400)
+
+    def test_metrics(self):
+        # metrics are collected on response closing which is done by WSGI server
+        self.test_client.get("/clients").close()
+        self.test_client.get("/rundeck/clients").close()
+
+        with self.test_client.post('/v2/deliveries', json={'client': 'TEST_CLIENT_1'}) as _response:
+            _size = len(_response.data)
+
+        response = self.test_client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        _metrics = dict()
+
+        for _line in response.data.decode("utf-8").splitlines():
+            if _line and not _line.startswith("#"):
+                _name, _value = _line.rsplit(" ", 1)
+                _metrics[_name] = float(_value)
+
+        self.assertGreaterEqual(_metrics.get(
+            'oc_client_provider_requests_total{method="GET",rule="/rundeck/clients",status="200"}'), 1)
+        self.assertGreaterEqual(_metrics.get(
+            'oc_client_provider_requests_total{method="GET",rule="/clients",status="200"}'), 1)
+        self.assertGreaterEqual(_metrics.get(
+            'oc_client_provider_request_db_queries_sum{method="POST",rule="/v2/deliveries"}'), 1)
+        self.assertGreaterEqual(_metrics.get(
+            'oc_client_provider_response_size_bytes_sum{method="POST",rule="/v2/deliveries"}'), _size)
+
+    def test_request_summary(self):
+        with self.assertLogs("oc_client_provider.requests", level="INFO") as _logs:
+            with self.test_client.post('/v2/deliveries', json={'client': 'TEST_CLIENT_1'}) as _response:
+                self.assertEqual(201, _response.status_code)
+                _response.data
+
+            with self.test_client.post('/v2/deliveries', json={'client': 'TEST_CLIENT_1', 'limit': 3}) as _response:
+                self.assertEqual(201, _response.status_code)
+
+        _streamed, _page = map(lambda x: x.fields, _logs.records)
+        self.assertEqual("/v2/deliveries", _streamed.get("route"))
+        self.assertEqual("TEST_CLIENT_1", _streamed.get("client"))
+        self.assertEqual(201, _streamed.get("status"))
+        self.assertEqual(10, _streamed.get("rows"))
+        self.assertLessEqual(1, _streamed.get("queries"))
+        self.assertEqual(3, _page.get("rows"))
+        self.assertIn("client=TEST_CLIENT_1", _logs.output[0])
+
+    def test_profiling(self):
+        from ..app import profiling
+        _request = {'client': 'TEST_CLIENT_1'}
+
+        # disabled without token
+        response = self.test_client.post('/v2/deliveries', json=_request, headers={"X-Profile": "secret"})
+        self.assertNotIn("Server-Timing", response.headers)
+
+        with tempfile.TemporaryDirectory() as _dir, mock.patch.object(profiling, "_TOKEN", "secret"), \
+                mock.patch.object(profiling, "_DIR", _dir):
+            _expected = self.test_client.post('/v2/deliveries', json=_request)
+            self.assertNotIn("Server-Timing", _expected.headers)
+
+            response = self.test_client.post('/v2/deliveries', json=_request, headers={"X-Profile": "wrong"})
+            self.assertNotIn("Server-Timing", response.headers)
+
+            with self.assertLogs("oc_client_provider.profiling", level="INFO") as _logs:
+                response = self.test_client.post('/v2/deliveries', json=_request,
+                        headers={"X-Profile": "secret; cprofile"})
+
+            # streamed body is generated before the headers are sent, so all phases are measured
+            self.assertEqual(201, response.status_code)
+            self.assertEqual(_expected.json, response.json)
+
+            _timings = dict(map(lambda x: (x.split(";")[0].strip(), x), response.headers["Server-Timing"].split(",")))
+            self.assertEqual(["cache", "search", "fetch", "files", "serialize", "encode", "sql", "total"],
+                    list(_timings.keys()))
+            self.assertIn('queries"', _timings.get("sql"))
+
+            _fields = _logs.records[0].fields
+            self.assertEqual(response.headers["X-Profile-Id"], _fields.get("profile"))
+            self.assertLessEqual(1, len(_fields.get("queries")))
+            self.assertTrue(os.path.exists(os.path.join(_dir, "%s.prof" % _fields.get("profile"))))
+
+    def test_compression(self):
+        _expected = self.test_client.post('/v2/deliveries', json={'client': 'TEST_CLIENT_1'}).data
+        self.assertGreater(len(_expected), 1024)
+
+        # streamed
+        response = self.test_client.post('/v2/deliveries', json={'client': 'TEST_CLIENT_1'},
+                headers={"Accept-Encoding": "gzip, deflate"})
+        self.assertEqual(201, response.status_code)
+        self.assertEqual("gzip", response.headers.get("Content-Encoding"))
+        self.assertIn("Accept-Encoding", response.headers.get("Vary"))
+        self.assertEqual(_expected, gzip.decompress(response.data))
+
+        # not streamed
+        response = self.test_client.post('/v2/deliveries', json={'client': 'TEST_CLIENT_1', 'limit': 100},
+                headers={"Accept-Encoding": "gzip"})
+        self.assertEqual("gzip", response.headers.get("Content-Encoding"))
+        self.assertEqual(len(response.data), int(response.headers.get("Content-Length")))
+        self.assertEqual(10, len(json.loads(gzip.decompress(response.data)).get("deliveries")))
+
+        # not accepted by client
+        response = self.test_client.post('/v2/deliveries', json={'client': 'TEST_CLIENT_1'},
+                headers={"Accept-Encoding": "identity"})
+        self.assertIsNone(response.headers.get("Content-Encoding"))
+        self.assertEqual(_expected, response.data)
+
+        # too small
+        response = self.test_client.post('/v2/deliveries', json={'client': 'TEST_CLIENT_666'},
+                headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(404, response.status_code)
+        self.assertIsNone(response.headers.get("Content-Encoding"))
+
+    def test_json_encoders(self):
+        from ..app.routes import JsonEncoder, OrjsonEncoder, orjson
+        _data = {"ids": {1: {"code": "TEST_CLIENT_1", "language": "ru"}, 2: None}, "list": [1.5, True, "\u0436"]}
+        _expected = json.loads(json.dumps(_data))
+        self.assertEqual(_expected, json.loads(JsonEncoder().dumps(_data)))
+
+        if orjson:
+            self.assertEqual(_expected, json.loads(OrjsonEncoder().dumps(_data)))
+
+    def test_delivery_serializer__dates(self):
+        from ..app.client_getter import DeliverySerializer
+        _start = datetime.datetime(2023, 3, 25, 23, 58, 30, 123, tzinfo=pytz.utc)
+
+        for _timezone in ["Etc/UTC", "Europe/Belgrade", "Asia/Kathmandu", "America/St_Johns"]:
+            _serializer = DeliverySerializer(None, _timezone)
+            _tz = pytz.timezone(_timezone)
+
+            # DST switch is included for Europe
+            for _seconds in range(0, 2 * 24 * 3600, 97):
+                _date = _start + datetime.timedelta(seconds=_seconds)
+                _local = _date.astimezone(tz=_tz)
+                self.assertEqual((_local.strftime("%b %d %Y %H:%M:%S"), _local.strftime("%Y%m%d%H%M%S")),
+                        _serializer._format_date(_date))
 
     def test_get_lang(self):
         def __get_lang(client_code):
@@ -300,3 +483,422 @@ class ClientProviderTestSuite(django.test.TransactionTestCase):
         self.assertEqual(len(_response.json), 1)
         _delivery = _response.json.pop()
         self.assertTrue(_delivery.get('creation_date_mr').startswith(_day_to_check))
+
+    def test_get_deliveries_by_clients(self):
+        for index in range(2):
+            dl_models.Delivery.objects.create(groupid='test.TEST_CLIENT_2', artifactid='testartifact%d' % index,
+                    version='2', creation_date=datetime.datetime.now(pytz.utc), mf_delivery_files_specified='file')
+
+        _clients = ['TEST_CLIENT_1', 'TEST_CLIENT_2', 'TEST_CLIENT_3', 'CLIENT_1']
+        response = self.test_client.post('/v2/deliveries_by_clients', json={'clients': _clients})
+        self.assertEqual(201, response.status_code)
+        self.assertEqual(sorted(_clients), sorted(response.json.keys()))
+
+        def _sorted(deliveries):
+            return sorted(deliveries, key=lambda x: x.get("gav"))
+
+        for _client in ['TEST_CLIENT_1', 'TEST_CLIENT_2']:
+            _expected = self.test_client.post('/v2/deliveries', json={'client': _client}).json
+            self.assertEqual(_sorted(_expected), _sorted(response.json.get(_client)))
+
+        # deliveries matching several client codes are returned for each of them
+        self.assertEqual(_sorted(response.json.get('TEST_CLIENT_1')), _sorted(response.json.get('CLIENT_1')))
+        self.assertEqual([], response.json.get('TEST_CLIENT_3'))
+
+        # search params are applied to all clients
+        _day_to_search_s = (datetime.datetime.utcnow() - datetime.timedelta(days=1)).strftime("%d-%m-%Y")
+        response = self.test_client.post('/v2/deliveries_by_clients', json={'clients': _clients,
+            "search_params": {"date_range_before": _day_to_search_s, "date_range_after": _day_to_search_s}})
+        self.assertEqual(201, response.status_code)
+        self.assertEqual([1, 0, 0, 1], list(map(lambda x: len(response.json.get(x)), _clients)))
+
+        # duplicated codes do not duplicate deliveries
+        response = self.test_client.post('/v2/deliveries_by_clients', json={'clients': ['TEST_CLIENT_2'] * 2})
+        self.assertEqual(201, response.status_code)
+        self.assertEqual(['TEST_CLIENT_2'], list(response.json.keys()))
+        self.assertEqual(2, len(response.json.get('TEST_CLIENT_2')))
+
+    def test_get_deliveries_by_clients__invalid(self):
+        from ..app import routes
+
+        for _request in [{}, {'clients': []}, {'clients': 'TEST_CLIENT_1'}, {'clients': ['TEST_CLIENT_1', '']},
+                {'clients': ['TEST_CLIENT_1', 1]}]:
+            response = self.test_client.post('/v2/deliveries_by_clients', json=_request)
+            self.assertEqual(400, response.status_code)
+
+        with mock.patch.object(routes, "_DELIVERIES_CLIENTS_MAX", 1):
+            response = self.test_client.post('/v2/deliveries_by_clients', json={'clients': ['TEST_CLIENT_1', 'X']})
+            self.assertEqual(400, response.status_code)
+
+    def test_get_deliveries_changes(self):
+        def _get_changes(watermark=None):
+            response = self.test_client.post('/v2/deliveries/changes', json={'client': 'TEST_CLIENT_1',
+                'watermark': watermark})
+            self.assertEqual(200, response.status_code)
+            return response.json
+
+        _changes = _get_changes()
+        self.assertEqual(10, len(_changes.get("deliveries")))
+        self.assertEqual([], _changes.get("removed"))
+
+        # nothing is changed
+        _watermark = _changes.get("watermark")
+        self.assertEqual({"deliveries": [], "removed": [], "watermark": _watermark}, _get_changes(_watermark))
+
+        # created, modified, deleted, and changed for another client
+        dl_models.Delivery.objects.create(groupid='test.TEST_CLIENT_1', artifactid='newartifact', version='1',
+                creation_date=datetime.datetime.now(pytz.utc))
+        dl_models.Delivery.objects.create(groupid='test.TEST_CLIENT_2', artifactid='newartifact', version='1',
+                creation_date=datetime.datetime.now(pytz.utc))
+        _delivery = dl_models.Delivery.objects.get(artifactid='testartifact1')
+        _delivery.flag_approved = True
+        _delivery.save()
+        dl_models.Delivery.objects.get(artifactid='testartifact2').delete()
+
+        _changes = _get_changes(_watermark)
+
+        self.assertEqual(['test.TEST_CLIENT_1:newartifact:1:zip', 'test.TEST_CLIENT_1:testartifact1:1:zip'],
+                sorted(map(lambda x: x.get("gav"), _changes.get("deliveries"))))
+        self.assertEqual(['test.TEST_CLIENT_1:testartifact2:1:zip'], _changes.get("removed"))
+        self.assertNotEqual(_watermark, _changes.get("watermark"))
+
+        _watermark = _changes.get("watermark")
+        self.assertEqual({"deliveries": [], "removed": [], "watermark": _watermark}, _get_changes(_watermark))
+
+        response = self.test_client.post('/v2/deliveries/changes', json={'client': 'TEST_CLIENT_1',
+            'watermark': 'garbage'})
+        self.assertEqual(400, response.status_code)
+        response = self.test_client.post('/v2/deliveries/changes', json={'watermark': _watermark})
+        self.assertEqual(400, response.status_code)
+
+    def test_get_deliveries_changes__new_groupid(self):
+        # deliveries under groupids appeared after the resolver refresh are not skipped
+        def _get_gavs(watermark=None):
+            response = self.test_client.post('/v2/deliveries/changes', json={'client': 'TEST_CLIENT_1',
+                'watermark': watermark})
+            return list(map(lambda x: x.get("gav"), response.json.get("deliveries"))), response.json.get("watermark")
+
+        with mock.patch.object(client_getter_module._groupid_resolver, "_refresh_interval", 3600):
+            _gavs, _watermark = _get_gavs()
+            self.assertEqual(10, len(_gavs))
+            dl_models.Delivery.objects.create(groupid='h.TEST_CLIENT_1', artifactid='b0', version='1',
+                    creation_date=datetime.datetime.now(pytz.utc))
+            self.assertEqual((['h.TEST_CLIENT_1:b0:1:zip']), _get_gavs(_watermark)[0])
+
+            dl_models.Delivery.objects.create(groupid='i.TEST_CLIENT_1', artifactid='b0', version='1',
+                    creation_date=datetime.datetime.now(pytz.utc))
+            _gavs, _watermark = _get_gavs()
+            self.assertEqual(12, len(_gavs))
+            self.assertIn('i.TEST_CLIENT_1:b0:1:zip', _gavs)
+
+    def test_get_deliveries_v2__files_bulk(self):
+        # files of all deliveries have to be resolved with a bounded number of queries
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        _csc = CheckSumsController()
+        _real_gavs = ['test.group.id:test-artifact:%d:bin' % _i for _i in range(5)]
+        cs_models.CiTypes(code="FILE", name="File", is_standard="N", is_deliverable=False).save()
+        cs_models.CsTypes(code="MD5", name="MD5 algoritm").save()
+        cs_models.LocTypes(code="NXS", name="Maven").save()
+
+        for _f in _real_gavs:
+            _t = tempfile.NamedTemporaryFile()
+            _t.write(self._random_bytes())
+            _t.flush()
+            _t.seek(0, os.SEEK_SET)
+            _csc.register_file_obj(_t, "FILE", _f, "NXS")
+            _t.close()
+
+        for _d in dl_models.Delivery.objects.filter(groupid__contains='TEST_CLIENT_1'):
+            _d.mf_delivery_files_specified = '\n'.join(_real_gavs + ['test.group.id:test-artifact:absent:bin'])
+            _d.save()
+
+        # groupids are loaded once per process, search results cache watermark is not a subject here
+        client_getter_module._groupid_resolver.resolve('TEST_CLIENT_1')
+
+        with CaptureQueriesContext(connection) as _queries, \
+                mock.patch.object(client_getter_module, "_DELIVERIES_CACHE_SIZE", 0):
+            response = self.test_client.post('/v2/deliveries', json={'client': 'TEST_CLIENT_1'})
+
+        self.assertEqual(201, response.status_code)
+        self.assertEqual(10, len(response.json))
+        self.assertLessEqual(len(_queries), 5)
+
+        for _delivery in response.json:
+            self.assertEqual(len(_real_gavs) + 1, len(_delivery.get("files")))
+
+            for _file in _delivery.get("files"):
+                if _file.get("path") not in _real_gavs:
+                    self.assertEqual(["path"], list(_file.keys()))
+                    continue
+
+                self.assertEqual("FILE", _file.get("citype"))
+                self.assertEqual("NXS", _file.get("location_type"))
+                self.assertEqual(_file.get("path"), _file.get("full_path"))
+
+    def test_get_deliveries_v2__pages(self):
+        _gavs = list()
+        _cursor = None
+
+        while True:
+            _request = {'client': 'TEST_CLIENT_1', 'limit': 3}
+
+            if _cursor:
+                _request["cursor"] = _cursor
+
+            response = self.test_client.post('/v2/deliveries', json=_request)
+            self.assertEqual(201, response.status_code)
+            self.assertLessEqual(len(response.json.get("deliveries")), 3)
+            _gavs += list(map(lambda x: x.get("gav"), response.json.get("deliveries")))
+            _cursor = response.json.get("next_cursor")
+
+            if not _cursor:
+                break
+
+        # keyset ordering is ascending by creation date, the oldest delivery has the biggest index
+        _expected = dl_models.Delivery.objects.filter(groupid__contains='TEST_CLIENT_1').order_by('creation_date')
+        self.assertEqual(list(map(lambda x: x.gav, _expected)), _gavs)
+
+    def test_get_deliveries_page__csv(self):
+        response = self.test_client.post('/deliveries', json={'client': 'TEST_CLIENT_1', 'csv': True, 'limit': 4})
+        self.assertEqual(201, response.status_code)
+        response_data = response.data.decode("utf-8").splitlines()
+        self.assertEqual("name,gav,author,creation_date,status,files", response_data.pop(0))
+        self.assertEqual(4, len(response_data))
+        _cursor = response.headers.get("X-Next-Cursor")
+        self.assertTrue(bool(_cursor))
+
+        response = self.test_client.post('/deliveries', json={
+            'client': 'TEST_CLIENT_1', 'csv': True, 'limit': 4, 'cursor': _cursor})
+        self.assertEqual(201, response.status_code)
+        self.assertEqual(4, len(response.data.decode("utf-8").splitlines()[1:]))
+
+    def test_get_deliveries_page__invalid(self):
+        response = self.test_client.post('/v2/deliveries', json={'client': 'TEST_CLIENT_1', 'cursor': 'garbage'})
+        self.assertEqual(400, response.status_code)
+        response = self.test_client.post('/v2/deliveries', json={'client': 'TEST_CLIENT_1', 'limit': 0})
+        self.assertEqual(400, response.status_code)
+
+    def test_get_deliveries__streamed(self):
+        from ..app.routes import client_getter, json_encoder
+        _expected, _error = client_getter.get_deliveries_v2('TEST_CLIENT_1', dict(), 'Etc/UTC')
+        self.assertIsNone(_error)
+        response = self.test_client.post('/v2/deliveries', json={'client': 'TEST_CLIENT_1'})
+        self.assertEqual(201, response.status_code)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(json_encoder.dumps(_expected), response.data)
+
+        _expected, _error = client_getter.get_deliveries('TEST_CLIENT_1', dict(), 'Etc/UTC')
+        response = self.test_client.post('/deliveries', json={'client': 'TEST_CLIENT_1', 'csv': True})
+        self.assertEqual(201, response.status_code)
+        self.assertTrue(response.is_streamed)
+        response_data = response.data.decode("utf-8").splitlines()
+        self.assertEqual(len(_expected) + 1, len(response_data))
+        self.assertEqual(list(map(lambda x: x.get("gav"), _expected)),
+                list(map(lambda x: x.split(',').pop(1), response_data[1:])))
+
+    def test_get_deliveries__streamed_error(self):
+        # incomplete body must not look like a complete one
+        _iter_deliveries = client_getter_module.ClientGetter._iter_deliveries
+
+        def _failing(*args, **kwargs):
+            for _i, _row in enumerate(_iter_deliveries(*args, **kwargs)):
+                if _i == 5:
+                    raise RuntimeError("Connection lost")
+
+                yield _row
+
+        with mock.patch.object(client_getter_module, "_DELIVERIES_CACHE_SIZE", 0), \
+                mock.patch.object(client_getter_module.ClientGetter, "_iter_deliveries", _failing):
+            for _url, _request in [('/v2/deliveries', {'client': 'TEST_CLIENT_1'}),
+                    ('/deliveries', {'client': 'TEST_CLIENT_1', 'csv': True})]:
+                # the error is raised to WSGI server, test client reads the first chunk of the body at once
+                with self.assertRaises(RuntimeError):
+                    self.test_client.post(_url, json=_request).get_data()
+
+    def test_get_deliveries_v2__business_status(self):
+        # business status has to be joined to the deliveries query, not fetched per delivery
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        _status = dl_models.BusinessStatus(description="Received by client")
+        _status.save()
+
+        for _d in dl_models.Delivery.objects.filter(groupid__contains='TEST_CLIENT_1')[:5]:
+            _d.business_status = _status
+            _d.save()
+
+        # groupids are loaded once per process, search results cache watermark is not a subject here
+        client_getter_module._groupid_resolver.resolve('TEST_CLIENT_1')
+
+        with CaptureQueriesContext(connection) as _queries, \
+                mock.patch.object(client_getter_module, "_DELIVERIES_CACHE_SIZE", 0):
+            response = self.test_client.post('/v2/deliveries', json={'client': 'TEST_CLIENT_1'})
+
+        self.assertEqual(201, response.status_code)
+        # deliveries, historical locations and locations
+        self.assertLessEqual(len(_queries), 3)
+        _actual = dict((x.get("gav"), x.get("status")) for x in response.json)
+        _expected = dict((x.gav, x.business_status.description if x.business_status else x.get_flags_description())
+                for x in dl_models.Delivery.objects.filter(groupid__contains='TEST_CLIENT_1'))
+        self.assertEqual(_expected, _actual)
+        self.assertEqual(5, list(_actual.values()).count("Received by client"))
+
+    def test_get_deliveries__cache(self):
+        _search_params = {"date_range_0": "01-01-2000", "comment": ""}
+
+        def _search(search_params):
+            return self.test_client.post('/v2/deliveries', json={'client': 'TEST_CLIENT_1',
+                "search_params": search_params})
+
+        _hits = self.test_client.get('/cache_stats').json.get("deliveries").get("hits")
+        _expected = _search(_search_params).json
+        self.assertEqual(10, len(_expected))
+
+        # equivalent search params are normalized to the same key
+        for _params in [{"date_range_after": "01-01-2000"}, {"date_from": "01-01-2000", "project": None}]:
+            self.assertEqual(_expected, _search(_params).json)
+
+        _stats = self.test_client.get('/cache_stats').json.get("deliveries")
+        self.assertEqual(_hits + 2, _stats.get("hits"))
+        self.assertEqual(1, _stats.get("size"))
+
+        # any change of the client deliveries invalidates cached results
+        _delivery = dl_models.Delivery.objects.filter(groupid__contains='TEST_CLIENT_1').first()
+        _delivery.mf_delivery_author = "new_author"
+        _delivery.save()
+        self.assertIn("new_author", map(lambda x: x.get("author"), _search(_search_params).json))
+        _delivery.delete()
+        self.assertEqual(9, len(_search(_search_params).json))
+
+        # CSV and v1 JSON share the cached rows
+        _response = self.test_client.post('/deliveries', json={'client': 'TEST_CLIENT_1', 'csv': False})
+        self.assertEqual(_response.json, self.test_client.post('/deliveries', json={
+            'client': 'TEST_CLIENT_1', 'csv': False}).json)
+        _response = self.test_client.post('/deliveries', json={'client': 'TEST_CLIENT_1', 'csv': True})
+        self.assertEqual(9, len(_response.get_data(as_text=True).strip().splitlines()) - 1)
+
+        # large results are not cached
+        cache.clear_all()
+
+        with mock.patch.object(client_getter_module, "_DELIVERIES_CACHE_MAX_ROWS", 5):
+            _search(_search_params)
+            self.assertEqual(0, self.test_client.get('/cache_stats').json.get("deliveries").get("size"))
+
+    def test_get_deliveries__deadline(self):
+        with mock.patch.dict(os.environ, {"REQUEST_TIMEOUT_GET_CLIENT_DELIVERIES_V2": "0.000001"}):
+            response = self.test_client.post('/v2/deliveries', json={'client': 'TEST_CLIENT_1'})
+            self.assertEqual(503, response.status_code)
+            self.assertEqual(0.000001, response.json.get("budget"))
+            self.assertIn("elapsed", response.json)
+
+            # other endpoints have default budget
+            response = self.test_client.post('/deliveries', json={'client': 'TEST_CLIENT_1', 'csv': False})
+            self.assertEqual(201, response.status_code)
+
+    def test_health(self):
+        from ..app import warmup
+        warmup.reset()
+        self.assertEqual(200, self.test_client.get('/health/live').status_code)
+
+        # warm-up is started by the first readiness request if it was not
+        with self.test_client.get('/health/ready') as response:
+            self.assertIn(response.status_code, [200, 503])
+            self.assertIsNotNone(response.json.get("started"))
+
+        for _i in range(50):
+            if warmup.get_state().get("finished"):
+                break
+
+            time.sleep(0.1)
+
+        with self.test_client.get('/health/ready') as response:
+            self.assertEqual(200, response.status_code)
+            self.assertTrue(response.json.get("ready"))
+            self.assertEqual(["clients", "database", "file_index", "groupids"], sorted(response.json.get("steps")))
+
+        # caches are primed
+        self.assertEqual(1, client_getter_module._groupid_resolver.stats().get("groupids"))
+
+    def test_health__retry(self):
+        from ..app import warmup
+        warmup.reset()
+        _step = mock.Mock(side_effect=[RuntimeError("Database is not available"), None])
+
+        def _wait():
+            for _i in range(50):
+                if warmup.get_state().get("finished"):
+                    break
+
+                time.sleep(0.1)
+
+        with mock.patch.object(warmup, "_CACHE_STEPS", [("clients", _step)]):
+            self.test_client.get('/health/ready')
+            _wait()
+
+            self.assertFalse(warmup.get_state().get("ready"))
+            self.assertEqual("Failed steps: clients", warmup.get_state().get("error"))
+            # the failed step is started again by this request
+            self.test_client.get('/health/ready')
+            _wait()
+
+            with self.test_client.get('/health/ready') as response:
+                self.assertEqual(200, response.status_code)
+                self.assertIsNone(response.json.get("steps").get("clients").get("error"))
+
+        self.assertEqual(2, _step.call_count)
+
+    def test_get_deliveries_v2__component(self):
+        cs_models.CiTypes(code="COMP", name="Component", is_standard="N", is_deliverable=True).save()
+        cs_models.LocTypes(code="NXS", name="Maven").save()
+        cs_models.CiRegExp(loc_type_id="NXS", ci_type_id="COMP",
+                regexp="test\\.group\\.id:comp-artifact:_VERSION_:zip").save()
+        _delivery_record = dl_models.Delivery.objects.filter(groupid__contains='TEST_CLIENT_1').last()
+        _delivery_record.mf_delivery_files_specified = '\n'.join([
+            'file', 'test.group.id:comp-artifact:1.2.3:zip'])
+        _delivery_record.save()
+
+        for _version, _found in [("1.2", True), ("1.3", False), ("1.2", True)]:
+            # repeated search would be taken from search results cache otherwise
+            with mock.patch.object(client_getter_module, "_DELIVERIES_CACHE_SIZE", 0):
+                response = self.test_client.post('/v2/deliveries', json={'client': 'TEST_CLIENT_1',
+                    "search_params": {"component_0": "COMP", "component_1": _version}})
+
+            if not _found:
+                self.assertEqual(404, response.status_code)
+                continue
+
+            self.assertEqual(201, response.status_code)
+            self.assertEqual([_delivery_record.gav], list(map(lambda x: x.get("gav"), response.json)))
+
+        _stats = self.test_client.get('/cache_stats').json.get("component_regex")
+        self.assertEqual(1, _stats.get("hits"))
+        self.assertEqual(2, _stats.get("size"))
+
+    def test_get_deliveries_v2__component_group(self):
+        # both single type and group of types are searched, this used to fail with NameError
+        cs_models.CiTypes(code="COMP", name="Component", is_standard="N", is_deliverable=True).save()
+        cs_models.CiTypes(code="DOC", name="Documentation", is_standard="N", is_deliverable=True).save()
+        cs_models.CiTypeGroups(code="PRODUCT", name="Product").save()
+
+        for _ci_type in ["COMP", "DOC"]:
+            cs_models.CiTypeIncs(ci_type_group_id="PRODUCT", ci_type_id=_ci_type).save()
+
+        cs_models.LocTypes(code="NXS", name="Maven").save()
+        cs_models.CiRegExp(loc_type_id="NXS", ci_type_id="COMP",
+                regexp="test\\.group\\.id:comp-artifact:_VERSION_:zip").save()
+        cs_models.CiRegExp(loc_type_id="NXS", ci_type_id="DOC",
+                regexp="test\\.group\\.id:doc-artifact:_VERSION_:pdf").save()
+        _deliveries = dl_models.Delivery.objects.filter(groupid__contains='TEST_CLIENT_1').order_by('id')
+        _deliveries = list(_deliveries)[:2]
+
+        for _delivery_record, _file in zip(_deliveries, [
+                'test.group.id:comp-artifact:1.2.3:zip', 'test.group.id:doc-artifact:1.2.4:pdf']):
+            _delivery_record.mf_delivery_files_specified = _file
+            _delivery_record.save()
+
+        for _code, _expected in [("COMP", _deliveries[:1]), ("DOC", _deliveries[1:]), ("PRODUCT", _deliveries)]:
+            response = self.test_client.post('/v2/deliveries', json={'client': 'TEST_CLIENT_1',
+                "search_params": {"component_0": _code, "component_1": "1.2"}})
+            self.assertEqual(201, response.status_code)
+            self.assertEqual(sorted(map(lambda x: x.gav, _expected)),
+                    sorted(map(lambda x: x.get("gav"), response.json)))
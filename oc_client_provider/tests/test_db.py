@@ -0,0 +1,88 @@
+from . import django_settings
+import unittest
+import unittest.mock
+import os
+from flask import Flask, Response
+from ..app import db
+
+
+class DbTestSuite(unittest.TestCase):
+    def test_get_database_settings(self):
+        with unittest.mock.patch.dict(os.environ, {"DB_CONN_MAX_AGE": "", "DB_CONN_HEALTH_CHECKS": ""}):
+            self.assertEqual({"CONN_MAX_AGE": 600, "CONN_HEALTH_CHECKS": True}, db.get_database_settings())
+
+        with unittest.mock.patch.dict(os.environ, {"DB_CONN_MAX_AGE": "0", "DB_CONN_HEALTH_CHECKS": "false"}):
+            self.assertEqual({"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False}, db.get_database_settings())
+
+    def test_init_app(self):
+        from django.db import connection
+        app = Flask(__name__)
+        db.init_app(app)
+
+        @app.route('/count')
+        def count():
+            with connection.cursor() as _cursor:
+                _cursor.execute("SELECT 1")
+                return {"count": _cursor.fetchone()[0]}
+
+        _test_client = app.test_client()
+
+        with unittest.mock.patch.dict(connection.settings_dict, {"CONN_MAX_AGE": 600, "CONN_HEALTH_CHECKS": True}):
+            connection.close()
+            _before = db.get_stats()
+
+            for _i in range(3):
+                self.assertEqual(200, _test_client.get('/count').status_code)
+
+            _after = db.get_stats()
+
+        self.assertEqual(3, _after["requests"] - _before["requests"])
+        self.assertEqual(1, _after["connections_opened"] - _before["connections_opened"])
+        self.assertEqual(2, _after["connections_reused"] - _before["connections_reused"])
+
+    def test_init_app__streamed(self):
+        from django.db import connection
+        app = Flask(__name__)
+        db.init_app(app)
+
+        @app.route('/stream')
+        def stream():
+            _cursor = connection.cursor()
+            _cursor.execute("SELECT 1 UNION ALL SELECT 2")
+
+            def _rows():
+                with _cursor:
+                    for _row in _cursor.fetchall():
+                        yield "%d\n" % _row[0]
+
+            return Response(_rows())
+
+        _test_client = app.test_client()
+
+        with unittest.mock.patch.dict(connection.settings_dict, {"CONN_MAX_AGE": 0}):
+            connection.close()
+
+            # the connection is closed after the body is sent, not after the request is torn down
+            with _test_client.get('/stream') as _response:
+                self.assertIsNotNone(connection.connection)
+                self.assertEqual(b"1\n2\n", _response.data)
+
+            self.assertIsNone(connection.connection)
+
+    def test_init_app__no_database(self):
+        from django.db import connection
+        app = Flask(__name__)
+        db.init_app(app)
+
+        @app.route('/live')
+        @db.no_database
+        def live():
+            return {"result": "OK"}
+
+        _test_client = app.test_client()
+        connection.ensure_connection()
+
+        with unittest.mock.patch.dict(connection.settings_dict, {"CONN_HEALTH_CHECKS": True}), \
+                unittest.mock.patch.object(connection, "is_usable", return_value=True) as _is_usable:
+            self.assertEqual(200, _test_client.get('/live').status_code)
+            _is_usable.assert_not_called()
@@ -0,0 +1,108 @@
+from . import django_settings
+import unittest
+import unittest.mock
+import os
+import time
+import threading
+from flask import Flask
+from ..app import deadline
+
+# endless query, it is finished by the deadline only
+_ENDLESS_QUERY = "WITH RECURSIVE _c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM _c) SELECT count(*) FROM _c"
+
+
+class DeadlineTestSuite(unittest.TestCase):
+    def setUp(self):
+        from django.db import connection
+        self.app = Flask(__name__)
+        deadline.init_app(self.app)
+
+        @self.app.route('/query/<int:delay>')
+        def query(delay):
+            time.sleep(delay / 1000)
+
+            with connection.cursor() as _cursor:
+                _cursor.execute("SELECT 1" if delay else _ENDLESS_QUERY)
+                return {"result": _cursor.fetchone()[0]}
+
+        @self.app.errorhandler(deadline.DeadlineExceeded)
+        def deadline_exceeded(exc):
+            return {"budget": exc.budget, "elapsed": exc.elapsed}, 503
+
+        self.test_client = self.app.test_client()
+
+    def test_get_budget(self):
+        with unittest.mock.patch.dict(os.environ, {"REQUEST_TIMEOUT_GET_CLIENT_DELIVERIES_V2": "5"}):
+            self.assertEqual(5, deadline.get_budget("client_provider_bp.get_client_deliveries_v2"))
+            self.assertEqual(deadline._DEFAULT_BUDGET, deadline.get_budget("client_provider_bp.get_client_deliveries"))
+            self.assertEqual(deadline._DEFAULT_BUDGET, deadline.get_budget(None))
+
+    def test_query_not_started(self):
+        with unittest.mock.patch.dict(os.environ, {"REQUEST_TIMEOUT_QUERY": "0.05"}):
+            with self.test_client.get('/query/100') as _response:
+                self.assertEqual(503, _response.status_code)
+                self.assertEqual(0.05, _response.json.get("budget"))
+                self.assertLessEqual(0.1, _response.json.get("elapsed"))
+
+            with self.test_client.get('/query/1') as _response:
+                self.assertEqual(200, _response.status_code)
+
+    def test_query_cancelled(self):
+        from django.db import connection
+        _wrappers = len(connection.execute_wrappers)
+
+        with unittest.mock.patch.dict(os.environ, {"REQUEST_TIMEOUT_QUERY": "0.2"}):
+            with self.test_client.get('/query/0') as _response:
+                self.assertEqual(503, _response.status_code)
+                self.assertGreater(1, _response.json.get("elapsed"))
+
+        # limits are removed from the connection after the request
+        self.assertEqual(_wrappers, len(connection.execute_wrappers))
+
+        with unittest.mock.patch.dict(os.environ, {"REQUEST_TIMEOUT_QUERY": "0"}):
+            with self.test_client.get('/query/1') as _response:
+                self.assertEqual(200, _response.status_code)
+
+    def test_statement_timeout(self):
+        _connection = unittest.mock.Mock(vendor="postgresql")
+        _deadline = deadline._Deadline(10, _connection)
+        _timeouts = list()
+
+        def _execute(sql, params, many, context):
+            if "statement_timeout" in sql:
+                _timeouts.append(int(params[0]))
+
+        for _i in range(2):
+            _deadline(_execute, "SELECT 1", None, False, dict())
+            time.sleep(0.05)
+
+        # each query is limited with the time remaining before it
+        self.assertEqual(2, len(_timeouts))
+        self.assertGreaterEqual(10000, _timeouts[0])
+        self.assertGreaterEqual(_timeouts[0] - 50, _timeouts[1])
+
+        # the last timeout is kept while the response is streamed
+        _deadline.active = False
+        _deadline(_execute, "SELECT 1", None, False, dict())
+        self.assertEqual(2, len(_timeouts))
+
+    def test_reset_in_another_thread(self):
+        from django.db import connection, connections, DEFAULT_DB_ALIAS
+        _wrappers = len(connection.execute_wrappers)
+
+        with unittest.mock.patch.object(deadline, "_remove_limits") as _remove_limits:
+            _response = self.test_client.get('/query/1')
+            self.assertEqual(200, _response.status_code)
+            # the response may be closed by another thread, the request thread connection may not be used there
+            _closing = threading.Thread(target=_response.close)
+            _closing.start()
+            _closing.join()
+            self.assertEqual(_wrappers, len(connection.execute_wrappers))
+            _remove_limits.assert_not_called()
+
+            # limits are removed before the next request on the connection, even without budget
+            with unittest.mock.patch.dict(os.environ, {"REQUEST_TIMEOUT_QUERY": "0"}):
+                with self.test_client.get('/query/1') as _response:
+                    self.assertEqual(200, _response.status_code)
+
+            _remove_limits.assert_called_once_with(connections[DEFAULT_DB_ALIAS])
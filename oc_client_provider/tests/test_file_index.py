@@ -0,0 +1,197 @@
+from . import django_settings
+import datetime
+import django.test
+import pytz
+import oc_delivery_apps.dlmanager.models as dl_models
+import oc_delivery_apps.checksums.models as cs_models
+from ..app import create_app
+from ..app import cache
+from ..file_index import indexer
+from ..file_index.models import DeliveryFile, DeliveryName
+from .config import TestConfig
+import os
+from unittest import mock
+
+# disable extra logging output
+import logging
+logging.getLogger().propagate = False
+logging.getLogger().disabled = True
+
+
+class FileIndexTestSuite(django.test.TransactionTestCase):
+    def _create_delivery(self, index, files, groupid='test.TEST_CLIENT'):
+        return dl_models.Delivery.objects.create(groupid=groupid,
+                artifactid='testartifact%d' % index, version='1',
+                creation_date=datetime.datetime.now(pytz.utc) - datetime.timedelta(days=index),
+                mf_delivery_files_specified='\n'.join(files))
+
+    def setUp(self):
+        django.core.management.call_command('migrate', verbosity=0, interactive=False)
+        cache.clear_all()
+        self.test_client = create_app(TestConfig).test_client()
+        cs_models.CiTypes(code="COMP", name="Component", is_standard="N", is_deliverable=True).save()
+        cs_models.LocTypes(code="NXS", name="Maven").save()
+        cs_models.CiRegExp(loc_type_id="NXS", ci_type_id="COMP",
+                regexp="test\\.group\\.id:comp-artifact:_VERSION_:zip").save()
+        self.deliveries = [
+                self._create_delivery(0, ['file_a', 'test.group.id:comp-artifact:1.2.3:zip']),
+                self._create_delivery(1, ['file_b;file_c', 'test.group.id:comp-artifact:2.0:zip']),
+                self._create_delivery(2, [])]
+
+    def tearDown(self):
+        django.core.management.call_command('flush', verbosity=0, interactive=False)
+
+    def _search(self, component, value):
+        _response = self.test_client.post('/v2/deliveries', json={'client': 'TEST_CLIENT',
+            "search_params": {"component_0": component, "component_1": value}})
+
+        if _response.status_code == 404:
+            return list()
+
+        self.assertEqual(201, _response.status_code)
+        return sorted(map(lambda x: x.get("gav"), _response.json))
+
+    def _search_project(self, project):
+        _response = self.test_client.post('/v2/deliveries', json={'client': 'TEST_CLIENT',
+            "search_params": {"project": project}})
+
+        if _response.status_code == 404:
+            return list()
+
+        self.assertEqual(201, _response.status_code)
+        return sorted(map(lambda x: x.get("gav"), _response.json))
+
+    def test_backfill(self):
+        django.core.management.call_command('backfill_file_index', verbosity=0)
+        self.assertEqual(
+                sorted(map(lambda x: (x.id, x.groupid, x.delivery_name), self.deliveries)),
+                sorted(DeliveryName.objects.values_list('delivery_id', 'groupid', 'name')))
+        self.assertEqual(
+                sorted([(self.deliveries[0].id, 'test.TEST_CLIENT', 'file_a'),
+                    (self.deliveries[0].id, 'test.TEST_CLIENT', 'test.group.id:comp-artifact:1.2.3:zip'),
+                    (self.deliveries[1].id, 'test.TEST_CLIENT', 'file_b'),
+                    (self.deliveries[1].id, 'test.TEST_CLIENT', 'file_c'),
+                    (self.deliveries[1].id, 'test.TEST_CLIENT', 'test.group.id:comp-artifact:2.0:zip')]),
+                sorted(DeliveryFile.objects.values_list('delivery_id', 'groupid', 'path')))
+
+    def test_search(self):
+        # the same results are expected with and without index
+        _expected = [
+                ("FILE", "file_", [self.deliveries[0].gav, self.deliveries[1].gav]),
+                ("FILE", "file_c", [self.deliveries[1].gav]),
+                ("FILE", "file_d", []),
+                ("COMP", "1.2", [self.deliveries[0].gav]),
+                ("COMP", "2", [self.deliveries[1].gav]),
+                ("COMP", "3", [])]
+
+        for _component, _value, _gavs in _expected:
+            self.assertEqual(_gavs, self._search(_component, _value))
+
+        indexer.backfill()
+        # search results cache is not invalidated by 'update' since no history is written
+        cache.clear_all()
+
+        # text of files list is not searched for indexed deliveries
+        dl_models.Delivery.objects.filter(id=self.deliveries[1].id).update(mf_delivery_files_specified='file_x')
+        self.assertEqual([self.deliveries[1].gav], self._search("FILE", "file_c"))
+        self.assertEqual([], self._search("FILE", "file_x"))
+
+        dl_models.Delivery.objects.filter(id=self.deliveries[1].id).update(
+                mf_delivery_files_specified='file_b\nfile_c\ntest.group.id:comp-artifact:2.0:zip')
+        cache.clear_all()
+
+        for _component, _value, _gavs in _expected:
+            self.assertEqual(_gavs, self._search(_component, _value))
+
+    def test_search__not_indexed(self):
+        indexer.backfill()
+        _delivery = self._create_delivery(3, ['file_d'])
+        # deliveries created after the index synchronization are searched in text, searches do not synchronize
+        self.assertEqual([_delivery.gav], self._search("FILE", "file_d"))
+        self.assertFalse(DeliveryFile.objects.filter(delivery_id=_delivery.id).exists())
+
+        with mock.patch.dict(os.environ, {"FILE_INDEX_ENABLED": "false"}):
+            self.assertEqual([self.deliveries[1].gav], self._search("FILE", "file_c"))
+
+    def test_search__changed(self):
+        indexer.backfill()
+        # deliveries changed after the index synchronization are searched in text, not in stale index records
+        self.deliveries[1].mf_delivery_files_specified = 'file_x'
+        self.deliveries[1].save()
+        self.assertEqual([], self._search("FILE", "file_c"))
+        self.assertEqual([self.deliveries[1].gav], self._search("FILE", "file_x"))
+        self.assertEqual([self.deliveries[0].gav], self._search("FILE", "file_a"))
+        self.assertEqual([self.deliveries[0].gav], self._search_project("testartifact0"))
+
+        self.assertTrue(indexer.sync())
+        cache.clear_all()
+        self.assertEqual([self.deliveries[1].gav], self._search("FILE", "file_x"))
+        self.assertTrue(DeliveryFile.objects.filter(delivery_id=self.deliveries[1].id, path='file_x').exists())
+
+    def test_search__other_client(self):
+        _other = self._create_delivery(3, ['file_c'], groupid='test.OTHER_CLIENT')
+        indexer.backfill()
+        self.assertEqual('test.OTHER_CLIENT',
+                DeliveryFile.objects.filter(delivery_id=_other.id).values_list('groupid', flat=True).get())
+        # files of other clients are not matched in the index
+        _filter = indexer.search_filter("mf_delivery_files_specified__contains", "path__contains", "file_c",
+                {"groupid__in": ['test.TEST_CLIENT']})
+        self.assertEqual([self.deliveries[1].id],
+                list(dl_models.Delivery.objects.filter(_filter).values_list('id', flat=True)))
+        self.assertEqual([self.deliveries[1].gav], self._search("FILE", "file_c"))
+
+    def test_start_sync(self):
+        indexer.backfill()
+
+        with mock.patch.object(indexer, "_sync_thread", None), \
+                mock.patch.object(indexer, "_SYNC_INTERVAL", 0), \
+                mock.patch("threading.Thread") as _thread:
+            indexer.start_sync()
+            _thread.assert_not_called()
+
+        with mock.patch.object(indexer, "_sync_thread", None), \
+                mock.patch("threading.Thread") as _thread:
+            indexer.start_sync()
+            indexer.start_sync()
+            _thread.assert_called_once_with(target=indexer._sync_loop, name="oc-client-provider-file-index",
+                    daemon=True)
+            _thread.return_value.start.assert_called_once_with()
+
+    def test_sync(self):
+        self.assertFalse(indexer.sync())
+        indexer.backfill()
+        _delivery = self._create_delivery(3, ['file_d'])
+        self.deliveries[0].mf_delivery_files_specified = 'file_e'
+        self.deliveries[0].save()
+        self.deliveries[1].delete()
+        self.assertTrue(indexer.sync())
+        self.assertEqual(
+                sorted([(self.deliveries[0].id, 'file_e'), (_delivery.id, 'file_d')]),
+                sorted(DeliveryFile.objects.values_list('delivery_id', 'path')))
+
+    def test_search_project(self):
+        _other = dl_models.Delivery.objects.create(groupid='test.OTHER_CLIENT', artifactid='testartifact0',
+                version='1', creation_date=datetime.datetime.now(pytz.utc))
+        _expected = [
+                ("TestArtifact0-", [self.deliveries[0].gav]),
+                ("artifact", sorted(map(lambda x: x.gav, self.deliveries))),
+                ("t2-1", [self.deliveries[2].gav]),
+                ("absent", [])]
+
+        for _project, _gavs in _expected:
+            self.assertEqual(_gavs, self._search_project(_project))
+
+        indexer.backfill()
+        self.assertIn(_other.id, DeliveryName.objects.values_list('delivery_id', flat=True))
+
+        cache.clear_all()
+
+        for _project, _gavs in _expected:
+            self.assertEqual(_gavs, self._search_project(_project))
+
+        # name of indexed delivery is taken from index, new one is compared in the table
+        dl_models.Delivery.objects.filter(id=self.deliveries[0].id).update(artifactid='renamed')
+        _delivery = self._create_delivery(3, [])
+        cache.clear_all()
+        self.assertEqual(['test.TEST_CLIENT:renamed:1:zip'], self._search_project("testartifact0"))
+        self.assertEqual([_delivery.gav], self._search_project("testartifact3"))
@@ -0,0 +1,118 @@
+from . import django_settings
+import datetime
+import django.test
+import pytz
+import oc_delivery_apps.dlmanager.models as dl_models
+from ..app.groupids import GroupIdResolver, GroupIdWatermarks
+
+
+class GroupIdResolverTestSuite(django.test.TransactionTestCase):
+    def _create_delivery(self, groupid):
+        return dl_models.Delivery.objects.create(groupid=groupid, artifactid='testartifact',
+                version=str(dl_models.Delivery.objects.count()), creation_date=datetime.datetime.now(pytz.utc))
+
+    def setUp(self):
+        django.core.management.call_command('migrate', verbosity=0, interactive=False)
+
+        for _groupid in ['test.CLIENT', 'other.test.CLIENT', 'test.CLIENT_1', 'test.OTHER_CLIENT', 'test.CLIENT']:
+            self._create_delivery(_groupid)
+
+    def tearDown(self):
+        django.core.management.call_command('flush', verbosity=0, interactive=False)
+
+    def _assert_suffix_match(self, resolver, client_code):
+        _expected = set(dl_models.Delivery.objects.filter(groupid__endswith=client_code).values_list(
+            'groupid', flat=True))
+        self.assertEqual(sorted(_expected), resolver.resolve(client_code))
+
+    def test_resolve(self):
+        _resolver = GroupIdResolver(refresh_interval=0)
+
+        for _client_code in ['CLIENT', 'OTHER_CLIENT', 'CLIENT_1', 'ABSENT']:
+            self._assert_suffix_match(_resolver, _client_code)
+
+        self.assertEqual(['other.test.CLIENT', 'test.CLIENT', 'test.OTHER_CLIENT'], _resolver.resolve('CLIENT'))
+
+        # new groupids, both new deliveries and changed ones
+        self._create_delivery('new.CLIENT')
+        _delivery = dl_models.Delivery.objects.filter(groupid='test.CLIENT_1').get()
+        _delivery.groupid = 'changed.CLIENT'
+        _delivery.save()
+
+        self.assertEqual(['changed.CLIENT', 'new.CLIENT', 'other.test.CLIENT', 'test.CLIENT', 'test.OTHER_CLIENT'],
+                _resolver.resolve('CLIENT'))
+
+        # groupids of changed deliveries are kept, no deliveries are found for them
+        self.assertEqual(['test.CLIENT_1'], _resolver.resolve('CLIENT_1'))
+
+        _stats = _resolver.stats()
+        self.assertEqual(1, _stats.get("loads"))
+        self.assertEqual(6, _stats.get("groupids"))
+
+    def test_max_clients(self):
+        _resolver = GroupIdResolver(refresh_interval=0, max_clients=2)
+
+        for _client_code in ['CLIENT', 'CLIENT_1', 'CLIENT', 'ABSENT']:
+            self._assert_suffix_match(_resolver, _client_code)
+
+        # the least recently used 'CLIENT_1' is evicted
+        _stats = _resolver.stats()
+        self.assertEqual(2, _stats.get("clients"))
+        self.assertEqual(1, _stats.get("hits"))
+        self._assert_suffix_match(_resolver, 'CLIENT')
+        self.assertEqual(2, _resolver.stats().get("hits"))
+        self._assert_suffix_match(_resolver, 'CLIENT_1')
+        self.assertEqual(4, _resolver.stats().get("misses"))
+
+        # cached clients are updated with new groupids
+        self._create_delivery('new.CLIENT_1')
+        self._assert_suffix_match(_resolver, 'CLIENT_1')
+        self.assertEqual(3, _resolver.stats().get("hits"))
+
+    def test_refresh_interval(self):
+        _resolver = GroupIdResolver(refresh_interval=60)
+        self.assertEqual(['test.CLIENT_1'], _resolver.resolve('CLIENT_1'))
+        self._create_delivery('new.CLIENT_1')
+        self.assertEqual(['test.CLIENT_1'], _resolver.resolve('CLIENT_1'))
+        _resolver.clear()
+        self._assert_suffix_match(_resolver, 'CLIENT_1')
+
+
+class GroupIdWatermarksTestSuite(django.test.TransactionTestCase):
+    def setUp(self):
+        django.core.management.call_command('migrate', verbosity=0, interactive=False)
+        self.delivery = dl_models.Delivery.objects.create(groupid='test.CLIENT', artifactid='testartifact',
+                version='1', creation_date=datetime.datetime.now(pytz.utc))
+
+    def tearDown(self):
+        django.core.management.call_command('flush', verbosity=0, interactive=False)
+
+    def test_get(self):
+        _watermarks = GroupIdWatermarks()
+        _start = _watermarks.get(['test.CLIENT'])
+        self.assertEqual(_start, _watermarks.get(['test.CLIENT', 'test.OTHER']))
+        self.assertEqual(_start, _watermarks.get([]))
+
+        # changes of other groupids do not affect watermark
+        _other = dl_models.Delivery.objects.create(groupid='test.OTHER', artifactid='testartifact',
+                version='1', creation_date=datetime.datetime.now(pytz.utc))
+        self.assertEqual(_start, _watermarks.get(['test.CLIENT']))
+        _created = _watermarks.get(['test.OTHER'])
+        self.assertEqual(_other.id, _created[0])
+        self.assertGreater(_created[1], _start[1])
+        self.assertEqual(_created, _watermarks.get(['test.CLIENT', 'test.OTHER']))
+
+        # modification and deletion are noticed by history
+        self.delivery.version = '2'
+        self.delivery.save()
+        _modified = _watermarks.get(['test.CLIENT'])
+        self.assertGreater(_modified[1], _created[1])
+        self.delivery.delete()
+        self.assertGreater(_watermarks.get(['test.CLIENT'])[1], _modified[1])
+        self.assertEqual(_created, _watermarks.get(['test.OTHER']))
+
+        # nothing is fetched without changes
+        _fetches = _watermarks.stats().get("fetches")
+        _watermarks.get(['test.CLIENT'])
+        self.assertEqual(_fetches, _watermarks.stats().get("fetches"))
+        self.assertEqual(2, _watermarks.stats().get("groupids"))
@@ -0,0 +1,20 @@
+import unittest
+import unittest.mock
+import os
+import tempfile
+from .. import gunicorn_config
+
+
+class GunicornConfigTestSuite(unittest.TestCase):
+    def test_child_exit(self):
+        _worker = unittest.mock.Mock(pid=12345)
+
+        with unittest.mock.patch("prometheus_client.multiprocess.mark_process_dead") as _mark_process_dead:
+            with unittest.mock.patch.dict(os.environ, {"PROMETHEUS_MULTIPROC_DIR": ""}):
+                gunicorn_config.child_exit(None, _worker)
+                _mark_process_dead.assert_not_called()
+
+            with tempfile.TemporaryDirectory() as _directory, \
+                    unittest.mock.patch.dict(os.environ, {"PROMETHEUS_MULTIPROC_DIR": _directory}):
+                gunicorn_config.child_exit(None, _worker)
+                _mark_process_dead.assert_called_once_with(12345)
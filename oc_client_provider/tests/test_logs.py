@@ -0,0 +1,39 @@
+import unittest
+import unittest.mock
+import logging
+import json
+from ..app import logs
+
+
+class LogsTestSuite(unittest.TestCase):
+    def test_fields(self):
+        _fields = logs.Fields(route="/v2/deliveries", client=None, rows=3)
+        self.assertEqual("route=/v2/deliveries rows=3", str(_fields))
+
+    def test_json_formatter(self):
+        _record = logging.LogRecord("test", logging.INFO, __file__, 1, "Found %d records", (3,), None)
+        _record.fields = logs.Fields(rows=3)
+        _result = json.loads(logs.JsonFormatter().format(_record))
+        self.assertEqual("Found 3 records", _result.get("message"))
+        self.assertEqual("INFO", _result.get("level"))
+        self.assertEqual(3, _result.get("rows"))
+
+    def test_debug_sampled(self):
+        _arg = unittest.mock.MagicMock()
+
+        # root logger may be disabled by other tests
+        with unittest.mock.patch.object(logs, "_SAMPLE_RATE", 10), \
+                unittest.mock.patch.object(logging.getLogger(), "disabled", False):
+            # arguments are not formatted if debug is disabled
+            with self.assertLogs(level="INFO"):
+                logging.info("debug is disabled")
+                logs.debug_sampled("Test message [%s]", _arg)
+
+            _arg.__str__.assert_not_called()
+
+            with self.assertLogs(level="DEBUG") as _logs:
+                for _i in range(25):
+                    logs.debug_sampled("Another test message [%d]", _i)
+
+        self.assertEqual(3, len(_logs.records))
+        self.assertEqual([0, 10, 20], list(map(lambda x: x.args[0], _logs.records)))
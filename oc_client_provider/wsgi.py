@@ -1,12 +1,28 @@
 import logging
 from .app import create_app
 from .config import Config
+from .app import db
+from .app import logs
 import os
 from oc_orm_initializator.orm_initializator import OrmInitializator
 
+
+class _OrmInitializator(OrmInitializator):
+    """
+    Connections persistence and pool settings from environment are added to the database configuration
+    """
+    def _fill_db_dictionary(self, url, user, password):
+        _databases = super()._fill_db_dictionary(url=url, user=user, password=password)
+        _settings = db.get_database_settings()
+        _databases["default"].setdefault("OPTIONS", dict()).update(_settings.pop("OPTIONS", dict()))
+        _databases["default"].update(_settings)
+        return _databases
+
+
 _settings = {"installed_apps": [
         "oc_delivery_apps.checksums",
-        "oc_delivery_apps.dlmanager"]}
+        "oc_delivery_apps.dlmanager",
+        "oc_client_provider.file_index"]}
 
 for _s in ["url", "user", "password"]:
     _env = "_".join(["psql", _s]).upper()
@@ -20,10 +36,11 @@ for _s in ["url", "user", "password"]:
 # time_zone is not required and may be overwritten
 _settings["TIME_ZONE"] = os.getenv("DJANGO_TIME_ZONE") or os.getenv("DJANGO_TIMEZONE") or "Etc/UTC"
 
-OrmInitializator(**_settings)
+_OrmInitializator(**_settings)
 app = create_app(Config)
+db.init_app(app)
 
 # additional tricks for logging
 if __name__ != "__main__":
     gunicorn_logger = logging.getLogger("gunicorn.error")
-    logging.basicConfig(format='[%(asctime)s] [%(levelname)s] %(message)s', level=gunicorn_logger.level)
+    logs.configure(gunicorn_logger.level)
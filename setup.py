@@ -15,7 +15,19 @@ setup(name="oc-client-provider",
             "oc-orm-initializator >= 1.1.0",
             "flask",
             "gunicorn",
+            "prometheus-client",
             "pytz",
             "pyyaml"],
-      packages={"oc_client_provider"},
-      python_requires=">=3.6")
+        extras_require={
+            # 'asgi' module relies on 'WsgiToAsgiInstance' internals, tested with these versions
+            "asgi": ["asgiref >= 3.3.2, < 4", "uvicorn"],
+            "compression": ["brotli", "zstandard"],
+            "fast-json": ["orjson"]},
+      packages={
+          "oc_client_provider",
+          "oc_client_provider.app",
+          "oc_client_provider.file_index",
+          "oc_client_provider.file_index.migrations",
+          "oc_client_provider.file_index.management",
+          "oc_client_provider.file_index.management.commands"},
+      python_requires=">=3.7")